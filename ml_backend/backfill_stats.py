@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Script para calcular las estadísticas por sensor de mediciones antiguas.
+Las mediciones nuevas las guardan al finalizar; éste completa `stats_json`
+en las que se guardaron antes de que existiera.
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from database import get_pool
+from run_data import decode_run
+from run_stats import StreamingStats
+
+def backfill_stats(batch: int = 100) -> None:
+    pool = get_pool()
+    conn = pool.acquire_reader()
+    try:
+        run_ids = [row[0] for row in conn.execute(
+            "SELECT id FROM measurements WHERE status = 'ready' AND stats_json IS NULL"
+        )]
+    finally:
+        pool.release_reader(conn)
+    if not run_ids:
+        print("[OK] Todas las mediciones tienen estadísticas")
+        return
+
+    start = time.perf_counter()
+    done = failed = 0
+    pending = []
+    for run_id in run_ids:
+        try:
+            data = decode_run(run_id)
+            if data is None:
+                raise ValueError("sin datos")
+            names = list(data.sensors)
+            stats = StreamingStats(names)
+            if names:
+                stats.update(np.column_stack([data.sensors[name] for name in names]))
+            pending.append((json.dumps(stats.result()), run_id))
+        except Exception as e:
+            failed += 1
+            print(f"[WARN] {run_id}: {e}")
+        if len(pending) >= batch or run_id == run_ids[-1]:
+            conn = pool.acquire_writer()
+            try:
+                with conn:
+                    conn.executemany("UPDATE measurements SET stats_json = ? WHERE id = ?", pending)
+            finally:
+                pool.release_writer(conn)
+            done += len(pending)
+            pending = []
+
+    elapsed = time.perf_counter() - start
+    print(f"[OK] {done} mediciones actualizadas en {elapsed:.1f} s ({failed} con errores)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Completa stats_json de mediciones antiguas")
+    parser.add_argument("--batch", type=int, default=100, help="Mediciones por transacción")
+    args = parser.parse_args()
+    backfill_stats(args.batch)
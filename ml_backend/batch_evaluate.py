@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Script para clasificar por lotes un directorio de mediciones CSV.
+Reemplaza la evaluación interactiva de Evaluacion.py: no pregunta nada,
+acepta CSV crudos y exportaciones del frontend, reparte los archivos en un
+pool de procesos (cada proceso carga el modelo una sola vez) y escribe una
+tabla resumen con la etiqueta y los tiempos de cada archivo.
+"""
+
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+from classification import WINDOW, classify_table, load_normalization, read_measurement_file
+from inference import BACKENDS, MODEL_PATH, init_worker, predict_in_worker
+
+MM_PATH = os.path.join(os.path.dirname(__file__), "MaxiMini.npz")
+
+SUMMARY_FIELDS = [
+    "file", "status", "sensors", "samples", "n_windows", "dominant_regimen",
+    "laminar", "transition", "turbulent", "first_window", "parse_ms", "classify_ms", "error",
+]
+
+def evaluate_file(path: str, mini: float, maxi: float, hop: int, batch_size: int) -> Dict[str, Any]:
+    """Clasifica un archivo dentro de un trabajador del pool."""
+    row: Dict[str, Any] = {"file": path}
+    try:
+        start = time.perf_counter()
+        header, data, _ = read_measurement_file(path)
+        parsed = time.perf_counter()
+        result = classify_table(header, data, predict_in_worker, mini, maxi, WINDOW, hop, batch_size)
+        done = time.perf_counter()
+    except Exception as e:
+        row.update({"status": "error", "error": str(e)})
+        return row
+
+    counts = result["counts"]
+    row.update({
+        "status": "ok" if result["n_windows"] else "corta",
+        "sensors": " ".join(result["sensors"]),
+        "samples": result["samples"],
+        "n_windows": result["n_windows"],
+        "dominant_regimen": result["dominant_regimen"],
+        "laminar": counts["LAMINAR"],
+        "transition": counts["TRANSITION"],
+        "turbulent": counts["TURBULENT"],
+        # La primera ventana es la que evaluaba Evaluacion.py (muestras 0..349)
+        "first_window": result["timeline"][0]["label"] if result["timeline"] else "",
+        "parse_ms": round((parsed - start) * 1000, 2),
+        "classify_ms": round((done - parsed) * 1000, 2),
+        "error": "",
+    })
+    return row
+
+def batch_evaluate(directory: str, pattern: str = "*.csv", workers: int = os.cpu_count() or 1,
+                   backend: str = "keras", hop: int = 30, batch_size: int = 256,
+                   output: str = "resumen_evaluacion.csv") -> List[Dict[str, Any]]:
+    """Clasifica todos los archivos del directorio y escribe la tabla resumen."""
+    files = sorted(str(p) for p in Path(directory).glob(pattern) if p.is_file())
+    if not files:
+        print(f"[ERROR] No hay archivos '{pattern}' en: {directory}")
+        return []
+
+    mini, maxi = load_normalization(MM_PATH)
+    print(f"[INFO] {len(files)} archivos, {workers} procesos, motor '{backend}'")
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(backend, MODEL_PATH)) as pool:
+        futures = [pool.submit(evaluate_file, f, mini, maxi, hop, batch_size) for f in files]
+        rows = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    with open(output, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({k: row.get(k, "") for k in SUMMARY_FIELDS})
+
+    for row in rows:
+        name = os.path.basename(row["file"])
+        if row["status"] == "error":
+            print(f"  {name}: ERROR {row['error']}")
+        else:
+            print(f"  {name}: {row['dominant_regimen']} ({row['n_windows']} ventanas, {row['classify_ms']} ms)")
+    errors = sum(1 for row in rows if row["status"] == "error")
+    print(f"[OK] {len(rows)} archivos en {elapsed:.2f}s ({len(rows) / elapsed:.1f} archivos/s), {errors} con error")
+    print(f"[OK] Resumen escrito en: {output}")
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clasificación por lotes de mediciones CSV")
+    parser.add_argument("directory", help="Directorio con mediciones (p. ej. mediciones_guardadas/)")
+    parser.add_argument("--pattern", default="*.csv", help="Patrón de archivos (por defecto *.csv)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Procesos del pool")
+    parser.add_argument("--backend", choices=BACKENDS, default="keras", help="Motor de inferencia")
+    parser.add_argument("--hop", type=int, default=30, help="Salto entre ventanas")
+    parser.add_argument("--batch-size", type=int, default=256, help="Ventanas por llamada al modelo")
+    parser.add_argument("--output", default="resumen_evaluacion.csv", help="Archivo de la tabla resumen")
+    args = parser.parse_args()
+    batch_evaluate(args.directory, args.pattern, args.workers, args.backend,
+                   args.hop, args.batch_size, args.output)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Script para medir cuántas peticiones por segundo atiende el backend.
+Lanza peticiones concurrentes a /historial y a /runs/{id} contra un
+servidor ya levantado y reporta el throughput y la latencia de cada uno.
+"""
+
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from urllib.request import urlopen
+
+import numpy as np
+
+DEFAULT_URL = "http://127.0.0.1:8765"
+
+def _fetch(url: str) -> float:
+    start = time.perf_counter()
+    with urlopen(url, timeout=30) as response:
+        response.read()
+    return time.perf_counter() - start
+
+def bench_endpoint(name: str, urls: List[str], concurrency: int) -> None:
+    """Recorre `urls` con `concurrency` clientes simultáneos."""
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(_fetch, urls[:concurrency]))  # Calentamiento
+        start = time.perf_counter()
+        latencies = np.array(list(pool.map(_fetch, urls)))
+        elapsed = time.perf_counter() - start
+    print(f"[INFO] {name}: {len(urls) / elapsed:8.1f} req/s  "
+          f"p50 {np.percentile(latencies, 50) * 1000:6.1f} ms  "
+          f"p95 {np.percentile(latencies, 95) * 1000:6.1f} ms  "
+          f"({len(urls)} peticiones, {concurrency} concurrentes)")
+
+def bench_api(base_url: str = DEFAULT_URL, requests: int = 500, concurrency: int = 16) -> None:
+    try:
+        with urlopen(f"{base_url}/historial?limit=50", timeout=30) as response:
+            runs = json.loads(response.read())["runs"]
+    except Exception as e:
+        print(f"[ERROR] No se pudo consultar {base_url}: {e}")
+        return
+    if not runs:
+        print("[ERROR] No hay mediciones en la base de datos")
+        return
+
+    bench_endpoint("/historial", [f"{base_url}/historial?limit=50"] * requests, concurrency)
+    ids = [run["id"] for run in runs]
+    bench_endpoint("/runs/{id}", [f"{base_url}/runs/{ids[i % len(ids)]}" for i in range(requests)], concurrency)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput de /historial y /runs/{id}")
+    parser.add_argument("--url", default=DEFAULT_URL, help=f"URL del backend (por defecto {DEFAULT_URL})")
+    parser.add_argument("--requests", type=int, default=500, help="Peticiones por endpoint")
+    parser.add_argument("--concurrency", type=int, default=16, help="Clientes simultáneos")
+    args = parser.parse_args()
+    bench_api(args.url, args.requests, args.concurrency)
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Script para decidir si conviene la inferencia cuantizada (float16/int8).
+
+Compara cada motor contra el modelo float32 de referencia sobre ventanas de
+señales de prueba (`Prueba_Re_*.csv`, exportaciones del frontend) y de las
+mediciones guardadas en la base, normalizadas con MaxiMini.npz. Reporta por
+motor: latencia de una ventana, ventanas por segundo en lotes grandes,
+memoria (pesos y RSS del proceso al cargarlo) y coincidencia de etiquetas
+con la referencia. Los .tflite cuantizados se generan con:
+python export_model.py --precision float16 --precision int8
+"""
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from classification import LABELS, WINDOW, load_normalization
+from export import NORMALIZATION_PATH, sample_windows
+from inference import ENGINES, MODEL_PATH, InferenceEngine, load_engine
+
+CANDIDATES = ("tflite", "tflite-float16", "tflite-int8", "numpy")
+DEFAULT_SIGNALS = [
+    str(Path(__file__).resolve().parent.parent / "mediciones_guardadas"),
+    str(Path(__file__).resolve().parent),
+]
+
+def rss_bytes() -> int:
+    """Memoria residente del proceso (Linux/Raspberry Pi; 0 si no se puede leer)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+def load_measured(backend: str, model_path: str) -> Optional[Dict[str, Any]]:
+    """Carga un motor y mide cuánto creció el proceso hasta su primera predicción."""
+    before = rss_bytes()
+    start = time.perf_counter()
+    try:
+        engine = load_engine(backend, model_path)
+        engine.predict(np.zeros((1, WINDOW, 1), dtype=np.float32))
+    except Exception as e:
+        print(f"[WARN] Motor '{backend}' no disponible: {e}")
+        return None
+    return {
+        "engine": engine,
+        "load_s": time.perf_counter() - start,
+        "weights_bytes": engine.nbytes,
+        "rss_bytes": max(0, rss_bytes() - before),
+    }
+
+def predict_all(engine: InferenceEngine, windows: np.ndarray, batch_size: int) -> np.ndarray:
+    return np.concatenate([
+        engine.predict(windows[i:i + batch_size]) for i in range(0, len(windows), batch_size)
+    ])
+
+def latency_ms(engine: InferenceEngine, windows: np.ndarray, n: int) -> Dict[str, float]:
+    """Latencia de una ventana sola, como en una sesión en vivo."""
+    times = []
+    for window in windows[:n]:
+        start = time.perf_counter()
+        engine.predict(window[np.newaxis])
+        times.append((time.perf_counter() - start) * 1000)
+    return {"p50": float(np.percentile(times, 50)), "p95": float(np.percentile(times, 95))}
+
+def throughput(engine: InferenceEngine, windows: np.ndarray, batch_size: int, repeat: int) -> float:
+    """Ventanas por segundo en lotes de `batch_size` (mejor de `repeat`)."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        predict_all(engine, windows, batch_size)
+        best = min(best, time.perf_counter() - start)
+    return len(windows) / best
+
+def agreement(probs: np.ndarray, reference: np.ndarray) -> Dict[str, Any]:
+    labels, ref_labels = probs.argmax(axis=1), reference.argmax(axis=1)
+    return {
+        "agree": float(np.mean(labels == ref_labels)),
+        "max_abs_diff": float(np.max(np.abs(probs - reference))),
+        # Coincidencia por clase de la referencia: un modelo puede fallar sólo en una
+        "per_class": {
+            LABELS[k]: float(np.mean(labels[ref_labels == k] == k))
+            for k in range(len(LABELS)) if np.any(ref_labels == k)
+        },
+    }
+
+def signal_files(paths: List[str]) -> List[str]:
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            # Sólo el nivel indicado: la carpeta del backend tiene otros .csv
+            pattern = "Prueba_Re_*.csv" if path.resolve() == Path(__file__).resolve().parent else "*.csv"
+            files.extend(sorted(str(p) for p in path.glob(pattern)))
+        elif path.is_file():
+            files.append(str(path))
+    return files
+
+def bench_quantization(model_path: str = MODEL_PATH, reference: str = "keras",
+                       candidates: List[str] = list(CANDIDATES), signals: List[str] = DEFAULT_SIGNALS,
+                       n_windows: int = 2000, hop: int = 50, batch_size: int = 256,
+                       latency_windows: int = 200, repeat: int = 3) -> Dict[str, Any]:
+    mini, maxi = load_normalization(NORMALIZATION_PATH)
+    datasets = {}
+    files = signal_files(signals)
+    if files:
+        datasets["señales"] = sample_windows(n_windows, mini, maxi, hop, files=files)
+    stored = sample_windows(n_windows, mini, maxi, hop, seed=1)
+    if len(stored):
+        datasets["base"] = stored
+    datasets = {name: windows for name, windows in datasets.items() if len(windows)}
+    if not datasets:
+        print("[ERROR] No hay ventanas: ni archivos de señal ni mediciones guardadas")
+        return {}
+    for name, windows in datasets.items():
+        print(f"[INFO] {name}: {len(windows)} ventanas")
+
+    ref = load_measured(reference, model_path)
+    if ref is None:
+        print("[ERROR] No se pudo cargar el modelo de referencia")
+        return {}
+    ref_probs = {name: predict_all(ref["engine"], w, batch_size) for name, w in datasets.items()}
+    all_windows = np.concatenate(list(datasets.values()))
+
+    report: Dict[str, Any] = {"reference": reference, "windows": {n: len(w) for n, w in datasets.items()},
+                              "engines": {}}
+    for backend in [reference] + [b for b in candidates if b != reference]:
+        loaded = ref if backend == reference else load_measured(backend, model_path)
+        if loaded is None:
+            continue
+        engine = loaded["engine"]
+        row = {
+            "load_s": round(loaded["load_s"], 3),
+            "weights_bytes": loaded["weights_bytes"],
+            "rss_bytes": loaded["rss_bytes"],
+            "latency_ms": latency_ms(engine, all_windows, latency_windows),
+            "windows_per_s": throughput(engine, all_windows, batch_size, repeat),
+            "agreement": {
+                name: agreement(predict_all(engine, windows, batch_size), ref_probs[name])
+                for name, windows in datasets.items()
+            },
+        }
+        report["engines"][backend] = row
+        agree = "  ".join(f"{name} {a['agree']:.2%} (Δp {a['max_abs_diff']:.3f})"
+                          for name, a in row["agreement"].items())
+        print(f"[OK] {backend:15s} 1 ventana p50 {row['latency_ms']['p50']:6.2f} ms "
+              f"p95 {row['latency_ms']['p95']:6.2f} ms  {row['windows_per_s']:8.0f} ventanas/s  "
+              f"pesos {row['weights_bytes'] / 1024:6.0f} KB  RSS +{row['rss_bytes'] / 1024 / 1024:5.1f} MB  "
+              f"coincidencia: {agree}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latencia, memoria y coincidencia de los modelos cuantizados")
+    parser.add_argument("model", nargs="?", default=MODEL_PATH, help="Ruta del modelo .h5")
+    parser.add_argument("--reference", choices=list(ENGINES), default="keras",
+                        help="Motor float32 de referencia (numpy si no hay TensorFlow)")
+    parser.add_argument("--engines", default=",".join(CANDIDATES), help="Motores a comparar, separados por comas")
+    parser.add_argument("--signals", nargs="*", default=DEFAULT_SIGNALS,
+                        help="Archivos o carpetas de señal (por defecto mediciones_guardadas y Prueba_Re_*.csv)")
+    parser.add_argument("--windows", type=int, default=2000, help="Ventanas por conjunto")
+    parser.add_argument("--hop", type=int, default=50, help="Salto entre ventanas candidatas")
+    parser.add_argument("--batch-size", type=int, default=256, help="Ventanas por llamada al medir rendimiento")
+    parser.add_argument("--json", default=None, help="Guardar el reporte completo en este archivo")
+    args = parser.parse_args()
+    result = bench_quantization(args.model, args.reference, args.engines.split(","), args.signals,
+                                args.windows, args.hop, args.batch_size)
+    if args.json and result:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"[OK] Reporte en {args.json}")
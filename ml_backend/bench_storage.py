@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Script para comparar el formato columnar contra el .csv.gz de siempre.
+Para cada medición mide bytes por muestra y el tiempo de decodificar los
+datos a arreglos NumPy (descomprimir + parsear texto vs. leer columnas).
+"""
+
+import argparse
+import gzip
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from classification import parse_measurement_text, read_measurement_file
+from columnar import encode_columns, read_columns, read_table
+
+def _best_time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def synthetic_table(samples: int, sensors: int, sampling_hz: float = 100.0,
+                    seed: int = 0) -> Tuple[List[str], np.ndarray]:
+    """Tabla de prueba con el mismo aspecto que una adquisición real."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(samples) / sampling_hz
+    base = 900 + 40 * np.sin(2 * np.pi * 0.5 * t)[:, np.newaxis]
+    noise = rng.normal(0, 3, (samples, sensors))
+    # El ADC entrega valores enteros
+    signals = np.round(base + noise)
+    header = ["time"] + [f"sensor{i + 1}" for i in range(sensors)]
+    return header, np.column_stack([t, signals])
+
+def table_to_csv_gz(header: List[str], data: np.ndarray) -> bytes:
+    """CSV con el mismo formato que `finalize_run`, ya comprimido."""
+    lines = ["#FRISAT_MEASUREMENT", "#RAW_HEADERS," + ",".join(header), "#collectedData"]
+    lines += [f"{i}," + ",".join(repr(float(v)) for v in row) for i, row in enumerate(data)]
+    return gzip.compress(("\r\n".join(lines) + "\r\n").encode("utf-8"))
+
+def bench_table(name: str, header: List[str], data: np.ndarray, csv_gz: Optional[bytes],
+                repeat: int) -> None:
+    if csv_gz is None:
+        csv_gz = table_to_csv_gz(header, data)
+    dtypes = ["<f8" if col == "time" else "<f4" for col in header]
+    blob = encode_columns(header, data, dtypes)
+    samples = max(1, data.shape[0])
+
+    csv_time = _best_time(lambda: parse_measurement_text(gzip.decompress(csv_gz).decode("utf-8")), repeat)
+    col_time = _best_time(lambda: read_table(blob), repeat)
+    # Caso típico de análisis: un solo sensor
+    sensor = next((c for c in header if c.startswith("sensor")), header[-1])
+    one_time = _best_time(lambda: read_columns(blob, [sensor]), repeat)
+
+    print(f"[INFO] {name}: {data.shape[0]} muestras x {len(header)} columnas")
+    print(f"       csv.gz   {len(csv_gz):>10} B  {len(csv_gz) / samples:6.2f} B/muestra  "
+          f"decodificar {csv_time * 1000:8.2f} ms")
+    print(f"       columnar {len(blob):>10} B  {len(blob) / samples:6.2f} B/muestra  "
+          f"decodificar {col_time * 1000:8.2f} ms  ({sensor}: {one_time * 1000:.2f} ms)")
+    print(f"       tamaño {len(blob) / len(csv_gz):.2f}x, decodificación {csv_time / max(col_time, 1e-9):.1f}x más rápida")
+
+def bench_storage(directory: Optional[str], pattern: str = "*.csv", samples: int = 100000,
+                  sensors: int = 2, repeat: int = 3) -> None:
+    """Compara ambos formatos sobre archivos guardados o sobre datos sintéticos."""
+    if directory is None:
+        header, data = synthetic_table(samples, sensors)
+        bench_table("sintético", header, data, None, repeat)
+        return
+
+    files = sorted(p for p in Path(directory).glob(pattern) if p.is_file())
+    if not files:
+        print(f"[ERROR] No hay archivos '{pattern}' en: {directory}")
+        return
+    for path in files:
+        try:
+            header, data, _ = read_measurement_file(str(path))
+        except Exception as e:
+            print(f"[WARN] {path.name}: {e}")
+            continue
+        raw = path.read_bytes()
+        csv_gz = raw if path.suffix == ".gz" else gzip.compress(raw)
+        bench_table(path.name, header, data.astype(np.float64), csv_gz, repeat)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tamaño y velocidad: csv.gz vs. columnar")
+    parser.add_argument("directory", nargs="?", help="Carpeta con mediciones (sin ella, datos sintéticos)")
+    parser.add_argument("--pattern", default="*.csv", help="Patrón de archivos (por defecto *.csv)")
+    parser.add_argument("--samples", type=int, default=100000, help="Muestras de la tabla sintética")
+    parser.add_argument("--sensors", type=int, default=2, help="Sensores de la tabla sintética")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por medición")
+    args = parser.parse_args()
+    bench_storage(args.directory, args.pattern, args.samples, args.sensors, args.repeat)
@@ -0,0 +1,318 @@
+"""
+Clasificación por ventanas deslizantes de mediciones completas.
+Versión vectorizada de Evaluacion.py: normaliza, arma todas las ventanas
+como vistas con strides y las clasifica en lotes grandes.
+"""
+
+import csv
+import gzip
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+WINDOW = 350
+LABELS = ["LAMINAR", "TRANSITION", "TURBULENT"]
+
+PredictFn = Callable[[np.ndarray], np.ndarray]
+
+
+def load_normalization(path: str) -> Tuple[float, float]:
+    """Lee `mini` y `maxi` de un archivo MaxiMini.npz."""
+    mm = np.load(path)
+    return float(mm["mini"]), float(mm["maxi"])
+
+
+def normalize(x: np.ndarray, mini: float, maxi: float) -> np.ndarray:
+    """Recorta a [mini, maxi] y escala a [0, 1] (igual que en el servidor)."""
+    x = np.clip(np.asarray(x, dtype=np.float32), mini, maxi)
+    return ((x - mini) / (maxi - mini)).astype(np.float32)
+
+
+def parse_measurement_csv(text: str) -> Tuple[List[str], np.ndarray]:
+    """
+    Lee el CSV que genera `finalize_run`.
+
+    Args:
+        text: Contenido del CSV (ya descomprimido)
+
+    Returns:
+        Tupla (encabezados, datos) donde `datos` tiene forma
+        `(n_muestras, len(encabezados))`; se descarta el número de muestra
+    """
+    header: List[str] = []
+    data_lines = []
+    for line in text.splitlines():
+        if not line:
+            continue
+        if line.startswith("#"):
+            if line.startswith("#RAW_HEADERS"):
+                header = next(csv.reader([line]))[1:]
+            continue
+        data_lines.append(line)
+
+    if not data_lines:
+        return header, np.empty((0, len(header)), dtype=np.float64)
+    values = np.loadtxt(data_lines, delimiter=",", dtype=np.float64, ndmin=2)
+    return header, values[:, 1:1 + len(header)]
+
+
+# Claves del bloque "Resumen de la Prueba" de la exportación del frontend
+# (en todos los idiomas de src/lib/i18n.ts)
+SUMMARY_KEYS = {
+    "Nombre del archivo": "file_name",
+    "File name": "file_name",
+    "Nom du fichier": "file_name",
+    "Dateiname": "file_name",
+    "startTime": "start_time",
+    "Hora de Inicio": "start_time",
+    "Start Time": "start_time",
+    "Heure de Début": "start_time",
+    "Startzeit": "start_time",
+    "durationLabel": "duration_label",
+    "Duración": "duration_label",
+    "Duration": "duration_label",
+    "Durée": "duration_label",
+    "Dauer": "duration_label",
+    "samplesPerSecondLabel": "sampling_label",
+    "Muestras por segundo": "sampling_label",
+    "Samples per second": "sampling_label",
+    "Échantillons par seconde": "sampling_label",
+    "Abtastungen pro Sekunde": "sampling_label",
+    "totalSamples": "total_samples",
+    "dominantRegimen": "dominant_regimen",
+}
+SUMMARY_TITLES = ("Resumen de la Prueba", "Test Summary", "Résumé du Test", "Testzusammenfassung")
+COLLECTED_DATA_TITLES = ("Datos Recolectados", "Collected Data", "Données Collectées", "Gesammelte Daten")
+
+# Comentarios del CSV guardado por finalize_run
+STORED_KEYS = {
+    "#startTime": "start_time",
+    "#durationLabel": "duration_label",
+    "#samplesPerSecondLabel": "sampling_label",
+    "#totalSamples": "total_samples",
+    "#dominantRegimen": "dominant_regimen",
+}
+
+
+def _column_key(title: str) -> str:
+    """Convierte un título visible ('Sensor 1', 'Régimen de Flujo') en su clave."""
+    title = title.strip()
+    if title.lower().startswith("sensor"):
+        return "sensor" + title[len("sensor"):].strip()
+    if title.lower().startswith("r") and "gimen" in title.lower():
+        return "regimen"
+    return title
+
+
+def _load_numeric(lines: List[str], columns: List[int]) -> np.ndarray:
+    if not lines or not columns:
+        return np.empty((0, len(columns)), dtype=np.float64)
+    return np.loadtxt(lines, delimiter=",", dtype=np.float64, usecols=columns, ndmin=2)
+
+
+def parse_export_csv(text: str) -> Tuple[List[str], np.ndarray, Dict[str, Any]]:
+    """
+    Lee el CSV que exporta el frontend: bloque "Resumen de la Prueba",
+    estadísticas, `#RAW_HEADERS` (opcional en archivos antiguos) y
+    "Datos Recolectados" con una fila de títulos.
+
+    Returns:
+        Tupla (encabezados numéricos, datos, metadatos del resumen)
+    """
+    lines = text.lstrip("\ufeff").splitlines()
+    meta: Dict[str, Any] = {}
+    raw_header: Optional[List[str]] = None
+    data_start = None
+    i = 0
+    while i < len(lines):
+        row = next(csv.reader([lines[i]]), [])
+        if row and row[0] == "#RAW_HEADERS":
+            raw_header = row[1:]
+        elif row and row[0] in COLLECTED_DATA_TITLES:
+            titles = next(csv.reader([lines[i + 1]]), []) if i + 1 < len(lines) else []
+            if raw_header is None:
+                raw_header = [_column_key(t) for t in titles[1:]]
+            data_start = i + 2
+            break
+        elif len(row) >= 2 and row[0] in SUMMARY_KEYS and SUMMARY_KEYS[row[0]] not in meta:
+            meta[SUMMARY_KEYS[row[0]]] = row[1]
+        i += 1
+
+    if data_start is None or raw_header is None:
+        raise ValueError("No se encontró la sección 'Datos Recolectados'")
+
+    # Sólo columnas numéricas: el régimen por muestra es texto
+    keep = [j for j, name in enumerate(raw_header) if name == "time" or name.startswith("sensor")]
+    data_lines = [line for line in lines[data_start:] if line.strip()]
+    data = _load_numeric(data_lines, [j + 1 for j in keep])
+    return [raw_header[j] for j in keep], data, meta
+
+
+def parse_raw_csv(text: str) -> Tuple[List[str], np.ndarray, Dict[str, Any]]:
+    """
+    Lee un CSV crudo como `Prueba_Re_*.csv`: una fila de títulos y columnas
+    numéricas; cada columna se trata como un sensor.
+    """
+    lines = [line for line in text.lstrip("\ufeff").splitlines() if line.strip()]
+    if not lines:
+        return [], np.empty((0, 0), dtype=np.float64), {}
+    titles = next(csv.reader([lines[0]]))
+    data = _load_numeric(lines[1:], list(range(len(titles))))
+    header = []
+    for j, title in enumerate(titles):
+        key = _column_key(title)
+        header.append(key if key == "time" or key.startswith("sensor") else f"sensor{j + 1}")
+    return header, data, {}
+
+
+def parse_measurement_text(text: str) -> Tuple[List[str], np.ndarray, Dict[str, Any]]:
+    """
+    Detecta el formato de una medición y la lee.
+
+    Formatos soportados: CSV guardado en la base de datos (`#FRISAT_MEASUREMENT`),
+    exportación del frontend ("Resumen de la Prueba") y CSV crudo.
+
+    Returns:
+        Tupla (encabezados, datos `(n_muestras, len(encabezados))`, metadatos)
+    """
+    head = text.lstrip("\ufeff")[:200]
+    if head.startswith("#FRISAT_MEASUREMENT"):
+        meta: Dict[str, Any] = {}
+        for line in text.splitlines():
+            if not line.startswith("#"):
+                continue
+            row = next(csv.reader([line]))
+            if len(row) >= 2 and row[0] in STORED_KEYS:
+                meta[STORED_KEYS[row[0]]] = row[1]
+        header, data = parse_measurement_csv(text)
+        return header, data, meta
+    if any(title in head for title in SUMMARY_TITLES) or any(
+            f'"{title}"' in text for title in COLLECTED_DATA_TITLES):
+        return parse_export_csv(text)
+    return parse_raw_csv(text)
+
+
+def read_measurement_file(path: str) -> Tuple[List[str], np.ndarray, Dict[str, Any]]:
+    """Lee una medición desde disco (acepta .csv y .csv.gz)."""
+    if path.endswith(".gz"):
+        with gzip.open(path, "rt", encoding="utf-8-sig") as f:
+            return parse_measurement_text(f.read())
+    with open(path, "r", encoding="utf-8-sig") as f:
+        return parse_measurement_text(f.read())
+
+
+def sensor_columns(header: List[str]) -> List[int]:
+    """Índices de las columnas de sensores dentro del encabezado."""
+    return [i for i, name in enumerate(header) if name.startswith("sensor")]
+
+
+def sliding_windows(signals: np.ndarray, window: int = WINDOW, hop: int = 1) -> np.ndarray:
+    """
+    Todas las ventanas de una señal como vista con strides, sin copiar.
+
+    Args:
+        signals: Arreglo `(n_muestras, n_sensores)`
+        window: Tamaño de la ventana
+        hop: Salto entre ventanas consecutivas
+
+    Returns:
+        Vista `(n_ventanas, n_sensores, window)`
+    """
+    if signals.shape[0] < window:
+        return np.empty((0, signals.shape[1], window), dtype=signals.dtype)
+    view = np.lib.stride_tricks.sliding_window_view(signals, window, axis=0)
+    return view[::hop]
+
+
+def classify_windows(predict_fn: PredictFn, windows: np.ndarray,
+                     batch_size: int = 256) -> np.ndarray:
+    """
+    Clasifica la vista de `sliding_windows` en lotes de `batch_size` ventanas.
+
+    Returns:
+        Probabilidades `(n_ventanas, n_sensores, clases)`
+    """
+    n_windows, n_sensors, window = windows.shape
+    per_call = max(1, batch_size // max(1, n_sensors))
+    outputs = []
+    for i in range(0, n_windows, per_call):
+        # Sólo el lote actual se copia a memoria contigua
+        chunk = np.ascontiguousarray(windows[i:i + per_call]).reshape(-1, window, 1)
+        probs = np.asarray(predict_fn(chunk))
+        outputs.append(probs.reshape(-1, n_sensors, probs.shape[-1]))
+    if not outputs:
+        return np.empty((0, n_sensors, len(LABELS)), dtype=np.float32)
+    return np.concatenate(outputs, axis=0)
+
+
+def classify_measurement(text: str, predict_fn: PredictFn, mini: float, maxi: float,
+                         window: int = WINDOW, hop: int = 30,
+                         batch_size: int = 256) -> Dict[str, Any]:
+    """
+    Clasifica una medición completa y arma la línea de tiempo de regímenes.
+
+    Args:
+        text: CSV de la medición (cualquier formato de `parse_measurement_text`)
+        predict_fn: Función que recibe `(n, window, 1)` y devuelve `(n, clases)`
+        mini, maxi: Parámetros de normalización
+        window: Tamaño de la ventana
+        hop: Salto entre ventanas
+        batch_size: Ventanas por llamada al modelo
+
+    Returns:
+        Diccionario con la línea de tiempo por ventana y un resumen
+    """
+    header, data, _ = parse_measurement_text(text)
+    return classify_table(header, data, predict_fn, mini, maxi, window, hop, batch_size)
+
+
+def classify_table(header: List[str], data: np.ndarray, predict_fn: PredictFn,
+                   mini: float, maxi: float, window: int = WINDOW, hop: int = 30,
+                   batch_size: int = 256) -> Dict[str, Any]:
+    """Igual que `classify_measurement`, pero sobre datos ya leídos."""
+    columns = sensor_columns(header)
+    if not columns:
+        raise ValueError("La medición no tiene columnas de sensores")
+    time_col: Optional[int] = header.index("time") if "time" in header else None
+
+    signals = normalize(data[:, columns], mini, maxi)
+    probs = classify_windows(predict_fn, sliding_windows(signals, window, hop), batch_size)
+
+    fused = probs.mean(axis=1)
+    labels = fused.argmax(axis=1)
+    sensor_labels = probs.argmax(axis=2)
+    names = [header[i] for i in columns]
+
+    timeline = []
+    for k in range(probs.shape[0]):
+        start = k * hop
+        end = start + window - 1
+        entry: Dict[str, Any] = {
+            "index": k,
+            "start_sample": start,
+            "end_sample": end,
+            "label": LABELS[int(labels[k])],
+            "probs": fused[k].tolist(),
+        }
+        if time_col is not None:
+            entry["start_time"] = float(data[start, time_col])
+            entry["end_time"] = float(data[end, time_col])
+        if len(columns) > 1:
+            entry["sensors"] = [
+                {"sensor": name, "label": LABELS[int(sensor_labels[k, j])], "probs": probs[k, j].tolist()}
+                for j, name in enumerate(names)
+            ]
+        timeline.append(entry)
+
+    counts = {label: int(np.sum(labels == i)) for i, label in enumerate(LABELS)}
+    dominant = max(counts, key=counts.get) if timeline else "indeterminado"
+    return {
+        "window": window,
+        "hop": hop,
+        "samples": int(data.shape[0]),
+        "sensors": names,
+        "n_windows": len(timeline),
+        "counts": counts,
+        "dominant_regimen": dominant,
+        "timeline": timeline,
+    }
@@ -1,13 +1,21 @@
 #!/usr/bin/env python3
 """
-Script para limpiar mediciones en estado 'writing'.
+Script para limpiar mediciones en estado 'writing' o 'failed' abandonadas.
+Sólo borra las creadas hace más de `--older-than` horas, para no tocar
+grabaciones en curso; el servidor hace lo mismo periódicamente (ver
+maintenance.py).
 """
 
+import argparse
+import os
 import sqlite3
+from datetime import datetime, timedelta
 from pathlib import Path
 
-def clean_database():
-    """Limpia mediciones en estado 'writing'."""
+DEFAULT_HOURS = float(os.environ.get("FRISAT_STALE_RUN_HOURS", 24))
+
+def clean_database(older_than_hours: float = DEFAULT_HOURS):
+    """Limpia mediciones en estado 'writing' o 'failed' más viejas que `older_than_hours`."""
     
     # Configurar ruta de la base de datos
     import platform
@@ -24,17 +32,20 @@ def clean_database():
         conn = sqlite3.connect(str(db_path))
         cursor = conn.cursor()
         
-        # Contar mediciones en estado writing
-        cursor.execute("SELECT COUNT(*) FROM measurements WHERE status = 'writing'")
-        writing_count = cursor.fetchone()[0]
+        # Los fragmentos pendientes se borran en cascada
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cutoff = (datetime.now() - timedelta(hours=older_than_hours)).isoformat()
+        cursor.execute(
+            "DELETE FROM measurements WHERE status IN ('writing', 'failed') AND created_at < ?",
+            (cutoff,)
+        )
+        deleted = cursor.rowcount
+        conn.commit()
         
-        if writing_count > 0:
-            # Eliminar mediciones en estado writing
-            cursor.execute("DELETE FROM measurements WHERE status = 'writing'")
-            conn.commit()
-            print(f"[OK] Eliminadas {writing_count} mediciones en estado 'writing'")
+        if deleted > 0:
+            print(f"[OK] Eliminadas {deleted} mediciones 'writing'/'failed' de más de {older_than_hours:g} h")
         else:
-            print("[INFO] No hay mediciones en estado 'writing' para eliminar")
+            print(f"[INFO] No hay mediciones 'writing'/'failed' de más de {older_than_hours:g} h para eliminar")
         
         # Mostrar estado actual
         cursor.execute("SELECT status, COUNT(*) FROM measurements GROUP BY status")
@@ -50,5 +61,9 @@ def clean_database():
         print(f"[ERROR] Error limpiando base de datos: {e}")
 
 if __name__ == "__main__":
-    clean_database()
+    parser = argparse.ArgumentParser(description="Borra mediciones sin terminar abandonadas")
+    parser.add_argument("--older-than", type=float, default=DEFAULT_HOURS,
+                        help=f"Antigüedad mínima en horas (por defecto {DEFAULT_HOURS:g}; 0 borra todas)")
+    args = parser.parse_args()
+    clean_database(args.older_than)
 
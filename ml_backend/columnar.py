@@ -0,0 +1,280 @@
+"""
+Formato columnar binario de las mediciones de FRISAT.
+
+Cada columna se guarda como un arreglo numérico partido en bloques de
+`block_rows` filas; cada bloque se comprime por separado con zlib, después
+de reordenar sus bytes ("shuffle") para que los bytes altos de los floats,
+que casi no cambian, queden juntos. Al final va un índice JSON con la
+posición de cada bloque, así se puede leer una columna o un rango de filas
+sin descomprimir el resto.
+
+Estructura:
+    MAGIC | bloques... | índice JSON | largo del índice (uint32 LE) | MAGIC
+"""
+
+import csv
+import json
+import struct
+import zlib
+from io import StringIO
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+MAGIC = b"FRCOL1"
+VERSION = 1
+BLOCK_ROWS = 4096
+COMPRESSION_LEVEL = 6
+
+# Formato de texto al regenerar el CSV, según el tipo de la columna
+CSV_FORMATS = {"<f4": "%.7g", "<f8": "%.10g"}
+
+
+def _shuffle(raw: bytes, itemsize: int) -> bytes:
+    return np.frombuffer(raw, dtype=np.uint8).reshape(-1, itemsize).T.tobytes()
+
+
+def _unshuffle(raw: bytes, itemsize: int) -> bytes:
+    return np.frombuffer(raw, dtype=np.uint8).reshape(itemsize, -1).T.tobytes()
+
+
+class ColumnarWriter:
+    """
+    Construye un archivo columnar a medida que llegan filas.
+
+    Sin `sink`, las partes comprimidas se juntan en memoria y `finish`
+    devuelve el archivo completo. Con `sink`, cada parte (cabecera, bloques
+    y cola con el índice) se le entrega apenas está lista y en memoria sólo
+    quedan las filas del bloque en curso y el índice; el archivo es la
+    concatenación, en orden, de todo lo entregado.
+
+    Args:
+        names: Nombre de cada columna
+        dtypes: Tipo de cada columna (`"<f4"` o `"<f8"`)
+        block_rows: Filas por bloque comprimido
+        sink: Destino de cada parte del archivo (p. ej. una tabla de fragmentos)
+    """
+
+    def __init__(self, names: Sequence[str], dtypes: Sequence[str],
+                 block_rows: int = BLOCK_ROWS, level: int = COMPRESSION_LEVEL,
+                 sink: Optional[Callable[[bytes], None]] = None):
+        if len(names) != len(dtypes):
+            raise ValueError("names y dtypes deben tener el mismo largo")
+        self.names = list(names)
+        self.dtypes = [np.dtype(d).str for d in dtypes]
+        self.block_rows = int(block_rows)
+        self.level = level
+        self.rows = 0
+        self._parts: List[bytes] = []
+        self._sink = sink
+        self._offset = 0
+        self._emit(MAGIC)
+        self._blocks: List[List[List[int]]] = [[] for _ in self.names]
+        self._pending: List[np.ndarray] = []
+        self._pending_rows = 0
+
+    def append(self, block: np.ndarray) -> None:
+        """Agrega un bloque `[n, len(names)]` de filas."""
+        block = np.asarray(block)
+        if block.ndim != 2 or block.shape[1] != len(self.names):
+            raise ValueError(f"Se esperaba un bloque [n, {len(self.names)}]")
+        if block.shape[0] == 0:
+            return
+        self._pending.append(block)
+        self._pending_rows += block.shape[0]
+        if self._pending_rows >= self.block_rows:
+            data = np.concatenate(self._pending, axis=0)
+            full = (data.shape[0] // self.block_rows) * self.block_rows
+            for start in range(0, full, self.block_rows):
+                self._write_block(data[start:start + self.block_rows])
+            rest = data[full:]
+            self._pending = [rest] if rest.shape[0] else []
+            self._pending_rows = rest.shape[0]
+
+    @property
+    def size(self) -> int:
+        """Bytes del archivo escritos hasta ahora."""
+        return self._offset
+
+    def _emit(self, part: bytes) -> None:
+        if self._sink is not None:
+            self._sink(part)
+        else:
+            self._parts.append(part)
+        self._offset += len(part)
+
+    def _write_block(self, data: np.ndarray) -> None:
+        for j, dtype in enumerate(self.dtypes):
+            column = np.ascontiguousarray(data[:, j], dtype=dtype)
+            payload = zlib.compress(_shuffle(column.tobytes(), column.itemsize), self.level)
+            self._blocks[j].append([self._offset, len(payload)])
+            self._emit(payload)
+        self.rows += data.shape[0]
+
+    def finish(self, meta: Optional[Dict[str, Any]] = None) -> Optional[bytes]:
+        """
+        Cierra el archivo: escribe el último bloque y el índice.
+
+        Args:
+            meta: Datos libres que se guardan en el índice (p. ej. el preámbulo CSV)
+
+        Returns:
+            El archivo completo, o None si las partes se entregaron a `sink`
+        """
+        if self._pending_rows:
+            self._write_block(np.concatenate(self._pending, axis=0))
+            self._pending = []
+            self._pending_rows = 0
+        index = {
+            "version": VERSION,
+            "rows": self.rows,
+            "block_rows": self.block_rows,
+            "shuffle": True,
+            "columns": [
+                {"name": name, "dtype": dtype, "blocks": blocks}
+                for name, dtype, blocks in zip(self.names, self.dtypes, self._blocks)
+            ],
+            "meta": meta or {},
+        }
+        footer = json.dumps(index, separators=(",", ":")).encode("utf-8")
+        self._emit(footer + struct.pack("<I", len(footer)) + MAGIC)
+        if self._sink is not None:
+            return None
+        return b"".join(self._parts)
+
+
+def encode_columns(names: Sequence[str], data: np.ndarray, dtypes: Sequence[str] = None,
+                   meta: Optional[Dict[str, Any]] = None, block_rows: int = BLOCK_ROWS) -> bytes:
+    """Codifica una tabla completa `[n, len(names)]` de una sola vez."""
+    writer = ColumnarWriter(names, dtypes or ["<f4"] * len(names), block_rows)
+    writer.append(data)
+    return writer.finish(meta)
+
+
+def read_index(blob: bytes) -> Dict[str, Any]:
+    """Lee el índice del final del archivo."""
+    return read_index_at(lambda offset, size: blob[offset:offset + size], len(blob))
+
+
+def read_index_at(read: Callable[[int, int], bytes], length: int) -> Dict[str, Any]:
+    """
+    Lee el índice sin tener el archivo entero en memoria.
+
+    Args:
+        read: Función `(posición, tamaño) -> bytes` sobre el archivo
+        length: Tamaño total del archivo
+    """
+    tail = len(MAGIC) + 4
+    if length < len(MAGIC) + tail or read(0, len(MAGIC)) != MAGIC:
+        raise ValueError("No es un archivo columnar de FRISAT")
+    end = read(length - tail, tail)
+    if end[4:] != MAGIC:
+        raise ValueError("No es un archivo columnar de FRISAT")
+    (size,) = struct.unpack("<I", end[:4])
+    return json.loads(bytes(read(length - tail - size, size)).decode("utf-8"))
+
+
+def read_columns(blob: bytes, columns: Optional[Sequence[str]] = None, start: int = 0,
+                 stop: Optional[int] = None, index: Optional[Dict[str, Any]] = None) -> Dict[str, np.ndarray]:
+    """
+    Decodifica columnas del archivo a arreglos NumPy.
+
+    Sólo se descomprimen los bloques que cubren las filas `[start, stop)`.
+
+    Args:
+        blob: Archivo columnar completo
+        columns: Columnas a leer (todas si es None)
+        start: Primera fila
+        stop: Fila final, exclusiva (hasta el final si es None)
+        index: Índice ya leído con `read_index`, para no repetirlo
+
+    Returns:
+        Diccionario nombre -> arreglo 1D
+    """
+    index = index or read_index(blob)
+    rows = index["rows"]
+    block_rows = index["block_rows"]
+    start = max(0, min(int(start), rows))
+    stop = rows if stop is None else max(start, min(int(stop), rows))
+    by_name = {c["name"]: c for c in index["columns"]}
+    names = list(columns) if columns is not None else list(by_name)
+
+    first = start // block_rows
+    last = -(-stop // block_rows)
+    view = memoryview(blob)
+    out: Dict[str, np.ndarray] = {}
+    for name in names:
+        if name not in by_name:
+            raise KeyError(f"Columna inexistente: {name}")
+        column = by_name[name]
+        dtype = np.dtype(column["dtype"])
+        parts = []
+        for offset, size in column["blocks"][first:last]:
+            raw = zlib.decompress(view[offset:offset + size])
+            if index.get("shuffle"):
+                raw = _unshuffle(raw, dtype.itemsize)
+            parts.append(np.frombuffer(raw, dtype=dtype))
+        values = np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+        base = first * block_rows
+        out[name] = values[start - base:stop - base]
+    return out
+
+
+def read_table(blob: bytes, columns: Optional[Sequence[str]] = None):
+    """
+    Lee el archivo como tabla.
+
+    Returns:
+        (nombres, datos `[n, columnas]` en float64, índice)
+    """
+    index = read_index(blob)
+    values = read_columns(blob, columns, index=index)
+    names = list(values)
+    if not names:
+        return names, np.empty((index["rows"], 0)), index
+    return names, np.column_stack([values[n].astype(np.float64) for n in names]), index
+
+
+def iter_csv(blob: bytes, chunk_rows: int = 50000) -> Iterator[str]:
+    """Regenera el CSV con el mismo formato que guarda `finalize_run`, por trozos de filas."""
+    index = read_index(blob)
+    meta = index.get("meta", {})
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows(meta.get("preamble", []))
+    names = [c["name"] for c in index["columns"]]
+    formats = ["%d"] + [CSV_FORMATS.get(c["dtype"], "%.10g") for c in index["columns"]]
+    for start in range(0, index["rows"], chunk_rows):
+        values = read_columns(blob, names, start, start + chunk_rows, index=index)
+        n = len(next(iter(values.values()))) if values else 0
+        table = np.column_stack([np.arange(start, start + n)] + [values[name] for name in names])
+        np.savetxt(buffer, table, delimiter=",", fmt=formats, newline="\r\n")
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    writer.writerows(meta.get("trailer", []))
+    yield buffer.getvalue()
+
+
+def to_csv(blob: bytes, chunk_rows: int = 50000) -> str:
+    """Regenera el CSV completo (ver `iter_csv`)."""
+    return "".join(iter_csv(blob, chunk_rows))
+
+
+def iter_csv_gz(blob: bytes, chunk_rows: int = 5000) -> Iterator[bytes]:
+    """
+    Regenera el archivo .csv.gz de descarga comprimiéndolo mientras se lee:
+    en memoria sólo vive un trozo de `chunk_rows` filas. Sin fecha en el
+    encabezado gzip, así el mismo archivo columnar siempre da los mismos bytes.
+    """
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+    for text in iter_csv(blob, chunk_rows):
+        data = compressor.compress(text.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def to_csv_gz(blob: bytes) -> bytes:
+    """Regenera el archivo .csv.gz de descarga completo (ver `iter_csv_gz`)."""
+    return b"".join(iter_csv_gz(blob))
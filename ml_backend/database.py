@@ -4,16 +4,28 @@ Maneja operaciones CRUD para mediciones en SQLite.
 """
 
 import sqlite3
+import base64
 import json
 import gzip
+import os
 import hashlib
+import struct
+import threading
+import time
 import uuid
-from datetime import datetime
+import zlib
+from datetime import datetime, timedelta
+from itertools import islice
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Iterator, Tuple
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple
 import csv
 from io import StringIO
 
+import numpy as np
+
+from columnar import ColumnarWriter, iter_csv_gz, read_index_at, to_csv_gz
+from run_stats import StreamingStats
+
 # Configuración de la base de datos
 import platform
 if platform.system() == "Windows":
@@ -31,6 +43,103 @@ def get_connection() -> sqlite3.Connection:
     conn.execute("PRAGMA foreign_keys=ON")
     return conn
 
+# Conexiones de lectura que se mantienen abiertas entre peticiones
+READER_POOL_SIZE = int(os.environ.get("FRISAT_DB_READERS", 4))
+
+class ConnectionPool:
+    """
+    Conexiones SQLite de larga vida: varias de lectura y una de escritura.
+
+    En modo WAL los lectores no se bloquean entre sí ni bloquean al
+    escritor; las escrituras se serializan con un candado propio en lugar
+    de competir por el bloqueo de SQLite. Las conexiones se abren (y se
+    configuran con los PRAGMAs) una sola vez.
+    """
+
+    def __init__(self, db_path: Path, readers: int = READER_POOL_SIZE):
+        self.db_path = db_path
+        self.readers = max(1, readers)
+        self._idle: List[sqlite3.Connection] = []
+        self._idle_lock = threading.Lock()
+        self._writer: Optional[sqlite3.Connection] = None
+        self._write_lock = threading.RLock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Cada conexión la usa un solo hilo a la vez, pero no siempre el mismo
+        conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def acquire_reader(self) -> sqlite3.Connection:
+        """Conexión de lectura; si todas están ocupadas se abre una extra."""
+        with self._idle_lock:
+            if self._idle:
+                return self._idle.pop()
+        conn = self._connect()
+        conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def release_reader(self, conn: sqlite3.Connection) -> None:
+        if conn.in_transaction:
+            conn.rollback()
+        with self._idle_lock:
+            if len(self._idle) < self.readers:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def acquire_writer(self) -> sqlite3.Connection:
+        """La conexión de escritura; bloquea hasta que quede libre."""
+        self._write_lock.acquire()
+        try:
+            if self._writer is None:
+                self._writer = self._connect()
+        except Exception:
+            self._write_lock.release()
+            raise
+        return self._writer
+
+    def release_writer(self, conn: sqlite3.Connection) -> None:
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        finally:
+            self._write_lock.release()
+
+    def close(self) -> None:
+        with self._idle_lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """Pool de la base de datos actual (se recrea si cambia DB_PATH)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.db_path != DB_PATH:
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(DB_PATH)
+        return _pool
+
+def close_pool() -> None:
+    """Cierra todas las conexiones del pool (al apagar el servidor)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
 def create_run(meta: Dict[str, Any]) -> str:
     """
     Crea un nuevo registro de medición en estado 'writing'.
@@ -47,14 +156,15 @@ def create_run(meta: Dict[str, Any]) -> str:
     # Extraer sensores activos
     sensors = [f"sensor{i+1}" for i in range(5) if meta.get(f"sensor{i+1}", False)]
     
-    conn = get_connection()
+    pool = get_pool()
+    conn = pool.acquire_writer()
     try:
         with conn:
             conn.execute("""
                 INSERT INTO measurements (
                     id, created_at, sampling_hz, duration_sec, sensors,
-                    model_version, normalization_version, status
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    model_version, normalization_version, status, sensor_count
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (
                 run_id,
                 created_at,
@@ -63,17 +173,490 @@ def create_run(meta: Dict[str, Any]) -> str:
                 json.dumps(sensors),
                 meta.get('model_version', '1.0'),
                 meta.get('normalization_version', '1.0'),
-                'writing'
+                'writing',
+                len(sensors)
             ))
         
         return run_id
     finally:
-        conn.close()
+        pool.release_writer(conn)
+
+# Nivel de compresión de la escritura incremental (rápido, para tiempo real)
+COMPRESSION_LEVEL = 6
+# Filas que se codifican y comprimen de una vez al finalizar en un solo paso
+FINALIZE_CHUNK_ROWS = 5000
+# Guardar también el .csv.gz; si es "0" sólo queda el formato columnar
+# (ver columnar.py) y la descarga se genera a pedido
+STORE_CSV_GZ = os.environ.get("FRISAT_STORE_CSV_GZ", "1") != "0"
+# Tamaño de cada trozo al leer BLOBs para descargas
+BLOB_CHUNK_SIZE = 64 * 1024
+
+
+class RunWriter:
+    """
+    Escritura incremental de una medición.
+
+    Cada bloque de filas se convierte a CSV, pasa por un compresor gzip
+    incremental y por un SHA-256 incremental, y el resultado comprimido se
+    guarda en `measurement_chunks`. Al sellar, los fragmentos se copian en
+    orden a la tabla `blobs`; en memoria sólo vive un bloque a la vez.
+
+    En paralelo se arma la versión columnar: cada bloque comprimido va
+    también a `measurement_chunks` (`kind = 'col'`) y al sellar se arma el
+    archivo en `blobs`. En memoria sólo quedan las filas del bloque columnar
+    en curso y su índice, así que no crece con el largo de la medición. Si
+    alguna columna no es numérica, la medición se guarda sólo como CSV.
+
+    Con la misma pasada se calculan las estadísticas y el sparkline de cada
+    sensor (`stats`), que se guardan en `stats_json`.
+
+    Si el escritor se pierde (p. ej. al reiniciar el servidor), `resume` lo
+    rearma a partir de los fragmentos guardados y la medición sigue.
+    """
+
+    def __init__(self, run_id: str, header: List[str], meta: Dict[str, Any]):
+        self.run_id = run_id
+        self.header = list(header)
+        self.meta = dict(meta)
+        self.rows = 0
+        self.seq = 0
+        self.size = 0
+        self.sha = hashlib.sha256()
+        # wbits=31: formato gzip, igual que gzip.compress
+        self.compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 31)
+        self.lock = threading.Lock()
+        # Último bloque recibido (time.monotonic), para sellar grabaciones abandonadas
+        self.last_write = time.monotonic()
+        self._started = False
+        self.preamble: List[List[Any]] = []
+        # Partes del archivo columnar que todavía no se guardaron
+        self._columnar_parts: List[bytes] = []
+        self._set_header(self.header)
+
+    def _set_header(self, header: List[str]) -> None:
+        """Columnas de la medición: arma el escritor columnar y las estadísticas."""
+        self.header = list(header)
+        self._columnar_parts.clear()
+        self.col_sha = hashlib.sha256()
+        # La columna de tiempo necesita float64; los sensores, float32
+        self.columnar: Optional[ColumnarWriter] = ColumnarWriter(
+            self.header, ["<f8" if col == "time" else "<f4" for col in self.header],
+            sink=self._columnar_parts.append
+        )
+        self._sensor_idx = [i for i, col in enumerate(self.header) if col.startswith("sensor")]
+        self.stats: Optional[StreamingStats] = StreamingStats(
+            [self.header[i] for i in self._sensor_idx]
+        )
+
+    def _preamble(self) -> List[List[Any]]:
+        """Comentarios iniciales; los totales que aún no se conocen van al final."""
+        meta = self.meta
+        lines = [
+            ['#FRISAT_MEASUREMENT'],
+            ['#startTime', meta.get('start_time', datetime.now().isoformat())],
+            ['#durationLabel', f"{meta.get('duration_sec', 0)}s"],
+            ['#samplesPerSecondLabel', f"{meta.get('sampling_hz', 1)} samples/s"],
+        ]
+        if 'total_samples' in meta:
+            lines.append(['#totalSamples', meta['total_samples']])
+        lines.append(['#RAW_HEADERS'] + self.header)
+        if 'dominant_regimen' in meta:
+            lines.append(['#dominantRegimen', meta['dominant_regimen']])
+        lines.append(['#collectedData'])
+        return lines
+
+    def _begin(self) -> Optional[List[List[Any]]]:
+        """Preámbulo para el primer bloque escrito; None en los siguientes."""
+        if self._started:
+            return None
+        self._started = True
+        self.preamble = self._preamble()
+        return self.preamble
+
+    def _add_columns(self, block: Any) -> None:
+        if self.columnar is None:
+            return
+        try:
+            table = np.asarray(block, dtype=np.float64).reshape(-1, len(self.header))
+        except (TypeError, ValueError):
+            # Lo ya guardado de la versión columnar se borra al sellar
+            self.columnar = None
+            self.stats = None
+            self._columnar_parts.clear()
+            return
+        self.columnar.append(table)
+        self.stats.update(table[:, self._sensor_idx])
+
+    def _trailer(self, meta: Dict[str, Any]) -> List[List[Any]]:
+        lines = []
+        if 'total_samples' not in self.meta:
+            lines.append(['#totalSamples', self.rows])
+        if 'dominant_regimen' not in self.meta:
+            lines.append(['#dominantRegimen', meta.get('dominant_regimen', 'indeterminado')])
+        return lines
+
+    def _encode(self, rows: Iterable[Dict[str, Any]], prefix: List[List[Any]] = None,
+                suffix: List[List[Any]] = None) -> bytes:
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        if prefix:
+            writer.writerows(prefix)
+        for row_data in rows:
+            row = [self.rows]  # Número de muestra
+            for col in self.header:
+                row.append(row_data.get(col, 0))
+            writer.writerow(row)
+            self.rows += 1
+        if suffix:
+            writer.writerows(suffix)
+        return buffer.getvalue().encode('utf-8')
+
+    def _encode_array(self, block: np.ndarray, prefix: List[List[Any]] = None) -> bytes:
+        """Como `_encode`, pero para un bloque numérico `[n, len(header)]`."""
+        buffer = StringIO()
+        if prefix:
+            csv.writer(buffer).writerows(prefix)
+        n = block.shape[0]
+        if n:
+            numbered = np.column_stack([np.arange(self.rows, self.rows + n), block])
+            np.savetxt(buffer, numbered, delimiter=",", newline="\r\n",
+                       fmt=["%d"] + ["%.10g" if col == "time" else "%.7g" for col in self.header])
+            self.rows += n
+        return buffer.getvalue().encode('utf-8')
+
+    def _store(self, conn: sqlite3.Connection, data: bytes) -> None:
+        if not data:
+            return
+        self.sha.update(data)
+        self.size += len(data)
+        conn.execute(
+            "INSERT INTO measurement_chunks (run_id, seq, kind, data) VALUES (?, ?, 'gz', ?)",
+            (self.run_id, self.seq, data)
+        )
+        self.seq += 1
+
+    def _store_columnar(self, conn: sqlite3.Connection) -> None:
+        """Guarda las partes columnares ya comprimidas y las suelta de memoria."""
+        for data in self._columnar_parts:
+            self.col_sha.update(data)
+            conn.execute(
+                "INSERT INTO measurement_chunks (run_id, seq, kind, data) VALUES (?, ?, 'col', ?)",
+                (self.run_id, self.seq, data)
+            )
+            self.seq += 1
+        self._columnar_parts.clear()
+
+    def _chunks(self, conn: sqlite3.Connection, kind: str) -> Iterator[bytes]:
+        """Fragmentos guardados de un tipo ('gz' o 'col'), en orden."""
+        cursor = conn.execute(
+            "SELECT data FROM measurement_chunks WHERE run_id = ? AND kind = ? ORDER BY seq",
+            (self.run_id, kind)
+        )
+        return (data for (data,) in cursor)
+
+    def resume(self, conn: sqlite3.Connection) -> None:
+        """
+        Retoma la medición desde sus fragmentos guardados.
+
+        Los fragmentos .csv.gz terminan en un SYNC_FLUSH, así que se pueden
+        leer en orden sin el final del flujo: de ahí salen el SHA-256, el
+        preámbulo, el número de filas, las estadísticas y el archivo columnar
+        (que se vuelve a armar; sus partes anteriores se descartan, porque
+        las filas de su bloque en curso sólo estaban en memoria). El miembro
+        gzip abierto se cierra con un bloque final vacío y su CRC, y lo que
+        llegue después va en un miembro nuevo (gzip admite miembros
+        concatenados). En memoria sólo vive un fragmento a la vez.
+        """
+        self.seq = conn.execute(
+            "SELECT COALESCE(MAX(seq) + 1, 0) FROM measurement_chunks WHERE run_id = ?",
+            (self.run_id,)
+        ).fetchone()[0]
+        conn.execute(
+            "DELETE FROM measurement_chunks WHERE run_id = ? AND kind = 'col'", (self.run_id,)
+        )
+        # Los totales se toman de lo que ya está escrito en el preámbulo
+        self.meta.pop('total_samples', None)
+        self.meta.pop('dominant_regimen', None)
+        decompressor = zlib.decompressobj(31)
+        crc = isize = 0
+        member_open = False
+        carry = b""
+        seqs = [seq for (seq,) in conn.execute(
+            "SELECT seq FROM measurement_chunks WHERE run_id = ? AND kind = 'gz' ORDER BY seq",
+            (self.run_id,)
+        )]
+        for seq in seqs:
+            (data,) = conn.execute(
+                "SELECT data FROM measurement_chunks WHERE run_id = ? AND seq = ?", (self.run_id, seq)
+            ).fetchone()
+            self.sha.update(data)
+            self.size += len(data)
+            while data:
+                text = decompressor.decompress(data)
+                crc = zlib.crc32(text, crc)
+                isize += len(text)
+                lines = (carry + text).split(b"\n")
+                carry = lines.pop()
+                self._resume_lines(conn, lines)
+                if decompressor.eof:
+                    data = decompressor.unused_data
+                    decompressor = zlib.decompressobj(31)
+                    crc = isize = 0
+                    member_open = False
+                else:
+                    data = b""
+                    member_open = True
+        self._started = True
+        if member_open:
+            # Bloque deflate final vacío + CRC32 y tamaño del miembro
+            self._store(conn, b"\x03\x00" + struct.pack("<II", crc, isize & 0xFFFFFFFF))
+
+    def _resume_lines(self, conn: sqlite3.Connection, lines: List[bytes]) -> None:
+        rows = []
+        for fields in csv.reader(line.decode("utf-8").rstrip("\r") for line in lines):
+            if not fields:
+                continue
+            if not fields[0].startswith("#"):
+                rows.append(fields[1:])
+            elif not self.rows:
+                self.preamble.append(fields)
+                key = fields[0]
+                if key == '#RAW_HEADERS':
+                    self._set_header(fields[1:])
+                elif key == '#totalSamples':
+                    self.meta['total_samples'] = fields[1]
+                elif key == '#dominantRegimen':
+                    self.meta['dominant_regimen'] = fields[1]
+        if rows:
+            self._add_columns(rows)
+            self._store_columnar(conn)
+            self.rows += len(rows)
+
+    def append(self, conn: sqlite3.Connection, rows: Iterable[Dict[str, Any]]) -> int:
+        """
+        Comprime y guarda un bloque de filas.
+
+        Returns:
+            int: Total de filas escritas hasta ahora
+        """
+        rows = list(rows)
+        self._add_columns([[row.get(col, 0) for col in self.header] for row in rows])
+        self._store_columnar(conn)
+        raw = self._encode(rows, self._begin())
+        # SYNC_FLUSH: lo guardado hasta aquí ya es un prefijo gzip legible
+        self._store(conn, self.compressor.compress(raw) + self.compressor.flush(zlib.Z_SYNC_FLUSH))
+        self.last_write = time.monotonic()
+        return self.rows
+
+    def append_array(self, conn: sqlite3.Connection, block: np.ndarray) -> int:
+        """Igual que `append`, para bloques numéricos (grabación desde /ws)."""
+        self._add_columns(block)
+        self._store_columnar(conn)
+        raw = self._encode_array(block, self._begin())
+        self._store(conn, self.compressor.compress(raw) + self.compressor.flush(zlib.Z_SYNC_FLUSH))
+        self.last_write = time.monotonic()
+        return self.rows
+
+    def encode_table(self, block: np.ndarray) -> Tuple[bytes, Optional[bytes]]:
+        """
+        Codifica una medición completa en memoria, sin pasar por la base de
+        datos (importación de archivos, ver import_legacy.py).
+
+        Returns:
+            Tupla (.csv.gz, archivo columnar o None si hay columnas no numéricas)
+        """
+        self._add_columns(block)
+        raw = self._encode_array(block, self._begin())
+        trailer = self._trailer(self.meta)
+        raw += self._encode([], None, trailer)
+        data = self.compressor.compress(raw) + self.compressor.flush(zlib.Z_FINISH)
+        self.sha.update(data)
+        self.size = len(data)
+        columnar = None
+        if self.columnar is not None:
+            self.columnar.finish({"preamble": self.preamble, "trailer": trailer})
+            columnar = b"".join(self._columnar_parts)
+            self._columnar_parts.clear()
+        return data, columnar
+
+    def seal(self, conn: sqlite3.Connection, meta: Dict[str, Any]) -> str:
+        """
+        Cierra el flujo gzip y guarda el .csv.gz y el archivo columnar en
+        `blobs` (`gz_sha256` y `col_sha256` apuntan a ellos).
+
+        Returns:
+            str: SHA-256 del archivo comprimido
+        """
+        prefix = self._begin()
+        trailer = self._trailer(meta)
+        raw = self._encode([], prefix, trailer)
+        self._store(conn, self.compressor.compress(raw) + self.compressor.flush(zlib.Z_FINISH))
+        sha256_hash = self.sha.hexdigest()
+
+        col_sha256 = None
+        col_size = 0
+        if self.columnar is not None:
+            self.columnar.finish({"preamble": self.preamble, "trailer": trailer})
+            self._store_columnar(conn)
+            col_sha256 = self.col_sha.hexdigest()
+            col_size = self.columnar.size
+            put_blob(conn, col_sha256, col_size, self._chunks(conn, "col"))
+
+        gz_sha256 = None
+        if col_sha256 is None or STORE_CSV_GZ:
+            gz_sha256 = sha256_hash
+            put_blob(conn, gz_sha256, self.size, self._chunks(conn, "gz"))
+        conn.execute("DELETE FROM measurement_chunks WHERE run_id = ?", (self.run_id,))
+
+        size = (self.size if gz_sha256 else 0) + col_size
+        conn.execute(
+            "UPDATE measurements SET gz_sha256 = ?, col_sha256 = ?, size_bytes = ? WHERE id = ?",
+            (gz_sha256, col_sha256, size, self.run_id)
+        )
+        return gz_sha256 or col_sha256
+
+
+
+def put_blob(conn: sqlite3.Connection, sha256: str, size: int, chunks: Iterable[bytes]) -> bool:
+    """
+    Guarda un archivo en `blobs` si todavía no hay uno con el mismo SHA-256.
+
+    Los trozos se escriben con E/S incremental sobre un `zeroblob` del tamaño
+    final. Las referencias (`refs`) las cuentan los triggers al asignar
+    `gz_sha256`/`col_sha256` en la medición.
+
+    Returns:
+        bool: True si se escribió, False si ya existía (deduplicado)
+    """
+    if conn.execute("SELECT 1 FROM blobs WHERE sha256 = ?", (sha256,)).fetchone():
+        return False
+    if hasattr(conn, "blobopen"):
+        cursor = conn.execute(
+            "INSERT INTO blobs (sha256, size, data) VALUES (?, ?, zeroblob(?))",
+            (sha256, size, size)
+        )
+        with conn.blobopen("blobs", "data", cursor.lastrowid) as blob:
+            for data in chunks:
+                blob.write(data)
+    else:
+        # Python < 3.11: sin E/S incremental de BLOBs
+        conn.execute(
+            "INSERT INTO blobs (sha256, size, data) VALUES (?, ?, ?)",
+            (sha256, size, b"".join(chunks))
+        )
+    return True
+
+
+# Escritores abiertos por run_id (mediciones que reciben bloques con /append)
+_writers: Dict[str, RunWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def _open_writer(conn: sqlite3.Connection, run_id: str, header: Optional[List[str]],
+                 meta: Optional[Dict[str, Any]]) -> Optional[RunWriter]:
+    """Devuelve el escritor del run, creándolo si el run está en 'writing'."""
+    with _writers_lock:
+        writer = _writers.get(run_id)
+        if writer is not None:
+            return writer
+        result = conn.execute(
+            "SELECT status, sampling_hz, duration_sec FROM measurements WHERE id = ?", (run_id,)
+        ).fetchone()
+        if not result or result[0] != 'writing':
+            return None
+        # Fragmentos de un escritor anterior (p. ej. antes de reiniciar el
+        # servidor): se retoma desde ellos, con el encabezado ya escrito
+        resume = conn.execute(
+            "SELECT 1 FROM measurement_chunks WHERE run_id = ? LIMIT 1", (run_id,)
+        ).fetchone() is not None
+        if not header and not resume:
+            return None
+        # Lo que no venga en meta se toma de lo registrado en create_run
+        meta = dict(meta or {})
+        meta.setdefault('sampling_hz', result[1])
+        meta.setdefault('duration_sec', result[2])
+        writer = RunWriter(run_id, header or [], meta)
+        if resume:
+            try:
+                with conn:
+                    writer.resume(conn)
+            except Exception as e:
+                print(f"Error retomando la medición {run_id}: {e}")
+                with conn:
+                    conn.execute("UPDATE measurements SET status = 'failed' WHERE id = ?", (run_id,))
+                return None
+        _writers[run_id] = writer
+        return writer
+
+
+def _build_preview(meta: Dict[str, Any]) -> Dict[str, Any]:
+    current_time = datetime.now().isoformat()
+    return {
+        'classes': meta.get('classes', ['LAMINAR', 'TRANSITION', 'TURBULENT']),
+        'min_timestamp': meta.get('min_timestamp', current_time),
+        'max_timestamp': meta.get('max_timestamp', current_time),
+        'sensor_count': len([s for s in meta.get('sensors', {}).values() if s]),
+        'dominant_regimen': meta.get('dominant_regimen', 'indeterminado'),
+        'file_name': meta.get('file_name', ''),
+    }
+
+
+def append_run_rows(run_id: str, rows: List[Dict[str, Any]],
+                    header: Optional[List[str]] = None,
+                    meta: Optional[Dict[str, Any]] = None) -> Optional[int]:
+    """
+    Agrega un bloque de filas a una medición en curso.
+
+    Args:
+        run_id: ID de la medición (en estado 'writing')
+        rows: Filas del bloque
+        header: Encabezados CSV (obligatorios en el primer bloque)
+        meta: Metadatos del preámbulo (sólo se usan en el primer bloque)
+
+    Returns:
+        Total de filas escritas, o None si el run no admite más bloques
+    """
+    pool = get_pool()
+    conn = pool.acquire_writer()
+    try:
+        writer = _open_writer(conn, run_id, header, meta)
+        if writer is None:
+            return None
+        with writer.lock:
+            with conn:
+                return writer.append(conn, rows)
+    finally:
+        pool.release_writer(conn)
+
+
+def append_run_block(run_id: str, block: np.ndarray, header: List[str],
+                     meta: Optional[Dict[str, Any]] = None) -> Optional[int]:
+    """
+    Agrega un bloque numérico `[n, len(header)]` a una medición en curso.
+
+    Returns:
+        Total de filas escritas, o None si el run no admite más bloques
+    """
+    pool = get_pool()
+    conn = pool.acquire_writer()
+    try:
+        writer = _open_writer(conn, run_id, header, meta)
+        if writer is None:
+            return None
+        with writer.lock:
+            with conn:
+                return writer.append_array(conn, block)
+    finally:
+        pool.release_writer(conn)
+
 
 def finalize_run(run_id: str, rows_iterable: Iterator[Dict[str, Any]], 
                 header: List[str], meta: Dict[str, Any]) -> bool:
     """
     Finaliza una medición guardando los datos comprimidos en la base de datos.
+
+    Si la medición ya recibió bloques con `append_run_rows`, las filas que
+    lleguen aquí se agregan al final y sólo se sella el archivo.
     
     Args:
         run_id: ID de la medición
@@ -84,114 +667,271 @@ def finalize_run(run_id: str, rows_iterable: Iterator[Dict[str, Any]],
     Returns:
         bool: True si se guardó exitosamente, False en caso contrario
     """
-    conn = get_connection()
+    pool = get_pool()
+    conn = pool.acquire_writer()
     try:
-        with conn:
-            # Verificar que el run existe y está en estado 'writing'
-            cursor = conn.execute(
-                "SELECT status FROM measurements WHERE id = ?", (run_id,)
-            )
-            result = cursor.fetchone()
-            if not result or result[0] != 'writing':
+        with _writers_lock:
+            writer = _writers.get(run_id)
+        if writer is None:
+            # Finalización en un solo paso: los totales van en el preámbulo
+            one_shot_meta = dict(meta)
+            one_shot_meta.setdefault('total_samples', 0)
+            one_shot_meta.setdefault('dominant_regimen', 'indeterminado')
+            writer = _open_writer(conn, run_id, header, one_shot_meta)
+            if writer is None:
                 return False
-            
-            # Generar CSV en memoria
-            csv_buffer = StringIO()
-            writer = csv.writer(csv_buffer)
-            
-            # Escribir metadatos como comentarios
-            writer.writerow(['#FRISAT_MEASUREMENT'])
-            writer.writerow(['#startTime', meta.get('start_time', datetime.now().isoformat())])
-            writer.writerow(['#durationLabel', f"{meta.get('duration_sec', 0)}s"])
-            writer.writerow(['#samplesPerSecondLabel', f"{meta.get('sampling_hz', 1)} samples/s"])
-            writer.writerow(['#totalSamples', meta.get('total_samples', 0)])
-            writer.writerow(['#RAW_HEADERS'] + header)
-            writer.writerow(['#dominantRegimen', meta.get('dominant_regimen', 'indeterminado')])
-            writer.writerow(['#collectedData'])
-            
-            # Escribir datos
-            row_count = 0
-            for row_data in rows_iterable:
-                row = [row_count]  # Número de muestra
-                for col in header:
-                    row.append(row_data.get(col, 0))
-                writer.writerow(row)
-                row_count += 1
-            
-            # Obtener contenido CSV
-            csv_content = csv_buffer.getvalue()
-            csv_buffer.close()
-            
-            # Comprimir con gzip
-            compressed_data = gzip.compress(csv_content.encode('utf-8'))
-            
-            # Calcular SHA256
-            sha256_hash = hashlib.sha256(compressed_data).hexdigest()
-            
-            # Generar preview JSON
-            current_time = datetime.now().isoformat()
-            preview_data = {
-                'classes': meta.get('classes', ['LAMINAR', 'TRANSITION', 'TURBULENT']),
-                'min_timestamp': meta.get('min_timestamp', current_time),
-                'max_timestamp': meta.get('max_timestamp', current_time),
-                'sensor_count': len([s for s in meta.get('sensors', {}).values() if s]),
-                'dominant_regimen': meta.get('dominant_regimen', 'indeterminado'),
-                'file_name': meta.get('file_name', ''),
-            }
-            
-            # Actualizar registro
-            conn.execute("""
-                UPDATE measurements SET
-                    data_gz = ?, sha256 = ?, rows = ?, preview_json = ?, status = 'ready'
-                WHERE id = ?
-            """, (
-                compressed_data,
-                sha256_hash,
-                row_count,
-                json.dumps(preview_data),
-                run_id
-            ))
-            
-            return True
+
+        with writer.lock:
+            with conn:
+                # Verificar que el run existe y está en estado 'writing'
+                result = conn.execute(
+                    "SELECT status FROM measurements WHERE id = ?", (run_id,)
+                ).fetchone()
+                if not result or result[0] != 'writing':
+                    return False
+
+                rows_iterable = iter(rows_iterable)
+                while True:
+                    block = list(islice(rows_iterable, FINALIZE_CHUNK_ROWS))
+                    if not block:
+                        break
+                    writer.append(conn, block)
+
+                sha256_hash = writer.seal(conn, meta)
+
+                # Actualizar registro
+                preview = _build_preview(meta)
+                conn.execute("""
+                    UPDATE measurements SET
+                        sha256 = ?, rows = ?, preview_json = ?, status = 'ready',
+                        dominant_regimen = ?, file_name = ?, stats_json = ?
+                    WHERE id = ?
+                """, (
+                    sha256_hash,
+                    writer.rows,
+                    json.dumps(preview),
+                    preview['dominant_regimen'],
+                    preview['file_name'],
+                    json.dumps(writer.stats.result()) if writer.stats is not None else None,
+                    run_id
+                ))
+
+        return True
             
     except Exception as e:
         print(f"Error finalizando medición {run_id}: {e}")
         # Marcar como fallida
         try:
-            conn.execute(
-                "UPDATE measurements SET status = 'failed' WHERE id = ?", (run_id,)
-            )
+            with conn:
+                conn.execute(
+                    "UPDATE measurements SET status = 'failed' WHERE id = ?", (run_id,)
+                )
+                conn.execute("DELETE FROM measurement_chunks WHERE run_id = ?", (run_id,))
         except:
             pass
         return False
     finally:
-        conn.close()
+        with _writers_lock:
+            _writers.pop(run_id, None)
+        pool.release_writer(conn)
+
+def seal_idle_runs(idle_seconds: float, run_ids: Optional[Iterable[str]] = None) -> List[str]:
+    """
+    Sella las mediciones cuyo escritor no recibe bloques hace `idle_seconds`
+    o más (el cliente se cortó sin llamar a /finalize, p. ej. se cerró el
+    navegador durante una grabación por /ws). Se finalizan con los metadatos
+    con que se abrieron y el régimen queda 'indeterminado'; así lo grabado se
+    puede descargar y el escritor deja de ocupar memoria.
+
+    Args:
+        idle_seconds: Tiempo mínimo sin bloques nuevos
+        run_ids: Sólo estas mediciones (por defecto, todas las abiertas)
+
+    Returns:
+        IDs de las mediciones selladas
+    """
+    now = time.monotonic()
+    wanted = set(run_ids) if run_ids is not None else None
+    with _writers_lock:
+        idle = [(run_id, writer) for run_id, writer in _writers.items()
+                if now - writer.last_write >= idle_seconds and (wanted is None or run_id in wanted)]
+    sealed = []
+    for run_id, writer in idle:
+        meta = dict(writer.meta)
+        meta.setdefault('sensors', {col: True for col in writer.header if col.startswith('sensor')})
+        if finalize_run(run_id, iter([]), writer.header, meta):
+            sealed.append(run_id)
+    return sealed
 
-def list_runs(limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+def import_runs(runs: List[Dict[str, Any]]) -> List[Optional[str]]:
     """
-    Lista las mediciones guardadas.
+    Guarda mediciones ya codificadas en una sola transacción.
+
+    Cada elemento trae `id`, `created_at`, `sampling_hz`, `duration_sec`,
+    `sensors`, `rows`, `meta`, `stats`, `csv_gz` y `columnar` (ver
+    `RunWriter.encode_table`). Las mediciones cuyo SHA-256 ya está en la base
+    (o repetido en el mismo lote) se omiten.
+
+    Returns:
+        Lista con el ID de cada medición guardada, o None si era un duplicado
+    """
+    pool = get_pool()
+    conn = pool.acquire_writer()
+    try:
+        saved: List[Optional[str]] = []
+        with conn:
+            for run in runs:
+                columnar = run['columnar']
+                csv_gz = run['csv_gz'] if columnar is None or STORE_CSV_GZ else None
+                gz_sha256 = hashlib.sha256(csv_gz).hexdigest() if csv_gz is not None else None
+                col_sha256 = hashlib.sha256(columnar).hexdigest() if columnar is not None else None
+                sha256_hash = gz_sha256 or col_sha256
+                # `gz_sha256` también: un .csv.gz descargado tras recomprimirlo
+                if conn.execute(
+                    "SELECT 1 FROM measurements WHERE sha256 = ? OR gz_sha256 = ? LIMIT 1",
+                    (sha256_hash, sha256_hash)
+                ).fetchone():
+                    saved.append(None)
+                    continue
+                if gz_sha256:
+                    put_blob(conn, gz_sha256, len(csv_gz), [csv_gz])
+                if col_sha256:
+                    put_blob(conn, col_sha256, len(columnar), [columnar])
+                preview = _build_preview(run['meta'])
+                conn.execute("""
+                    INSERT INTO measurements (
+                        id, created_at, sampling_hz, duration_sec, sensors,
+                        model_version, normalization_version, rows, status, preview_json,
+                        sha256, gz_sha256, col_sha256, dominant_regimen, file_name,
+                        sensor_count, size_bytes, stats_json
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'ready', ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    run['id'],
+                    run['created_at'],
+                    run['sampling_hz'],
+                    run['duration_sec'],
+                    json.dumps(run['sensors']),
+                    run['meta'].get('model_version', '1.0'),
+                    run['meta'].get('normalization_version', '1.0'),
+                    run['rows'],
+                    json.dumps(preview),
+                    sha256_hash,
+                    gz_sha256,
+                    col_sha256,
+                    preview['dominant_regimen'],
+                    preview['file_name'],
+                    len(run['sensors']),
+                    (len(csv_gz) if csv_gz is not None else 0) + (len(columnar) if columnar is not None else 0),
+                    json.dumps(run['stats']) if run['stats'] is not None else None,
+                ))
+                saved.append(run['id'])
+        return saved
+    finally:
+        pool.release_writer(conn)
+
+# Filtros admitidos por el historial
+RUN_FILTERS = ("date_from", "date_to", "regimen", "sensor_count", "sensor",
+               "file_name", "min_size", "max_size")
+
+def encode_cursor(created_at: str, run_id: str) -> str:
+    """Cursor opaco que apunta a la posición de una medición en el historial."""
+    raw = json.dumps([created_at, run_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, run_id = json.loads(raw)
+        return str(created_at), str(run_id)
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+def _filter_clause(filters: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """Condiciones WHERE (sobre columnas indexadas) para los filtros del historial."""
+    unknown = set(filters) - set(RUN_FILTERS)
+    if unknown:
+        raise ValueError(f"Filtros desconocidos: {', '.join(sorted(unknown))}")
+    clauses = ["status = 'ready'"]
+    params: List[Any] = []
+    if filters.get("date_from"):
+        clauses.append("created_at >= ?")
+        params.append(filters["date_from"])
+    if filters.get("date_to"):
+        date_to = filters["date_to"]
+        if len(date_to) == 10:
+            # Una fecha sola (YYYY-MM-DD) incluye todo ese día: hasta antes del siguiente
+            try:
+                next_day = datetime.strptime(date_to, "%Y-%m-%d") + timedelta(days=1)
+            except ValueError:
+                raise ValueError(f"Fecha inválida: {date_to}")
+            clauses.append("created_at < ?")
+            params.append(next_day.strftime("%Y-%m-%d"))
+        else:
+            clauses.append("created_at <= ?")
+            params.append(date_to)
+    if filters.get("regimen"):
+        clauses.append("dominant_regimen = ?")
+        params.append(filters["regimen"])
+    if filters.get("sensor_count") is not None:
+        clauses.append("sensor_count = ?")
+        params.append(int(filters["sensor_count"]))
+    if filters.get("sensor"):
+        # Uno o varios sensores separados por comas: la medición debe tenerlos
+        # todos (tabla run_sensors, que mantienen los triggers de init_db.py)
+        for sensor in str(filters["sensor"]).split(","):
+            clauses.append("id IN (SELECT run_id FROM run_sensors WHERE sensor = ?)")
+            params.append(sensor.strip())
+    if filters.get("file_name"):
+        # Búsqueda por prefijo, sin distinguir mayúsculas (usa el índice NOCASE)
+        prefix = filters["file_name"].replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        clauses.append("file_name LIKE ? ESCAPE '\\'")
+        params.append(prefix + "%")
+    if filters.get("min_size") is not None:
+        clauses.append("size_bytes >= ?")
+        params.append(int(filters["min_size"]))
+    if filters.get("max_size") is not None:
+        clauses.append("size_bytes <= ?")
+        params.append(int(filters["max_size"]))
+    return " AND ".join(clauses), params
+
+def list_runs(limit: int = 50, offset: int = 0, cursor: Optional[str] = None,
+              include_stats: bool = True, **filters: Any) -> List[Dict[str, Any]]:
+    """
+    Lista las mediciones guardadas, de la más reciente a la más antigua.
     
     Args:
         limit: Número máximo de resultados
-        offset: Desplazamiento para paginación
+        offset: Desplazamiento para paginación (sólo sin cursor)
+        cursor: Cursor devuelto por `encode_cursor` para la página siguiente
+        include_stats: Incluir estadísticas y sparkline por sensor
+        **filters: Filtros de `RUN_FILTERS`
         
     Returns:
         Lista de diccionarios con información de las mediciones
     """
-    conn = get_connection()
+    where, params = _filter_clause(filters)
+    if cursor:
+        created_at, run_id = decode_cursor(cursor)
+        where += " AND (created_at, id) < (?, ?)"
+        params += [created_at, run_id]
+        offset = 0
+    pool = get_pool()
+    conn = pool.acquire_reader()
     try:
-        cursor = conn.execute("""
+        result = conn.execute(f"""
             SELECT id, created_at, sampling_hz, duration_sec, sensors,
-                   model_version, normalization_version, rows, status, preview_json
+                   model_version, normalization_version, rows, status,
+                   dominant_regimen, file_name, sensor_count, size_bytes,
+                   {"stats_json" if include_stats else "NULL"}
             FROM measurements
-            WHERE status = 'ready'
-            ORDER BY created_at DESC
+            WHERE {where}
+            ORDER BY created_at DESC, id DESC
             LIMIT ? OFFSET ?
-        """, (limit, offset))
+        """, params + [limit, offset])
         
         results = []
-        for row in cursor.fetchall():
-            preview = json.loads(row[9]) if row[9] else {}
+        for row in result.fetchall():
+            file_name = row[10] or ''
             results.append({
                 'id': row[0],
                 'created_at': row[1],
@@ -202,13 +942,29 @@ def list_runs(limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
                 'normalization_version': row[6],
                 'rows': row[7],
                 'status': row[8],
-                'preview': preview,
-                'file_name': preview.get('file_name', ''),
+                'dominant_regimen': row[9],
+                'sensor_count': row[11],
+                'size_bytes': row[12],
+                'stats': json.loads(row[13]) if row[13] else None,
+                # Resumen compatible con el formato anterior de preview_json
+                'preview': {'dominant_regimen': row[9], 'file_name': file_name,
+                            'sensor_count': row[11]},
+                'file_name': file_name,
             })
         
         return results
     finally:
-        conn.close()
+        pool.release_reader(conn)
+
+def count_runs(**filters: Any) -> int:
+    """Total de mediciones que cumplen los filtros (se resuelve con los índices)."""
+    where, params = _filter_clause(filters)
+    pool = get_pool()
+    conn = pool.acquire_reader()
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM measurements WHERE {where}", params).fetchone()[0]
+    finally:
+        pool.release_reader(conn)
 
 def get_run_file(run_id: str) -> Optional[bytes]:
     """
@@ -220,16 +976,188 @@ def get_run_file(run_id: str) -> Optional[bytes]:
     Returns:
         Bytes del archivo .csv.gz o None si no existe
     """
-    conn = get_connection()
+    pool = get_pool()
+    conn = pool.acquire_reader()
     try:
         cursor = conn.execute(
-            "SELECT data_gz FROM measurements WHERE id = ? AND status = 'ready'", 
+            "SELECT gz_sha256, col_sha256 FROM measurements WHERE id = ? AND status = 'ready'", 
             (run_id,)
         )
         result = cursor.fetchone()
-        return result[0] if result else None
+        if not result:
+            return None
+        if result[0] is None and result[1] is not None:
+            # Sólo se guardó el formato columnar: generar el .csv.gz a pedido
+            columnar = _read_blob(conn, result[1])
+            return to_csv_gz(columnar) if columnar is not None else None
+        return _read_blob(conn, result[0])
     finally:
-        conn.close()
+        pool.release_reader(conn)
+
+def _read_blob(conn: sqlite3.Connection, sha256: Optional[str]) -> Optional[bytes]:
+    if sha256 is None:
+        return None
+    result = conn.execute("SELECT data FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+    return result[0] if result else None
+
+class RunFile:
+    """
+    Archivo .csv.gz de una medición, abierto para descargarlo por trozos.
+
+    Metadatos y datos salen de la misma conexión; el BLOB se lee con E/S
+    incremental, así en memoria sólo vive un trozo a la vez. La conexión
+    vuelve al pool al terminar `iter_bytes` o con `close`.
+
+    Si sólo se guardó el formato columnar (FRISAT_STORE_CSV_GZ=0), el
+    .csv.gz se comprime mientras se envía: no se conoce su tamaño de
+    antemano (`size` es None), no admite rangos y su ETag es débil, porque
+    identifica el contenido (`col_sha256`) y no los bytes enviados.
+    """
+
+    def __init__(self, pool: ConnectionPool, conn: Optional[sqlite3.Connection], blob_id: Optional[int],
+                 size: Optional[int], sha256: str, created_at: str, file_name: str,
+                 columnar: Optional[bytes] = None):
+        self.pool = pool
+        self.conn = conn
+        self.blob_id = blob_id
+        self.size = size
+        self.sha256 = sha256
+        self.created_at = created_at
+        self.file_name = file_name
+        # Sólo para mediciones sin .csv.gz guardado (generado a pedido)
+        self._columnar = columnar
+
+    @property
+    def etag(self) -> str:
+        return f'W/"{self.sha256}"' if self._columnar is not None else f'"{self.sha256}"'
+
+    def iter_bytes(self, start: int = 0, end: Optional[int] = None,
+                   chunk_size: int = BLOB_CHUNK_SIZE) -> Iterator[bytes]:
+        """Bytes `[start, end]` (inclusive) del archivo, en trozos; el generado, siempre entero."""
+        if self._columnar is not None:
+            yield from iter_csv_gz(self._columnar)
+            return
+        end = self.size - 1 if end is None else min(end, self.size - 1)
+        try:
+            if hasattr(self.conn, "blobopen"):
+                with self.conn.blobopen("blobs", "data", self.blob_id, readonly=True) as blob:
+                    blob.seek(start)
+                    remaining = end + 1 - start
+                    while remaining > 0:
+                        data = blob.read(min(chunk_size, remaining))
+                        if not data:
+                            break
+                        remaining -= len(data)
+                        yield data
+            else:
+                # Python < 3.11: substr() también recorta BLOBs (posiciones desde 1)
+                for pos in range(start, end + 1, chunk_size):
+                    (data,) = self.conn.execute(
+                        "SELECT substr(data, ?, ?) FROM blobs WHERE id = ?",
+                        (pos + 1, min(chunk_size, end + 1 - pos), self.blob_id)
+                    ).fetchone()
+                    yield data
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self.conn is not None:
+            conn, self.conn = self.conn, None
+            self.pool.release_reader(conn)
+
+
+def open_run_file(run_id: str) -> Optional[RunFile]:
+    """
+    Abre el archivo de una medición lista para descargarlo.
+    
+    Args:
+        run_id: ID de la medición
+        
+    Returns:
+        RunFile o None si no existe
+    """
+    pool = get_pool()
+    conn = pool.acquire_reader()
+    try:
+        result = conn.execute("""
+            SELECT b.id, b.size, m.gz_sha256, m.created_at, m.preview_json, m.col_sha256
+            FROM measurements m LEFT JOIN blobs b ON b.sha256 = m.gz_sha256
+            WHERE m.id = ? AND m.status = 'ready'
+        """, (run_id,)).fetchone()
+        columnar = None
+        if result and result[0] is None:
+            # Sin .csv.gz guardado: se genera desde el columnar al enviarlo
+            columnar = _read_blob(conn, result[5])
+            if columnar is None:
+                result = None
+    except Exception:
+        pool.release_reader(conn)
+        raise
+    if not result:
+        pool.release_reader(conn)
+        return None
+    preview = json.loads(result[4]) if result[4] else {}
+    if columnar is not None:
+        pool.release_reader(conn)
+        return RunFile(pool, None, None, None, result[5], result[3],
+                       preview.get('file_name', ''), columnar)
+    return RunFile(pool, conn, result[0], result[1], result[2], result[3],
+                   preview.get('file_name', ''))
+
+def get_run_columns(run_id: str) -> Optional[bytes]:
+    """
+    Obtiene el archivo columnar de una medición (ver columnar.py).
+    
+    Args:
+        run_id: ID de la medición
+        
+    Returns:
+        Bytes del archivo columnar o None si no existe (mediciones antiguas)
+    """
+    pool = get_pool()
+    conn = pool.acquire_reader()
+    try:
+        result = conn.execute(
+            "SELECT col_sha256 FROM measurements WHERE id = ? AND status = 'ready'",
+            (run_id,)
+        ).fetchone()
+        return _read_blob(conn, result[0]) if result else None
+    finally:
+        pool.release_reader(conn)
+
+def get_run_index(run_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Índice del archivo columnar de una medición (columnas y filas) sin leer
+    sus datos: sólo el final del BLOB, con E/S incremental.
+
+    Args:
+        run_id: ID de la medición
+
+    Returns:
+        Índice (ver columnar.read_index) o None si no tiene formato columnar
+    """
+    pool = get_pool()
+    conn = pool.acquire_reader()
+    try:
+        result = conn.execute("""
+            SELECT b.id, b.size FROM measurements m JOIN blobs b ON b.sha256 = m.col_sha256
+            WHERE m.id = ? AND m.status = 'ready'
+        """, (run_id,)).fetchone()
+        if not result:
+            return None
+        blob_id, size = result
+        if hasattr(conn, "blobopen"):
+            with conn.blobopen("blobs", "data", blob_id, readonly=True) as blob:
+                def read(offset: int, length: int) -> bytes:
+                    blob.seek(offset)
+                    return blob.read(length)
+                return read_index_at(read, size)
+        # Python < 3.11: substr() también recorta BLOBs (posiciones desde 1)
+        return read_index_at(lambda offset, length: conn.execute(
+            "SELECT substr(data, ?, ?) FROM blobs WHERE id = ?", (offset + 1, length, blob_id)
+        ).fetchone()[0], size)
+    finally:
+        pool.release_reader(conn)
 
 def get_run_metadata(run_id: str) -> Optional[Dict[str, Any]]:
     """
@@ -241,11 +1169,13 @@ def get_run_metadata(run_id: str) -> Optional[Dict[str, Any]]:
     Returns:
         Diccionario con metadatos o None si no existe
     """
-    conn = get_connection()
+    pool = get_pool()
+    conn = pool.acquire_reader()
     try:
         cursor = conn.execute("""
             SELECT id, created_at, sampling_hz, duration_sec, sensors,
-                   model_version, normalization_version, rows, status, preview_json
+                   model_version, normalization_version, rows, status, preview_json,
+                   stats_json
             FROM measurements WHERE id = ?
         """, (run_id,))
         
@@ -266,9 +1196,10 @@ def get_run_metadata(run_id: str) -> Optional[Dict[str, Any]]:
             'status': result[8],
             'preview': preview,
             'file_name': preview.get('file_name', ''),
+            'stats': json.loads(result[10]) if result[10] else None,
         }
     finally:
-        conn.close()
+        pool.release_reader(conn)
 
 def delete_run(run_id: str) -> bool:
     """
@@ -280,42 +1211,281 @@ def delete_run(run_id: str) -> bool:
     Returns:
         True si se eliminó exitosamente, False en caso contrario
     """
-    conn = get_connection()
+    with _writers_lock:
+        _writers.pop(run_id, None)
+    pool = get_pool()
+    conn = pool.acquire_writer()
     try:
         with conn:
+            # Los fragmentos pendientes se borran en cascada; los BLOBs que
+            # ninguna otra medición use, con el trigger de `blobs.refs`
             cursor = conn.execute("DELETE FROM measurements WHERE id = ?", (run_id,))
             return cursor.rowcount > 0
     finally:
-        conn.close()
+        pool.release_writer(conn)
+
+def reap_stale_runs(max_age_hours: float, limit: int = 100) -> int:
+    """
+    Borra mediciones en 'writing' o 'failed' creadas hace más de `max_age_hours`.
+
+    Las que todavía tienen un escritor abierto en este proceso (grabación en
+    curso) no se tocan. Las 'writing' que ya recibieron datos (p. ej. un
+    /append cortado por un reinicio) no se borran: se sellan con lo recibido.
+    Borra a lo sumo `limit` por llamada.
+
+    Returns:
+        int: Cantidad de mediciones borradas
+    """
+    cutoff = (datetime.now() - timedelta(hours=max_age_hours)).isoformat()
+    with _writers_lock:
+        active = set(_writers)
+    pool = get_pool()
+    conn = pool.acquire_writer()
+    try:
+        orphans = conn.execute("""
+            SELECT id, sensors FROM measurements
+            WHERE status = 'writing' AND created_at < ?
+              AND EXISTS (SELECT 1 FROM measurement_chunks WHERE run_id = measurements.id)
+            LIMIT ?
+        """, (cutoff, limit + len(active))).fetchall()
+        for run_id, sensors in orphans:
+            if run_id not in active:
+                # Si no se puede retomar queda 'failed' y se borra abajo
+                finalize_run(run_id, iter([]), [], {'sensors': {s: True for s in json.loads(sensors)}})
+        with conn:
+            run_ids = [row[0] for row in conn.execute("""
+                SELECT id FROM measurements
+                WHERE status IN ('writing', 'failed') AND created_at < ?
+                LIMIT ?
+            """, (cutoff, limit + len(active))) if row[0] not in active][:limit]
+            # Los fragmentos pendientes se borran en cascada
+            conn.executemany("DELETE FROM measurements WHERE id = ?", [(run_id,) for run_id in run_ids])
+        return len(run_ids)
+    finally:
+        pool.release_writer(conn)
+
+def checkpoint_wal(busy_timeout_ms: int = 100) -> Dict[str, Any]:
+    """
+    Copia el WAL a la base y lo trunca (`wal_checkpoint(TRUNCATE)`).
+
+    Si hay lectores que impiden terminar, se rinde a los `busy_timeout_ms`
+    en vez de bloquear el hilo de escritura con la espera habitual.
+
+    Returns:
+        Diccionario con `busy` y el tamaño del WAL antes y después (bytes)
+    """
+    pool = get_pool()
+    wal_path = Path(f"{pool.db_path}-wal")
+    conn = pool.acquire_writer()
+    try:
+        wal_before = wal_path.stat().st_size if wal_path.exists() else 0
+        conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+        busy, _, _ = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        wal_after = wal_path.stat().st_size if wal_path.exists() else 0
+        return {'busy': bool(busy), 'wal_bytes_before': wal_before, 'wal_bytes_after': wal_after}
+    finally:
+        conn.execute("PRAGMA busy_timeout = 5000")  # El de sqlite3.connect
+        pool.release_writer(conn)
+
+def incremental_vacuum(pages: int) -> Dict[str, int]:
+    """
+    Devuelve al sistema hasta `pages` páginas libres del archivo (requiere
+    `auto_vacuum=INCREMENTAL`, ver init_db.py).
+
+    Returns:
+        Diccionario con `freed` y `remaining` (páginas libres que quedan)
+    """
+    pool = get_pool()
+    conn = pool.acquire_writer()
+    try:
+        before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        # executescript avanza la sentencia hasta el final (execute libera una sola página)
+        conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+        remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return {'freed': before - remaining, 'remaining': remaining}
+    finally:
+        pool.release_writer(conn)
+
+def find_recompress_candidate(min_age_days: float) -> Optional[Tuple[str, bytes]]:
+    """
+    Busca un .csv.gz de una medición antigua que todavía no se recomprimió.
+    Sólo lee (conexión de lectura), así no frena a las grabaciones en curso.
+
+    Returns:
+        Tupla (SHA-256 del BLOB, bytes) o None si no quedan
+    """
+    cutoff = (datetime.now() - timedelta(days=min_age_days)).isoformat()
+    pool = get_pool()
+    conn = pool.acquire_reader()
+    try:
+        return conn.execute("""
+            SELECT sha256, data FROM blobs
+            WHERE level IS NULL AND sha256 IN (
+                SELECT gz_sha256 FROM measurements
+                WHERE status = 'ready' AND created_at < ? AND gz_sha256 IS NOT NULL
+            )
+            LIMIT 1
+        """, (cutoff,)).fetchone()
+    finally:
+        pool.release_reader(conn)
+
+def recompress_gzip(data: bytes, level: int) -> bytes:
+    """Vuelve a comprimir un .csv.gz con `level` (sin tocar la base)."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(gzip.decompress(data)) + compressor.flush()
+
+def swap_recompressed_blob(old_sha256: str, before: int, smaller: bytes,
+                           level: int) -> Optional[Dict[str, Any]]:
+    """
+    Reemplaza un .csv.gz por su versión recomprimida con `recompress_gzip`.
+    Es la única parte que usa la conexión de escritura y dura poco: guarda el
+    BLOB nuevo y cambia `gz_sha256` y `size_bytes` de las mediciones que lo
+    usaban. `sha256` no cambia: sigue siendo la identidad de la medición (la
+    usa `import_runs` para no duplicarla); el ETag de la descarga sigue a
+    `gz_sha256`, porque cambian los bytes.
+
+    Returns:
+        Diccionario con `sha256` (el del BLOB que queda), `before` y `after`
+        en bytes, o None si el BLOB ya no está pendiente (se borró o se
+        recomprimió mientras tanto)
+    """
+    pool = get_pool()
+    conn = pool.acquire_writer()
+    try:
+        with conn:
+            if not conn.execute(
+                "SELECT 1 FROM blobs WHERE sha256 = ? AND level IS NULL", (old_sha256,)
+            ).fetchone():
+                return None
+            if len(smaller) >= before:
+                conn.execute("UPDATE blobs SET level = ? WHERE sha256 = ?", (level, old_sha256))
+                return {'sha256': old_sha256, 'before': before, 'after': before}
+            new_sha256 = hashlib.sha256(smaller).hexdigest()
+            put_blob(conn, new_sha256, len(smaller), [smaller])
+            conn.execute("UPDATE blobs SET level = ? WHERE sha256 = ?", (level, new_sha256))
+            # Los triggers pasan las referencias al BLOB nuevo y borran el anterior
+            conn.execute("""
+                UPDATE measurements SET
+                    gz_sha256 = ?, size_bytes = size_bytes - ? + ?
+                WHERE gz_sha256 = ?
+            """, (new_sha256, before, len(smaller), old_sha256))
+        return {'sha256': new_sha256, 'before': before, 'after': len(smaller)}
+    finally:
+        pool.release_writer(conn)
+
+def recompress_blob(min_age_days: float, level: int) -> Optional[Dict[str, Any]]:
+    """
+    Vuelve a comprimir con `level` el .csv.gz de una medición antigua.
+
+    Los .csv.gz se escriben con COMPRESSION_LEVEL por trozos (rápido, para
+    tiempo real); con más tiempo el mismo CSV ocupa menos. Se lee con una
+    conexión de lectura, se recomprime fuera de la base y sólo el reemplazo
+    pasa por la conexión de escritura (ver `swap_recompressed_blob`).
+
+    Returns:
+        Diccionario con `sha256` (el nuevo), `before` y `after` en bytes;
+        None si no quedan BLOBs por recomprimir
+    """
+    while True:
+        candidate = find_recompress_candidate(min_age_days)
+        if candidate is None:
+            return None
+        old_sha256, data = candidate
+        result = swap_recompressed_blob(old_sha256, len(data), recompress_gzip(data, level), level)
+        if result is not None:
+            return result
 
 def get_database_stats() -> Dict[str, Any]:
     """
     Obtiene estadísticas de la base de datos.
+
+    Lee los totales por estado de `measurement_stats`, que los triggers
+    mantienen al día: no recorre la tabla de mediciones.
     
     Returns:
         Diccionario con estadísticas
     """
-    conn = get_connection()
+    pool = get_pool()
+    conn = pool.acquire_reader()
     try:
-        cursor = conn.execute("""
-            SELECT 
-                COUNT(*) as total_runs,
-                COUNT(CASE WHEN status = 'ready' THEN 1 END) as ready_runs,
-                COUNT(CASE WHEN status = 'writing' THEN 1 END) as writing_runs,
-                COUNT(CASE WHEN status = 'failed' THEN 1 END) as failed_runs,
-                SUM(rows) as total_rows,
-                SUM(LENGTH(data_gz)) as total_size_bytes
-            FROM measurements
-        """)
-        
-        result = cursor.fetchone()
+        rows = conn.execute(
+            "SELECT status, runs, rows, size_bytes FROM measurement_stats"
+        ).fetchall()
+        return _stats_summary(rows)
+    finally:
+        pool.release_reader(conn)
+
+def _stats_summary(rows: List[Tuple[str, int, int, int]]) -> Dict[str, Any]:
+    by_status = {status: runs for status, runs, _, _ in rows}
+    return {
+        'total_runs': sum(runs for _, runs, _, _ in rows),
+        'ready_runs': by_status.get('ready', 0),
+        'writing_runs': by_status.get('writing', 0),
+        'failed_runs': by_status.get('failed', 0),
+        'total_rows': sum(total for _, _, total, _ in rows),
+        'total_size_bytes': sum(size for _, _, _, size in rows),
+    }
+
+# Tamaño real de los archivos de una medición (suma de sus BLOBs)
+_RUN_SIZE_SQL = """(SELECT COALESCE(SUM(size), 0) FROM blobs
+                     WHERE sha256 IN (measurements.gz_sha256, measurements.col_sha256))"""
+
+def reconcile_database_stats(fix: bool = True) -> Dict[str, Any]:
+    """
+    Recalcula los totales desde cero y los compara con los guardados.
+
+    También verifica `size_bytes` de cada medición contra el tamaño de sus
+    BLOBs y el contador de referencias de cada BLOB contra las mediciones
+    que lo usan.
+
+    Args:
+        fix: Corregir `size_bytes`, `blobs.refs` y `measurement_stats` si hay diferencias
+
+    Returns:
+        Diccionario con los totales guardados, los recalculados y las diferencias
+    """
+    pool = get_pool()
+    conn = pool.acquire_writer()
+    try:
+        with conn:
+            stale_sizes = conn.execute(f"""
+                SELECT id FROM measurements
+                WHERE COALESCE(size_bytes, 0) != {_RUN_SIZE_SQL}
+            """).fetchall()
+            if fix and stale_sizes:
+                conn.execute(f"""
+                    UPDATE measurements SET size_bytes = {_RUN_SIZE_SQL}
+                    WHERE COALESCE(size_bytes, 0) != {_RUN_SIZE_SQL}
+                """)
+            used = """(SELECT COUNT(*) FROM measurements WHERE gz_sha256 = blobs.sha256)
+                      + (SELECT COUNT(*) FROM measurements WHERE col_sha256 = blobs.sha256)"""
+            stale_refs = conn.execute(
+                f"SELECT sha256 FROM blobs WHERE refs != {used}"
+            ).fetchall()
+            if fix and stale_refs:
+                conn.execute(f"UPDATE blobs SET refs = {used} WHERE refs != {used}")
+                conn.execute("DELETE FROM blobs WHERE refs <= 0")
+            stored = _stats_summary(conn.execute(
+                "SELECT status, runs, rows, size_bytes FROM measurement_stats"
+            ).fetchall())
+            actual_rows = conn.execute(f"""
+                SELECT status, COUNT(*), COALESCE(SUM(rows), 0), COALESCE(SUM({_RUN_SIZE_SQL}), 0)
+                FROM measurements GROUP BY status
+            """).fetchall()
+            actual = _stats_summary(actual_rows)
+            drift = {key: actual[key] - stored[key] for key in actual if actual[key] != stored[key]}
+            if fix and drift:
+                conn.execute("DELETE FROM measurement_stats")
+                conn.executemany(
+                    "INSERT INTO measurement_stats (status, runs, rows, size_bytes) VALUES (?, ?, ?, ?)",
+                    actual_rows
+                )
         return {
-            'total_runs': result[0],
-            'ready_runs': result[1],
-            'writing_runs': result[2],
-            'failed_runs': result[3],
-            'total_rows': result[4] or 0,
-            'total_size_bytes': result[5] or 0
+            'stored': stored,
+            'actual': actual,
+            'drift': drift,
+            'stale_size_runs': [row[0] for row in stale_sizes],
+            'stale_blob_refs': [row[0] for row in stale_refs],
         }
     finally:
-        conn.close()
+        pool.release_writer(conn)
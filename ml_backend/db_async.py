@@ -0,0 +1,100 @@
+"""
+Acceso asíncrono a la base de datos de FRISAT.
+Cada función de database.py se ejecuta en un pool de hilos propio, así los
+handlers `async def` del servidor no bloquean el bucle de eventos. Las
+lecturas usan tantos hilos como conexiones de lectura tiene el pool; las
+escrituras pasan por un único hilo y se aplican en el orden en que llegan.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+import database
+
+_readers = ThreadPoolExecutor(max_workers=database.READER_POOL_SIZE, thread_name_prefix="frisat-db-read")
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="frisat-db-write")
+
+
+async def _run(executor: ThreadPoolExecutor, fn: Callable, *args, **kwargs) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+
+async def run_read(fn: Callable, *args, **kwargs) -> Any:
+    """Ejecuta una función de sólo lectura en el pool de lectores."""
+    return await _run(_readers, fn, *args, **kwargs)
+
+
+async def run_write(fn: Callable, *args, **kwargs) -> Any:
+    """Ejecuta una función que escribe en el hilo de escritura."""
+    return await _run(_writer, fn, *args, **kwargs)
+
+
+async def create_run(meta: Dict[str, Any]) -> str:
+    return await run_write(database.create_run, meta)
+
+
+async def append_run_rows(run_id: str, rows: List[Dict[str, Any]],
+                          header: Optional[List[str]] = None,
+                          meta: Optional[Dict[str, Any]] = None) -> Optional[int]:
+    return await run_write(database.append_run_rows, run_id, rows, header, meta)
+
+
+async def append_run_block(run_id: str, block: np.ndarray, header: List[str],
+                           meta: Optional[Dict[str, Any]] = None) -> Optional[int]:
+    return await run_write(database.append_run_block, run_id, block, header, meta)
+
+
+async def finalize_run(run_id: str, rows_iterable: Iterator[Dict[str, Any]],
+                       header: List[str], meta: Dict[str, Any]) -> bool:
+    return await run_write(database.finalize_run, run_id, rows_iterable, header, meta)
+
+
+async def seal_idle_runs(idle_seconds: float, run_ids: Optional[List[str]] = None) -> List[str]:
+    return await run_write(database.seal_idle_runs, idle_seconds, run_ids)
+
+
+async def delete_run(run_id: str) -> bool:
+    return await run_write(database.delete_run, run_id)
+
+
+async def list_runs(limit: int = 50, offset: int = 0, cursor: Optional[str] = None,
+                    include_stats: bool = True, **filters: Any) -> List[Dict[str, Any]]:
+    return await run_read(database.list_runs, limit, offset, cursor, include_stats, **filters)
+
+
+async def count_runs(**filters: Any) -> int:
+    return await run_read(database.count_runs, **filters)
+
+
+async def get_run_file(run_id: str) -> Optional[bytes]:
+    return await run_read(database.get_run_file, run_id)
+
+
+async def get_run_columns(run_id: str) -> Optional[bytes]:
+    return await run_read(database.get_run_columns, run_id)
+
+
+async def open_run_file(run_id: str) -> Optional[database.RunFile]:
+    return await run_read(database.open_run_file, run_id)
+
+
+async def get_run_metadata(run_id: str) -> Optional[Dict[str, Any]]:
+    return await run_read(database.get_run_metadata, run_id)
+
+
+async def get_database_stats() -> Dict[str, Any]:
+    return await run_read(database.get_database_stats)
+
+
+async def reconcile_database_stats(fix: bool = True) -> Dict[str, Any]:
+    return await run_write(database.reconcile_database_stats, fix)
+
+
+async def close() -> None:
+    """Cierra las conexiones del pool; se vuelven a abrir en el próximo uso."""
+    await run_write(database.close_pool)
@@ -0,0 +1,104 @@
+"""
+Reducción de series para graficar sin perder la forma de la señal.
+Todas las funciones devuelven índices ordenados de las muestras que se
+conservan, así varias series pueden compartir el mismo eje de tiempo, y
+nunca más que los puntos pedidos.
+"""
+
+from typing import Sequence
+
+import numpy as np
+
+METHODS = ("lttb", "minmax")
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets.
+
+    Conserva el primer y el último punto y, en cada uno de los `n_out - 2`
+    tramos intermedios, el punto que forma el triángulo de mayor área con el
+    punto elegido antes y el promedio del tramo siguiente.
+
+    Args:
+        x: Eje horizontal (tiempo), creciente
+        y: Valores de la serie
+        n_out: Número de puntos a conservar
+
+    Returns:
+        Índices elegidos, en orden creciente
+    """
+    n = len(y)
+    if n_out >= n or n <= 2:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1][:max(1, n_out)])
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # n_out - 2 tramos entre el primer y el último punto; el tramo
+    # "siguiente" del último es el punto final
+    edges = np.append(np.linspace(1, n - 1, n_out - 1).astype(np.int64), n)
+    chosen = np.empty(n_out, dtype=np.int64)
+    chosen[0] = 0
+    chosen[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = edges[i + 1], edges[i + 2]
+        cx = x[next_lo:next_hi].mean()
+        cy = y[next_lo:next_hi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        chosen[i + 1] = a
+    return chosen
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Mínimo y máximo de cada tramo (`(n_out - 2) / 2` tramos de igual largo)
+    más el primer y el último punto: como mucho `n_out` índices.
+
+    Conserva exactamente los picos de la señal; es más rápido que LTTB
+    porque no tiene dependencias entre tramos.
+    """
+    n = len(y)
+    if n_out >= n or n <= 2:
+        return np.arange(n)
+    if n_out < 4:
+        return np.array([0, n - 1][:max(1, n_out)])
+    buckets = (n_out - 2) // 2
+    size = -(-n // buckets)
+    padded = np.pad(np.asarray(y), (0, buckets * size - n), mode="edge").reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    picks = np.concatenate([offsets + padded.argmin(axis=1), offsets + padded.argmax(axis=1), [0, n - 1]])
+    return np.unique(np.minimum(picks, n - 1))
+
+
+def downsample_indices(x: np.ndarray, series: Sequence[np.ndarray], max_points: int,
+                       method: str = "lttb") -> np.ndarray:
+    """
+    Índices comunes para varias series del mismo eje `x`.
+
+    Cada serie recibe una parte igual del presupuesto y se unen los índices
+    elegidos, así ningún sensor pierde sus picos por culpa de otro. El
+    resultado nunca pasa de `max_points`: con más series que puntos para
+    repartir quedan sólo el primero y el último.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Método desconocido: {method} (opciones: {', '.join(METHODS)})")
+    if max_points < 2:
+        raise ValueError("max_points debe ser al menos 2")
+    n = len(x)
+    if max_points >= n:
+        return np.arange(n)
+    if not series:
+        return np.unique(np.linspace(0, n - 1, max_points).astype(np.int64))
+    # La unión no pasa de la suma de los presupuestos; con 2 por serie,
+    # todas eligen los mismos extremos
+    budget = max(2, max_points // len(series))
+    picks = [
+        lttb_indices(x, y, budget) if method == "lttb" else minmax_indices(y, budget)
+        for y in series
+    ]
+    return np.unique(np.concatenate(picks))
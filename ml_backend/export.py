@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Exportación de varias mediciones de una vez.
+
+- Archivo: los .csv.gz de las mediciones que cumplen un filtro, en un solo
+  .zip o .tar generado por trozos (nunca está completo en memoria).
+- Dataset: ventanas normalizadas float32 `(n, WINDOW, 1)` y la etiqueta del
+  régimen dominante de su medición, listas para entrenar con Keras, como
+  .npz generado por trozos o como .npy mapeables en memoria.
+
+En ambos casos en memoria vive, como mucho, una medición a la vez.
+Se usa desde el servidor (`GET /export` y `GET /export/dataset`) y como
+script de línea de comandos.
+"""
+
+import argparse
+import json
+import os
+import re
+import tarfile
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from classification import (LABELS, WINDOW, load_normalization, normalize, read_measurement_file,
+                            sensor_columns, sliding_windows)
+from database import count_runs, encode_cursor, get_run_index, list_runs, open_run_file
+from run_data import decode_run
+
+ARCHIVE_FORMATS = ("zip", "tar")
+# Salto entre ventanas del dataset (en muestras)
+DEFAULT_HOP = 50
+# Mediciones por consulta al recorrer el historial
+PAGE_SIZE = 200
+# Ventanas que se normalizan y escriben de una vez
+DATASET_CHUNK = 4096
+
+NORMALIZATION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "MaxiMini.npz")
+
+
+class _Sink:
+    """Destino de escritura que acumula bytes hasta que se vacía con `drain`."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+def iter_runs(**filters: Any) -> Iterator[Dict[str, Any]]:
+    """Mediciones que cumplen los filtros del historial, de a páginas por cursor."""
+    count_runs(**filters)  # Valida los filtros antes de empezar a generar
+    cursor = None
+    while True:
+        page = list_runs(PAGE_SIZE, 0, cursor, False, **filters)
+        yield from page
+        if len(page) < PAGE_SIZE:
+            return
+        cursor = encode_cursor(page[-1]["created_at"], page[-1]["id"])
+
+
+def member_name(run: Dict[str, Any]) -> str:
+    """Nombre de una medición dentro del archivo exportado."""
+    safe_name = re.sub(r"[^\w.-]", "", run.get("file_name") or "")
+    safe_name = re.sub(r"\.csv(\.gz)?$", "", safe_name)
+    base = f"{run['created_at'][:10]}_{run['id'][:8]}"
+    return f"{base}_{safe_name}.csv.gz" if safe_name else f"{base}.csv.gz"
+
+
+def _mtime(created_at: str) -> float:
+    try:
+        return datetime.fromisoformat(created_at).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def _manifest_entry(run: Dict[str, Any], name: str, sha256: str, size: int) -> Dict[str, Any]:
+    return {
+        "id": run["id"],
+        "file": name,
+        "created_at": run["created_at"],
+        "file_name": run.get("file_name", ""),
+        "dominant_regimen": run.get("dominant_regimen"),
+        "sensors": run.get("sensors", []),
+        "sampling_hz": run.get("sampling_hz"),
+        "rows": run.get("rows"),
+        "sha256": sha256,
+        "size_bytes": size,
+    }
+
+
+def iter_zip(runs: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    """Archivo .zip con el .csv.gz de cada medición y un `manifest.json` al final."""
+    sink = _Sink()
+    manifest = []
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+        for run in runs:
+            run_file = open_run_file(run["id"])
+            if run_file is None:
+                continue  # Borrada mientras se exportaba
+            name = member_name(run)
+            info = zipfile.ZipInfo(name, datetime.fromtimestamp(_mtime(run["created_at"])).timetuple()[:6])
+            info.file_size = run_file.size
+            # Los .csv.gz ya están comprimidos: se guardan tal cual
+            try:
+                with archive.open(info, "w", force_zip64=True) as member:
+                    for chunk in run_file.iter_bytes():
+                        member.write(chunk)
+                        yield sink.drain()
+            finally:
+                run_file.close()  # Por si el cliente corta la descarga a mitad
+            manifest.append(_manifest_entry(run, name, run_file.sha256, run_file.size))
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2), zipfile.ZIP_DEFLATED)
+    yield sink.drain()
+
+
+def iter_tar(runs: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    """Archivo .tar con el .csv.gz de cada medición y un `manifest.json` al final."""
+    written = 0
+    manifest = []
+
+    def member(name: str, size: int, mtime: float) -> bytes:
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = mtime
+        info.mode = 0o644
+        return info.tobuf(tarfile.PAX_FORMAT)
+
+    for run in runs:
+        run_file = open_run_file(run["id"])
+        if run_file is None:
+            continue
+        name = member_name(run)
+        header = member(name, run_file.size, _mtime(run["created_at"]))
+        try:
+            yield header
+            yield from run_file.iter_bytes()
+        finally:
+            run_file.close()
+        padding = b"\0" * (-run_file.size % tarfile.BLOCKSIZE)
+        yield padding
+        written += len(header) + run_file.size + len(padding)
+        manifest.append(_manifest_entry(run, name, run_file.sha256, run_file.size))
+
+    data = json.dumps(manifest, indent=2).encode("utf-8")
+    header = member("manifest.json", len(data), datetime.now().timestamp())
+    padding = b"\0" * (-len(data) % tarfile.BLOCKSIZE)
+    written += len(header) + len(data) + len(padding) + 2 * tarfile.BLOCKSIZE
+    # Dos bloques vacíos de cierre, completando el último registro como tarfile
+    yield header + data + padding + b"\0" * (2 * tarfile.BLOCKSIZE + (-written % tarfile.RECORDSIZE))
+
+
+def iter_archive(fmt: str = "zip", **filters: Any) -> Iterator[bytes]:
+    """
+    Genera por trozos un archivo con las mediciones que cumplen los filtros.
+
+    Args:
+        fmt: "zip" o "tar"
+        **filters: Filtros del historial (ver database.RUN_FILTERS)
+    """
+    if fmt not in ARCHIVE_FORMATS:
+        raise ValueError(f"Formato desconocido: {fmt} (opciones: {', '.join(ARCHIVE_FORMATS)})")
+    runs = iter_runs(**filters)
+    return iter_zip(runs) if fmt == "zip" else iter_tar(runs)
+
+
+def _run_layout(run: Dict[str, Any]) -> Optional[Tuple[List[str], int]]:
+    """
+    Sensores y cantidad de muestras de una medición sin leer sus datos: del
+    índice del archivo columnar o, si no lo tiene, de las columnas `sensors`
+    y `rows` del historial.
+    """
+    index = get_run_index(run["id"])
+    if index is not None:
+        return [c["name"] for c in index["columns"] if c["name"].startswith("sensor")], index["rows"]
+    names = [name for name in run.get("sensors") or [] if name.startswith("sensor")]
+    if not names or not run.get("rows"):
+        return None
+    return names, int(run["rows"])
+
+
+def plan_dataset(sensors: Optional[List[str]] = None, hop: int = DEFAULT_HOP,
+                 window: int = WINDOW, **filters: Any) -> Dict[str, Any]:
+    """
+    Primera pasada del dataset: qué ventanas salen de cada medición.
+
+    Sólo entran las mediciones cuyo régimen dominante es una de las clases
+    del modelo (LABELS); el total de ventanas se conoce antes de escribir,
+    así los .npy pueden generarse por trozos.
+
+    Args:
+        sensors: Sensores a usar (todos los de cada medición si es None)
+        hop: Salto entre ventanas
+        window: Tamaño de la ventana
+        **filters: Filtros del historial
+
+    Returns:
+        Diccionario con `runs` (id, sensores, ventanas por sensor, etiqueta),
+        `windows` (total) y los parámetros usados
+    """
+    if hop < 1 or window < 1:
+        raise ValueError("hop y window deben ser positivos")
+    plan = []
+    skipped = 0
+    total = 0
+    for run in iter_runs(**filters):
+        regimen = (run.get("dominant_regimen") or "").upper()
+        layout = _run_layout(run) if regimen in LABELS else None
+        if layout is None:
+            skipped += 1
+            continue
+        names, rows = layout
+        if sensors:
+            names = [name for name in names if name in sensors]
+        per_sensor = (rows - window) // hop + 1 if rows >= window else 0
+        if not names or per_sensor == 0:
+            skipped += 1
+            continue
+        plan.append({"id": run["id"], "sensors": names, "windows": per_sensor,
+                     "label": LABELS.index(regimen)})
+        total += per_sensor * len(names)
+    return {"runs": plan, "windows": total, "skipped": skipped, "hop": hop, "window": window}
+
+
+def iter_dataset_blocks(plan: Dict[str, Any], mini: float,
+                        maxi: float) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Segunda pasada: bloques `(índice de medición, ventanas (k, window, 1) float32)`,
+    en el orden de `plan`, sensor por sensor.
+    """
+    window, hop = plan["window"], plan["hop"]
+    for i, run in enumerate(plan["runs"]):
+        data = decode_run(run["id"])
+        if data is None or any(name not in data.sensors for name in run["sensors"]):
+            raise RuntimeError(f"La medición {run['id']} cambió durante la exportación")
+        signals = normalize(np.column_stack([data.sensors[name] for name in run["sensors"]]), mini, maxi)
+        windows = sliding_windows(signals, window, hop)
+        if windows.shape[0] != run["windows"]:
+            raise RuntimeError(f"La medición {run['id']} cambió durante la exportación")
+        for j in range(len(run["sensors"])):
+            for start in range(0, windows.shape[0], DATASET_CHUNK):
+                block = windows[start:start + DATASET_CHUNK, j, :]
+                yield i, np.ascontiguousarray(block, dtype="<f4")[:, :, np.newaxis]
+
+
+def _labels(plan: Dict[str, Any]) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Etiqueta e índice de medición de cada ventana, de a una medición."""
+    for i, run in enumerate(plan["runs"]):
+        n = run["windows"] * len(run["sensors"])
+        yield np.full(n, run["label"], dtype="u1"), np.full(n, i, dtype="<i4")
+
+
+def _npy_header(stream: Any, dtype: str, shape: Tuple[int, ...]) -> None:
+    np.lib.format.write_array_header_1_0(
+        stream, {"descr": dtype, "fortran_order": False, "shape": shape})
+
+
+def iter_npz(plan: Dict[str, Any], mini: float, maxi: float) -> Iterator[bytes]:
+    """
+    Genera por trozos un .npz con `X` `(n, window, 1)` float32, `y` (clase,
+    ver LABELS), `run_index` (posición en `run_ids`) y `run_ids`.
+    """
+    sink = _Sink()
+    n = plan["windows"]
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+        with archive.open("X.npy", "w", force_zip64=True) as member:
+            _npy_header(member, "<f4", (n, plan["window"], 1))
+            for _, block in iter_dataset_blocks(plan, mini, maxi):
+                member.write(block.tobytes())
+                yield sink.drain()
+        for name, dtype, column in (("y.npy", "|u1", 0), ("run_index.npy", "<i4", 1)):
+            with archive.open(name, "w", force_zip64=True) as member:
+                _npy_header(member, dtype, (n,))
+                for arrays in _labels(plan):
+                    member.write(arrays[column].tobytes())
+            yield sink.drain()
+        ids = np.array([run["id"] for run in plan["runs"]], dtype="U36")
+        with archive.open("run_ids.npy", "w", force_zip64=True) as member:
+            np.lib.format.write_array(member, ids)
+    yield sink.drain()
+
+
+def write_npy_dir(plan: Dict[str, Any], out_dir: Path, mini: float, maxi: float) -> None:
+    """Escribe el dataset como .npy sueltos, que `np.load(..., mmap_mode='r')` abre sin cargarlos."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    n = plan["windows"]
+    x = np.lib.format.open_memmap(out_dir / "X.npy", mode="w+", dtype="<f4", shape=(n, plan["window"], 1))
+    pos = 0
+    for _, block in iter_dataset_blocks(plan, mini, maxi):
+        x[pos:pos + len(block)] = block
+        pos += len(block)
+    x.flush()
+    del x
+    for name, column, dtype in (("y.npy", 0, "u1"), ("run_index.npy", 1, "<i4")):
+        out = np.lib.format.open_memmap(out_dir / name, mode="w+", dtype=dtype, shape=(n,))
+        pos = 0
+        for arrays in _labels(plan):
+            out[pos:pos + len(arrays[column])] = arrays[column]
+            pos += len(arrays[column])
+        out.flush()
+        del out
+    np.save(out_dir / "run_ids.npy", np.array([run["id"] for run in plan["runs"]], dtype="U36"))
+
+
+def _signal_sources(files: Optional[List[str]], **filters: Any) -> Iterator[np.ndarray]:
+    """Señales `(n_muestras, n_sensores)` de las mediciones guardadas y de archivos sueltos."""
+    if files is None:
+        for run in iter_runs(**filters):
+            data = decode_run(run["id"])
+            if data is not None and data.sensors:
+                yield np.column_stack(list(data.sensors.values()))
+        return
+    for path in files:
+        header, data, _ = read_measurement_file(path)
+        columns = sensor_columns(header)
+        if columns and data.shape[0]:
+            yield data[:, columns]
+
+
+def sample_windows(limit: int, mini: float, maxi: float, hop: int = DEFAULT_HOP,
+                   files: Optional[List[str]] = None, seed: int = 0,
+                   **filters: Any) -> np.ndarray:
+    """
+    Muestra al azar (uniforme, por reservorio) de ventanas normalizadas, sin
+    importar el régimen de cada medición. Sirve para calibrar y evaluar los
+    modelos cuantizados; en memoria vive la muestra y una medición a la vez.
+
+    Args:
+        limit: Ventanas de la muestra
+        mini: Mínimo de normalización
+        maxi: Máximo de normalización
+        hop: Salto entre ventanas candidatas
+        files: Archivos de señal (`Prueba_Re_*.csv`, exportaciones del
+            frontend); si es None, las mediciones guardadas que cumplen los filtros
+        seed: Semilla del muestreo
+        **filters: Filtros del historial
+
+    Returns:
+        Arreglo `(n, WINDOW, 1)` float32 con `n <= limit`
+    """
+    rng = np.random.default_rng(seed)
+    sample = np.empty((limit, WINDOW), dtype=np.float32)
+    seen = 0
+    for signals in _signal_sources(files, **filters):
+        if signals.shape[0] < WINDOW:
+            continue
+        windows = sliding_windows(normalize(signals, mini, maxi), WINDOW, hop)
+        for j in range(windows.shape[1]):
+            for start in range(0, windows.shape[0], DATASET_CHUNK):
+                block = windows[start:start + DATASET_CHUNK, j, :]
+                fill = max(0, min(len(block), limit - seen))
+                sample[seen:seen + fill] = block[:fill]
+                if fill < len(block):
+                    # Cada ventana nueva reemplaza a una de la muestra con probabilidad limit / vistas
+                    slots = rng.integers(0, seen + np.arange(fill, len(block)) + 1)
+                    keep = slots < limit
+                    sample[slots[keep]] = block[fill:][keep]
+                seen += len(block)
+    return sample[:min(seen, limit), :, np.newaxis]
+
+
+def _filters(args: argparse.Namespace) -> Dict[str, Any]:
+    filters = {"date_from": args.date_from, "date_to": args.date_to,
+               "regimen": args.regimen, "sensor": args.sensor}
+    return {key: value for key, value in filters.items() if value}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta varias mediciones a un archivo o a un dataset")
+    sub = parser.add_subparsers(dest="command", required=True)
+    archive_cmd = sub.add_parser("archive", help="Archivo .zip/.tar con los .csv.gz")
+    archive_cmd.add_argument("out", help="Archivo de salida (.zip o .tar)")
+    archive_cmd.add_argument("--format", choices=ARCHIVE_FORMATS, default=None,
+                             help="Formato (por defecto, según la extensión)")
+    dataset_cmd = sub.add_parser("dataset", help="Ventanas normalizadas para entrenar")
+    dataset_cmd.add_argument("out", help="Archivo .npz, o directorio con --npy")
+    dataset_cmd.add_argument("--npy", action="store_true", help="Escribir .npy sueltos (mapeables en memoria)")
+    dataset_cmd.add_argument("--hop", type=int, default=DEFAULT_HOP, help=f"Salto entre ventanas (por defecto {DEFAULT_HOP})")
+    dataset_cmd.add_argument("--sensors", default=None, help="Sensores a usar, separados por comas (por defecto todos)")
+    for cmd in (archive_cmd, dataset_cmd):
+        cmd.add_argument("--date-from", default=None, help="Desde (YYYY-MM-DD)")
+        cmd.add_argument("--date-to", default=None, help="Hasta, inclusive (YYYY-MM-DD)")
+        cmd.add_argument("--regimen", default=None, help="Régimen dominante")
+        cmd.add_argument("--sensor", default=None, help="Sólo mediciones con estos sensores (separados por comas)")
+    args = parser.parse_args()
+
+    out = Path(args.out)
+    if args.command == "archive":
+        fmt = args.format or ("tar" if out.suffix == ".tar" else "zip")
+        size = 0
+        with open(out, "wb") as f:
+            for chunk in iter_archive(fmt, **_filters(args)):
+                f.write(chunk)
+                size += len(chunk)
+        print(f"[OK] {out} ({size / 1024 / 1024:.1f} MB)")
+    else:
+        sensors = [s.strip() for s in args.sensors.split(",")] if args.sensors else None
+        plan = plan_dataset(sensors, args.hop, **_filters(args))
+        mini, maxi = load_normalization(NORMALIZATION_PATH)
+        if args.npy:
+            write_npy_dir(plan, out, mini, maxi)
+        else:
+            with open(out, "wb") as f:
+                for chunk in iter_npz(plan, mini, maxi):
+                    f.write(chunk)
+        print(f"[OK] {out}: {plan['windows']} ventanas de {len(plan['runs'])} mediciones "
+              f"({plan['skipped']} omitidas sin régimen o con pocas muestras)")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Script para exportar el modelo .h5 a los formatos de los motores ligeros.
+Genera el .npz de pesos para el motor NumPy y/o el .tflite para TFLite.
+Se ejecuta una sola vez en una máquina con Keras/TensorFlow instalado.
+
+Con `--precision float16` o `--precision int8` genera además los .tflite
+cuantizados (motores 'tflite-float16' y 'tflite-int8'). El int8 se calibra
+con ventanas de las mediciones guardadas en la base y, si se indican, de
+archivos de señal (`--calibration-files`), normalizadas con MaxiMini.npz.
+Antes de activarlos, compare con: python bench_quantization.py
+"""
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from classification import load_normalization
+from export import NORMALIZATION_PATH, sample_windows
+from inference import MODEL_PATH, PRECISIONS, export_numpy_weights, export_tflite
+
+def calibration_windows(limit: int, hop: int, files: list) -> np.ndarray:
+    """Ventanas de calibración: mediciones guardadas más archivos de señal."""
+    mini, maxi = load_normalization(NORMALIZATION_PATH)
+    parts = [sample_windows(limit, mini, maxi, hop)]
+    if files:
+        parts.append(sample_windows(limit, mini, maxi, hop, files=files))
+    return np.concatenate(parts)
+
+def signal_files(paths: list) -> list:
+    files = []
+    for path in map(Path, paths):
+        files.extend(sorted(str(p) for p in path.rglob("*.csv")) if path.is_dir() else [str(path)])
+    return files
+
+def main():
+    """Exporta el modelo a los formatos pedidos."""
+    parser = argparse.ArgumentParser(description="Exporta el modelo de FRISAT para los motores NumPy/TFLite")
+    parser.add_argument("model", nargs="?", default=MODEL_PATH, help="Ruta del modelo .h5")
+    parser.add_argument("--numpy", action="store_true", help="Exportar pesos para el motor NumPy (.npz)")
+    parser.add_argument("--tflite", action="store_true", help="Convertir a TFLite (.tflite)")
+    parser.add_argument("--precision", choices=PRECISIONS, action="append", default=None,
+                        help="Precisión del .tflite (se puede repetir; por defecto float32)")
+    parser.add_argument("--calibration", type=int, default=1000,
+                        help="Ventanas de calibración para int8 (por fuente)")
+    parser.add_argument("--calibration-hop", type=int, default=50, help="Salto entre ventanas candidatas")
+    parser.add_argument("--calibration-files", nargs="*", default=[],
+                        help="Archivos o directorios de señal (p. ej. Prueba_Re_*.csv) para calibrar")
+    args = parser.parse_args()
+
+    if args.precision:
+        args.tflite = True
+    if not args.numpy and not args.tflite:
+        args.numpy = args.tflite = True
+
+    if args.numpy:
+        print(f"[OK] Pesos NumPy exportados en: {export_numpy_weights(args.model)}")
+    if args.tflite:
+        for precision in args.precision or ["float32"]:
+            calibration = None
+            if precision == "int8":
+                calibration = calibration_windows(args.calibration, args.calibration_hop,
+                                                  signal_files(args.calibration_files))
+                if len(calibration) == 0:
+                    print("[ERROR] No hay ventanas para calibrar int8 (base vacía y sin --calibration-files)")
+                    continue
+                print(f"[INFO] Calibrando int8 con {len(calibration)} ventanas")
+            path = export_tflite(args.model, precision=precision, calibration=calibration)
+            print(f"[OK] Modelo TFLite {precision} exportado en: {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Script para importar a la base de datos mediciones exportadas por el
+frontend (como las de `mediciones_guardadas/`) u otros CSV de medición.
+
+Los archivos se leen, se codifican (.csv.gz, columnar, estadísticas) y se
+hashean en un pool de procesos; el proceso principal sólo los guarda, en
+transacciones de `--batch` mediciones. Los archivos cuyo contenido ya está
+en la base (mismo SHA-256) se omiten, así el import puede repetirse.
+"""
+
+import argparse
+import os
+import re
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from classification import read_measurement_file
+from database import RunWriter, import_runs
+
+def _label_number(label: Any) -> Optional[float]:
+    """Primer número de una etiqueta como '40 Hz' o '30.00s'."""
+    match = re.search(r"[-+]?\d+(?:[.,]\d+)?", str(label or ""))
+    return float(match.group(0).replace(",", ".")) if match else None
+
+def _start_time(meta: Dict[str, Any], path: Path) -> datetime:
+    try:
+        start = datetime.fromisoformat(str(meta["start_time"]).replace("Z", "+00:00"))
+        # created_at se guarda en hora local sin zona, como datetime.now()
+        return start.astimezone().replace(tzinfo=None) if start.tzinfo else start
+    except (KeyError, ValueError):
+        return datetime.fromtimestamp(path.stat().st_mtime)
+
+def encode_file(path: str) -> Dict[str, Any]:
+    """
+    Lee y codifica un archivo (se ejecuta en los procesos del pool).
+
+    Returns:
+        Medición lista para `import_runs`, o `{'path', 'error'}` si no se pudo leer
+    """
+    try:
+        header, data, file_meta = read_measurement_file(path)
+        sensors = [name for name in header if name.startswith("sensor")]
+        if not sensors or data.shape[0] == 0:
+            raise ValueError("sin datos de sensores")
+        rows = data.shape[0]
+
+        sampling_hz = _label_number(file_meta.get("sampling_label"))
+        if not sampling_hz and "time" in header and rows > 1:
+            step = float(np.median(np.diff(data[:, header.index("time")])))
+            sampling_hz = 1.0 / step if step > 0 else None
+        sampling_hz = int(round(sampling_hz)) if sampling_hz else 1
+        duration = _label_number(file_meta.get("duration_label"))
+        duration_sec = int(round(duration)) if duration is not None else int(round(rows / sampling_hz))
+        start = _start_time(file_meta, Path(path))
+
+        meta = {
+            "start_time": start.isoformat(),
+            "duration_sec": duration_sec,
+            "sampling_hz": sampling_hz,
+            "total_samples": rows,
+            "dominant_regimen": file_meta.get("dominant_regimen") or "indeterminado",
+            "file_name": file_meta.get("file_name") or Path(path).name,
+            "sensors": {name: True for name in sensors},
+            "min_timestamp": start.isoformat(),
+            "max_timestamp": datetime.fromtimestamp(start.timestamp() + duration_sec).isoformat(),
+        }
+        run_id = str(uuid.uuid4())
+        writer = RunWriter(run_id, header, meta)
+        csv_gz, columnar = writer.encode_table(data)
+        return {
+            "path": path,
+            "id": run_id,
+            "created_at": start.isoformat(),
+            "sampling_hz": sampling_hz,
+            "duration_sec": duration_sec,
+            "sensors": sensors,
+            "rows": rows,
+            "meta": meta,
+            "stats": writer.stats.result() if writer.stats is not None else None,
+            "csv_gz": csv_gz,
+            "columnar": columnar,
+        }
+    except Exception as e:
+        return {"path": path, "error": str(e)}
+
+def find_files(paths: List[str], pattern: str) -> List[str]:
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(str(p) for p in path.rglob(pattern) if p.is_file()))
+        elif path.is_file():
+            files.append(str(path))
+        else:
+            print(f"[WARN] No existe: {path}")
+    return files
+
+def _encode_all(pool: ProcessPoolExecutor, files: List[str], window: int) -> Iterator[Dict[str, Any]]:
+    """Resultados de `encode_file` en orden, con a lo sumo `window` archivos en vuelo."""
+    files = iter(files)
+    pending = deque(pool.submit(encode_file, path) for path in islice(files, window))
+    while pending:
+        result = pending.popleft().result()
+        for path in islice(files, 1):
+            pending.append(pool.submit(encode_file, path))
+        yield result
+
+def _batches(results: Iterator[Dict[str, Any]], batch: int) -> Iterator[List[Dict[str, Any]]]:
+    pending = []
+    for result in results:
+        pending.append(result)
+        if len(pending) >= batch:
+            yield pending
+            pending = []
+    if pending:
+        yield pending
+
+def import_legacy(paths: List[str], pattern: str = "*.csv", workers: Optional[int] = None,
+                  batch: int = 50) -> None:
+    files = find_files(paths, pattern)
+    if not files:
+        print("[ERROR] No se encontraron archivos para importar")
+        return
+    workers = workers or os.cpu_count() or 1
+    print(f"[INFO] Importando {len(files)} archivos con {workers} procesos")
+
+    start = time.perf_counter()
+    imported = duplicates = failed = rows = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for group in _batches(_encode_all(pool, files, 4 * workers), batch):
+            runs = []
+            for result in group:
+                if "error" in result:
+                    failed += 1
+                    print(f"[WARN] {result['path']}: {result['error']}")
+                else:
+                    runs.append(result)
+            for run, run_id in zip(runs, import_runs(runs) if runs else []):
+                if run_id is None:
+                    duplicates += 1
+                else:
+                    imported += 1
+                    rows += run["rows"]
+            elapsed = time.perf_counter() - start
+            done = imported + duplicates + failed
+            print(f"[INFO] {done}/{len(files)} archivos  {done / elapsed:.1f} archivos/s  "
+                  f"{rows / elapsed:.0f} filas/s")
+
+    elapsed = time.perf_counter() - start
+    print(f"[OK] {imported} importados, {duplicates} duplicados, {failed} con errores "
+          f"en {elapsed:.1f} s ({len(files) / elapsed:.1f} archivos/s, {rows / elapsed:.0f} filas/s)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa mediciones CSV exportadas a frisat.db")
+    parser.add_argument("paths", nargs="+", help="Archivos o directorios (se recorren recursivamente)")
+    parser.add_argument("--pattern", default="*.csv", help="Patrón de archivos en directorios (por defecto *.csv)")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos (por defecto, uno por CPU)")
+    parser.add_argument("--batch", type=int, default=50, help="Mediciones por transacción")
+    args = parser.parse_args()
+    import_legacy(args.paths, args.pattern, args.workers, args.batch)
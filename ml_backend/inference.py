@@ -0,0 +1,510 @@
+"""
+Motores de inferencia del modelo de FRISAT y pool donde se ejecutan.
+
+Hay tres implementaciones intercambiables de `InferenceEngine`:
+  - 'keras':  el .h5 original con Keras/TensorFlow.
+  - 'tflite': el modelo convertido a .tflite con el intérprete de TFLite.
+              'tflite-float16' y 'tflite-int8' usan las versiones
+              cuantizadas (ver export_model.py y bench_quantization.py).
+  - 'numpy':  una pasada hacia adelante en NumPy puro con los pesos
+              exportados del .h5 (no necesita TensorFlow).
+
+El motor se carga dentro del pool (hilos o procesos) para que los WebSockets
+y los endpoints REST sigan atendiendo mientras se clasifica. Este módulo no
+importa TensorFlow: cada motor lo carga recién al construirse, así que las
+herramientas que sólo usan la base de datos no pagan ese costo.
+"""
+
+import functools
+import json
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "Modelo_1500.h5")
+# Espera máxima de un trabajador calentado a que los demás tomen el suyo (s)
+WARMUP_BARRIER_TIMEOUT = 300.0
+# Precisión de los .tflite: float32 (sin cuantizar), float16 (pesos) o int8
+# (pesos y activaciones, calibradas con ventanas de mediciones guardadas)
+PRECISIONS = ("float32", "float16", "int8")
+
+
+def tflite_path_for(model_path: str, precision: str = "float32") -> str:
+    """Ruta del .tflite (Modelo.tflite, Modelo.float16.tflite...) que acompaña a un .h5."""
+    if precision not in PRECISIONS:
+        raise ValueError(f"Precisión desconocida: {precision} (opciones: {', '.join(PRECISIONS)})")
+    suffix = ".tflite" if precision == "float32" else f".{precision}.tflite"
+    return os.path.splitext(model_path)[0] + suffix
+
+
+def numpy_weights_path_for(model_path: str) -> str:
+    """Ruta del .npz de pesos exportados que acompaña a un .h5."""
+    return os.path.splitext(model_path)[0] + ".npz"
+
+
+def load_keras_model(model_path: str):
+    """Carga el modelo Keras sin compilar (sólo se usa para inferencia)."""
+    from keras.models import load_model
+    return load_model(model_path, compile=False)
+
+
+class InferenceEngine:
+    """Interfaz común: un lote `(n, WINDOW, canales)` -> `(n, clases)`."""
+
+    name = "base"
+    # Bytes que ocupan los pesos cargados (estimación de la memoria del motor)
+    nbytes = 0
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+
+class KerasEngine(InferenceEngine):
+    name = "keras"
+
+    def __init__(self, model_path: str = MODEL_PATH):
+        self.model = load_keras_model(model_path)
+        self.nbytes = sum(w.nbytes for w in self.model.get_weights())
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.model.predict(batch, verbose=0)
+
+
+class TFLiteEngine(InferenceEngine):
+    name = "tflite"
+
+    def __init__(self, model_path: str = MODEL_PATH, precision: str = "float32"):
+        try:
+            # Paquete mínimo del intérprete (Raspberry Pi)
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            try:
+                from ai_edge_litert.interpreter import Interpreter
+            except ImportError:
+                import tensorflow as tf
+                Interpreter = tf.lite.Interpreter
+
+        path = model_path if model_path.endswith(".tflite") else tflite_path_for(model_path, precision)
+        if not os.path.exists(path):
+            option = "" if precision == "float32" else f" --precision {precision}"
+            raise FileNotFoundError(
+                f"No existe {path}; genérelo con: python export_model.py --tflite{option}"
+            )
+        if precision != "float32":
+            self.name = f"tflite-{precision}"
+        self.interpreter = Interpreter(model_path=path)
+        self.nbytes = os.path.getsize(path)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]["index"]
+        self._output = self.interpreter.get_output_details()[0]["index"]
+        self._shape = None
+        # El intérprete no admite llamadas concurrentes
+        self._lock = threading.Lock()
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        with self._lock:
+            if batch.shape != self._shape:
+                self.interpreter.resize_tensor_input(self._input, batch.shape)
+                self.interpreter.allocate_tensors()
+                self._shape = batch.shape
+            self.interpreter.set_tensor(self._input, batch)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output).copy()
+
+
+# --- Pasada hacia adelante en NumPy -----------------------------------------
+
+def _activation(x: np.ndarray, name: str) -> np.ndarray:
+    if name in (None, "linear"):
+        return x
+    if name == "relu":
+        return np.maximum(x, 0)
+    if name == "sigmoid":
+        return 1.0 / (1.0 + np.exp(-x))
+    if name == "tanh":
+        return np.tanh(x)
+    if name == "selu":
+        alpha, scale = 1.6732632423543772, 1.0507009873554805
+        return scale * np.where(x > 0, x, alpha * np.expm1(np.minimum(x, 0)))
+    if name == "elu":
+        return np.where(x > 0, x, np.expm1(np.minimum(x, 0)))
+    if name == "softmax":
+        e = np.exp(x - x.max(axis=-1, keepdims=True))
+        return e / e.sum(axis=-1, keepdims=True)
+    raise ValueError(f"Activación no soportada en el motor NumPy: {name}")
+
+
+def _same_padding(length: int, kernel: int, stride: int):
+    """Relleno (izquierda, derecha) de TensorFlow para padding='same'."""
+    out = math.ceil(length / stride)
+    total = max((out - 1) * stride + kernel - length, 0)
+    return total // 2, total - total // 2
+
+
+def conv1d(x: np.ndarray, kernel: np.ndarray, bias: Optional[np.ndarray],
+           padding: str = "same") -> np.ndarray:
+    """Conv1D con stride 1: `x (n, L, cin)`, `kernel (k, cin, cout)`."""
+    k = kernel.shape[0]
+    if padding == "same":
+        left, right = _same_padding(x.shape[1], k, 1)
+        x = np.pad(x, ((0, 0), (left, right), (0, 0)))
+    length = x.shape[1] - k + 1
+    out = x[:, 0:length] @ kernel[0]
+    for j in range(1, k):
+        out += x[:, j:j + length] @ kernel[j]
+    if bias is not None:
+        out += bias
+    return out
+
+
+def max_pool1d(x: np.ndarray, pool: int, stride: int, padding: str = "valid") -> np.ndarray:
+    """MaxPooling1D sobre el eje temporal de `x (n, L, c)`."""
+    if padding == "same":
+        left, right = _same_padding(x.shape[1], pool, stride)
+        x = np.pad(x, ((0, 0), (left, right), (0, 0)), constant_values=-np.inf)
+    windows = np.lib.stride_tricks.sliding_window_view(x, pool, axis=1)
+    return windows[:, ::stride].max(axis=-1)
+
+
+class NumpyEngine(InferenceEngine):
+    """
+    Ejecuta la arquitectura exportada capa por capa con NumPy.
+    Soporta las capas que usa el modelo: Conv1D, MaxPooling1D,
+    BatchNormalization, LeakyReLU, Activation, Flatten, Dense y Dropout.
+    """
+
+    name = "numpy"
+
+    def __init__(self, model_path: str = MODEL_PATH, dtype=np.float32):
+        path = model_path if model_path.endswith(".npz") else numpy_weights_path_for(model_path)
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f"No existe {path}; genérelo con: python export_model.py --numpy"
+            )
+        self.dtype = dtype
+        with np.load(path, allow_pickle=False) as data:
+            self.layers: List[Dict[str, Any]] = json.loads(str(data["architecture"]))
+            for i, layer in enumerate(self.layers):
+                layer["weights"] = [
+                    data[f"{i}/{j}"].astype(dtype) for j in range(layer["n_weights"])
+                ]
+        for layer in self.layers:
+            self._prepare(layer)
+        self.nbytes = sum(w.nbytes for layer in self.layers for w in layer["weights"])
+
+    def _prepare(self, layer: Dict[str, Any]) -> None:
+        """Precalcula lo que no cambia entre llamadas (p. ej. BatchNorm)."""
+        if layer["class_name"] == "BatchNormalization":
+            cfg, weights = layer["config"], list(layer["weights"])
+            gamma = weights.pop(0) if cfg.get("scale", True) else 1.0
+            beta = weights.pop(0) if cfg.get("center", True) else 0.0
+            mean, var = weights
+            scale = gamma / np.sqrt(var + cfg.get("epsilon", 1e-3))
+            layer["bn"] = (scale.astype(self.dtype), (beta - mean * scale).astype(self.dtype))
+
+    def _apply(self, layer: Dict[str, Any], x: np.ndarray) -> np.ndarray:
+        kind, cfg, weights = layer["class_name"], layer["config"], layer["weights"]
+        if kind in ("InputLayer", "Dropout"):
+            return x
+        if kind == "Conv1D":
+            if tuple(cfg.get("strides", (1,))) != (1,) or tuple(cfg.get("dilation_rate", (1,))) != (1,):
+                raise ValueError("El motor NumPy sólo soporta Conv1D con stride y dilatación 1")
+            bias = weights[1] if cfg.get("use_bias", True) else None
+            x = conv1d(x, weights[0], bias, cfg.get("padding", "valid"))
+            return _activation(x, cfg.get("activation"))
+        if kind == "MaxPooling1D":
+            pool = cfg["pool_size"][0] if isinstance(cfg["pool_size"], list) else cfg["pool_size"]
+            stride = cfg.get("strides") or pool
+            stride = stride[0] if isinstance(stride, list) else stride
+            return max_pool1d(x, pool, stride, cfg.get("padding", "valid"))
+        if kind == "BatchNormalization":
+            scale, shift = layer["bn"]
+            return x * scale + shift
+        if kind == "LeakyReLU":
+            slope = cfg.get("negative_slope", cfg.get("alpha", 0.3))
+            return np.where(x > 0, x, x * np.asarray(slope, dtype=x.dtype))
+        if kind == "Activation":
+            return _activation(x, cfg.get("activation"))
+        if kind == "Flatten":
+            return x.reshape(x.shape[0], -1)
+        if kind == "Dense":
+            x = x @ weights[0]
+            if cfg.get("use_bias", True):
+                x = x + weights[1]
+            return _activation(x, cfg.get("activation"))
+        raise ValueError(f"Capa no soportada en el motor NumPy: {kind}")
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        x = np.asarray(batch, dtype=self.dtype)
+        for layer in self.layers:
+            x = self._apply(layer, x)
+        return x.astype(np.float32, copy=False)
+
+
+def export_numpy_weights(model_path: str = MODEL_PATH, out_path: Optional[str] = None) -> str:
+    """
+    Exporta arquitectura y pesos del .h5 a un .npz que lee `NumpyEngine`.
+    Se hace una sola vez en una máquina con Keras instalado.
+    """
+    out_path = out_path or numpy_weights_path_for(model_path)
+    model = load_keras_model(model_path)
+    architecture = []
+    arrays = {}
+    for i, layer in enumerate(model.layers):
+        weights = layer.get_weights()
+        architecture.append({
+            "class_name": layer.__class__.__name__,
+            "name": layer.name,
+            "config": layer.get_config(),
+            "n_weights": len(weights),
+        })
+        for j, w in enumerate(weights):
+            arrays[f"{i}/{j}"] = np.asarray(w)
+    np.savez(out_path, architecture=np.array(json.dumps(architecture, default=str)), **arrays)
+    return out_path
+
+
+def export_tflite(model_path: str = MODEL_PATH, out_path: Optional[str] = None,
+                  precision: str = "float32",
+                  calibration: Optional[np.ndarray] = None) -> str:
+    """
+    Convierte el .h5 a .tflite.
+
+    Args:
+        model_path: Ruta del .h5
+        out_path: Destino (por defecto, al lado del .h5 según la precisión)
+        precision: 'float32' (sin cuantizar), 'float16' (pesos en float16) o
+            'int8' (pesos y activaciones en int8; entrada y salida siguen en float32)
+        calibration: Ventanas normalizadas `(n, WINDOW, 1)` para calibrar los
+            rangos de las activaciones; obligatorias con 'int8'
+
+    Returns:
+        Ruta del archivo generado
+    """
+    import tensorflow as tf
+
+    out_path = out_path or tflite_path_for(model_path, precision)
+    model = load_keras_model(model_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if precision == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif precision == "int8":
+        if calibration is None or len(calibration) == 0:
+            raise ValueError("La cuantización int8 necesita ventanas de calibración")
+        windows = np.asarray(calibration, dtype=np.float32)
+
+        def representative_dataset():
+            for window in windows:
+                yield [window[np.newaxis]]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    elif precision != "float32":
+        raise ValueError(f"Precisión desconocida: {precision} (opciones: {', '.join(PRECISIONS)})")
+    with open(out_path, "wb") as f:
+        f.write(converter.convert())
+    return out_path
+
+
+ENGINES = {
+    "keras": KerasEngine,
+    "tflite": TFLiteEngine,
+    "tflite-float16": functools.partial(TFLiteEngine, precision="float16"),
+    "tflite-int8": functools.partial(TFLiteEngine, precision="int8"),
+    "numpy": NumpyEngine,
+}
+# Nombres de motor válidos (p. ej. para `--backend` de batch_evaluate.py)
+BACKENDS = tuple(ENGINES)
+
+
+def load_engine(backend: str = "keras", model_path: str = MODEL_PATH) -> InferenceEngine:
+    """
+    Crea el motor de inferencia indicado.
+
+    Args:
+        backend: 'keras', 'tflite', 'tflite-float16', 'tflite-int8' o 'numpy'
+        model_path: Ruta del .h5; los otros motores buscan su archivo al lado
+
+    Returns:
+        Motor listo para `predict`
+    """
+    if backend not in ENGINES:
+        raise ValueError(f"Motor de inferencia desconocido: {backend} (opciones: {', '.join(ENGINES)})")
+    return ENGINES[backend](model_path)
+
+
+# --- Pool de inferencia -----------------------------------------------------
+
+# Motores cargados en el proceso actual, por `(ruta del modelo, sello)`. Hay
+# uno por versión (ver model_registry.py); el sello cambia cuando el archivo
+# se reemplaza, y el motor viejo convive con el nuevo hasta que se descarga.
+_engines: Dict[Tuple[str, Any], InferenceEngine] = {}
+_engine_lock = threading.Lock()
+# Motor (backend) con que se inicializó cada `(ruta, sello)`: si se descarga
+# y llega otro lote, se vuelve a cargar con el mismo motor
+_backends: Dict[Tuple[str, Any], str] = {}
+# Motor que usan las llamadas sin `model_path` (el último inicializado)
+_default: Tuple[str, Any] = (MODEL_PATH, None)
+
+
+def init_worker(backend: str = "keras", model_path: str = MODEL_PATH, stamp: Any = None) -> None:
+    """Inicializador del pool: carga el motor una sola vez por proceso y sello."""
+    global _default
+    with _engine_lock:
+        _default = (model_path, stamp)
+        _backends[_default] = backend
+        if _default not in _engines:
+            _engines[_default] = load_engine(backend, model_path)
+
+
+def unload_in_worker(model_path: str, stamp: Any = None) -> bool:
+    """Descarga el motor de `model_path` con ese sello, si está cargado."""
+    with _engine_lock:
+        return _engines.pop((model_path, stamp), None) is not None
+
+
+def _worker_engine(model_path: Optional[str] = None, stamp: Any = None) -> InferenceEngine:
+    key = (model_path, stamp) if model_path else _default
+    engine = _engines.get(key)
+    if engine is None:
+        backend = _backends.get(key)
+        if backend is None:
+            raise RuntimeError(f"Motor no inicializado para {key[0]}: el pool debe crearse con init_worker")
+        with _engine_lock:
+            engine = _engines.get(key)
+            if engine is None:
+                engine = _engines[key] = load_engine(backend, key[0])
+    return engine
+
+
+def predict_in_worker(batch: np.ndarray, model_path: Optional[str] = None,
+                      stamp: Any = None) -> np.ndarray:
+    """Pasada del modelo dentro de un trabajador del pool."""
+    return _worker_engine(model_path, stamp).predict(batch)
+
+
+def warmup_in_worker(batch_sizes: Sequence[int], window: int = 350, channels: int = 1,
+                     passes: int = 2, model_path: Optional[str] = None,
+                     stamp: Any = None, barrier: Any = None) -> Dict[str, Any]:
+    """
+    Pasadas de calentamiento con ventanas en cero dentro de un trabajador.
+
+    La primera llamada a `predict` de cada forma de lote traza el grafo y
+    reserva memoria; hacerlo al arrancar evita que lo paguen las primeras
+    ventanas reales. Con `barrier`, el trabajador no termina hasta que los
+    demás tomaron su calentamiento, así ninguno toma dos.
+
+    Returns:
+        `{'pid', 'first_at', 'ms', 'nbytes'}`: proceso, hora (epoch) en que
+        terminó la primera pasada, duración de cada pasada por tamaño de lote
+        y bytes de los pesos
+    """
+    try:
+        engine = _worker_engine(model_path, stamp)
+        first_at = None
+        timings: Dict[int, List[float]] = {}
+        for n in batch_sizes:
+            batch = np.zeros((int(n), window, channels), dtype=np.float32)
+            for _ in range(max(1, passes)):
+                start = time.perf_counter()
+                engine.predict(batch)
+                timings.setdefault(int(n), []).append(round((time.perf_counter() - start) * 1000, 1))
+                if first_at is None:
+                    first_at = time.time()
+    except BaseException:
+        if barrier is not None:
+            # Los demás no esperan a uno que no va a llegar
+            barrier.abort()
+        raise
+    if barrier is not None:
+        barrier.wait(WARMUP_BARRIER_TIMEOUT)
+    return {"pid": os.getpid(), "first_at": first_at, "ms": timings, "nbytes": engine.nbytes}
+
+
+def warm_up(executor: Executor, workers: int, batch_sizes: Sequence[int],
+            window: int = 350, channels: int = 1, model_path: Optional[str] = None,
+            stamp: Any = None) -> Dict[str, Any]:
+    """
+    Carga el motor y lo calienta en los trabajadores del pool (bloqueante).
+
+    Con un pool de procesos se envía un calentamiento por trabajador a la vez,
+    y cada uno espera en una barrera a que estén todos tomados: ningún proceso
+    puede tomar dos, así cada uno carga y calienta su copia del motor.
+
+    Args:
+        executor: Pool creado con `create_executor`
+        workers: Número de trabajadores del pool
+        batch_sizes: Tamaños de lote que va a usar el servidor
+        window: Muestras por ventana
+        channels: Canales por ventana
+        model_path: Modelo a calentar (por defecto, el del pool)
+        stamp: Sello con que se cargó ese modelo en el pool
+
+    Returns:
+        Tiempos (hasta la primera predicción, total y por lote) y bytes de
+        los pesos en cada trabajador
+    """
+    started = time.time()
+    sizes = sorted({int(n) for n in batch_sizes if int(n) > 0}) or [1]
+    workers = max(1, int(workers))
+
+    def run(barrier: Any = None) -> List[Dict[str, Any]]:
+        futures = [
+            executor.submit(warmup_in_worker, sizes, window, channels, 2, model_path, stamp, barrier)
+            for _ in range(workers)
+        ]
+        return [future.result() for future in futures]
+
+    if isinstance(executor, ProcessPoolExecutor) and workers > 1:
+        # La barrera tiene que cruzar a los procesos: la sirve un Manager
+        with multiprocessing.Manager() as manager:
+            results = run(manager.Barrier(workers))
+    else:
+        # Con hilos el motor es uno solo y lo comparten
+        results = run()
+    return {
+        "batch_sizes": sizes,
+        "workers": len({result["pid"] for result in results}),
+        "time_to_first_prediction_s": round(min(r["first_at"] for r in results) - started, 3),
+        "duration_s": round(time.time() - started, 3),
+        "ms": results[0]["ms"],
+        "nbytes": results[0]["nbytes"],
+    }
+
+
+def create_executor(kind: str = "thread", workers: int = 1, backend: str = "keras",
+                    model_path: str = MODEL_PATH, stamp: Any = None) -> Executor:
+    """
+    Crea el pool de inferencia.
+
+    Args:
+        kind: 'thread' (motor compartido en este proceso) o 'process'
+            (una copia del motor por proceso)
+        workers: Número de hilos o procesos
+        backend: Motor de inferencia (una clave de `ENGINES`)
+        model_path: Ruta del archivo .h5
+        stamp: Sello del archivo; con otro sello se carga otro motor
+
+    Returns:
+        Executor listo para usarse con `loop.run_in_executor`
+    """
+    workers = max(1, int(workers))
+    if kind == "process":
+        return ProcessPoolExecutor(
+            max_workers=workers, initializer=init_worker, initargs=(backend, model_path, stamp)
+        )
+    if kind == "thread":
+        return ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="frisat-inference",
+            initializer=init_worker, initargs=(backend, model_path, stamp)
+        )
+    raise ValueError(f"Tipo de executor desconocido: {kind}")
@@ -8,6 +8,173 @@ import sqlite3
 import os
 from pathlib import Path
 
+def add_missing_columns(cursor, table, columns):
+    """Agrega a una tabla existente las columnas `(nombre, tipo)` que le falten."""
+    existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    for name, definition in columns:
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+def backfill_history_columns(cursor):
+    """Completa los campos de filtrado de mediciones guardadas antes de tenerlos."""
+    cursor.execute("""
+        UPDATE measurements SET sensor_count = json_array_length(sensors)
+        WHERE sensor_count IS NULL
+    """)
+    cursor.execute("""
+        UPDATE measurements SET
+            dominant_regimen = COALESCE(json_extract(preview_json, '$.dominant_regimen'), 'indeterminado'),
+            file_name = COALESCE(json_extract(preview_json, '$.file_name'), '')
+        WHERE dominant_regimen IS NULL AND preview_json IS NOT NULL
+    """)
+    cursor.execute("""
+        UPDATE measurements SET
+            size_bytes = (SELECT COALESCE(SUM(size), 0) FROM blobs
+                          WHERE sha256 IN (measurements.gz_sha256, measurements.col_sha256))
+        WHERE size_bytes IS NULL AND status = 'ready'
+    """)
+    cursor.execute("""
+        INSERT OR IGNORE INTO run_sensors (sensor, run_id)
+        SELECT value, measurements.id FROM measurements, json_each(measurements.sensors)
+        WHERE NOT EXISTS (SELECT 1 FROM run_sensors WHERE run_id = measurements.id)
+    """)
+
+def create_sensor_triggers(cursor):
+    """Triggers que llevan en `run_sensors` los sensores de cada medición."""
+    add = """
+            INSERT OR IGNORE INTO run_sensors (sensor, run_id)
+            SELECT value, NEW.id FROM json_each(NEW.sensors);"""
+    remove = """
+            DELETE FROM run_sensors WHERE run_id = OLD.id;"""
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS measurements_sensors_insert
+        AFTER INSERT ON measurements
+        BEGIN {add}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS measurements_sensors_delete
+        AFTER DELETE ON measurements
+        BEGIN {remove}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS measurements_sensors_update
+        AFTER UPDATE OF sensors ON measurements
+        BEGIN {remove} {add}
+        END
+    """)
+
+def create_blob_triggers(cursor):
+    """Triggers que llevan en `blobs.refs` cuántas mediciones usan cada BLOB."""
+    ref = """
+            UPDATE blobs SET refs = refs + 1 WHERE sha256 IN (NEW.gz_sha256, NEW.col_sha256);"""
+    unref = """
+            UPDATE blobs SET refs = refs - 1 WHERE sha256 IN (OLD.gz_sha256, OLD.col_sha256);
+            DELETE FROM blobs WHERE refs <= 0 AND sha256 IN (OLD.gz_sha256, OLD.col_sha256);"""
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS measurements_blobs_insert
+        AFTER INSERT ON measurements
+        BEGIN {ref}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS measurements_blobs_delete
+        AFTER DELETE ON measurements
+        BEGIN {unref}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS measurements_blobs_update
+        AFTER UPDATE OF gz_sha256, col_sha256 ON measurements
+        BEGIN {ref} {unref}
+        END
+    """)
+
+def migrate_inline_blobs(conn, batch=50):
+    """
+    Mueve los archivos guardados dentro de `measurements` (`data_gz` y
+    `data_col`, esquema anterior) a la tabla `blobs`.
+
+    Cada medición se migra en su propia fila y se confirma cada `batch`
+    mediciones, así el WAL no crece con todo el archivo de una vez.
+
+    Returns:
+        Cantidad de mediciones migradas
+    """
+    import hashlib
+    cursor = conn.cursor()
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(measurements)")}
+    inline = [(col, key) for col, key in (("data_gz", "gz_sha256"), ("data_col", "col_sha256"))
+              if col in columns]
+    if not inline:
+        return 0
+    pending = " OR ".join(f"{col} IS NOT NULL" for col, _ in inline)
+    rowids = [row[0] for row in cursor.execute(f"SELECT rowid FROM measurements WHERE {pending}")]
+    for done, rowid in enumerate(rowids, 1):
+        for col, key in inline:
+            (data,) = cursor.execute(
+                f"SELECT {col} FROM measurements WHERE rowid = ?", (rowid,)
+            ).fetchone()
+            if data is None:
+                continue
+            sha256 = hashlib.sha256(data).hexdigest()
+            cursor.execute(
+                "INSERT OR IGNORE INTO blobs (sha256, size, data) VALUES (?, ?, ?)",
+                (sha256, len(data), data)
+            )
+            cursor.execute(
+                f"UPDATE measurements SET {key} = ?, {col} = NULL WHERE rowid = ?",
+                (sha256, rowid)
+            )
+        if done % batch == 0:
+            conn.commit()
+    conn.commit()
+    return len(rowids)
+
+def create_stats_triggers(cursor):
+    """Triggers que suman/restan cada cambio de measurements en measurement_stats."""
+    add = """
+            INSERT INTO measurement_stats (status, runs, rows, size_bytes)
+            VALUES (NEW.status, 1, COALESCE(NEW.rows, 0), COALESCE(NEW.size_bytes, 0))
+            ON CONFLICT(status) DO UPDATE SET
+                runs = runs + 1,
+                rows = rows + excluded.rows,
+                size_bytes = size_bytes + excluded.size_bytes;"""
+    remove = """
+            UPDATE measurement_stats SET
+                runs = runs - 1,
+                rows = rows - COALESCE(OLD.rows, 0),
+                size_bytes = size_bytes - COALESCE(OLD.size_bytes, 0)
+            WHERE status = OLD.status;"""
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS measurements_stats_insert
+        AFTER INSERT ON measurements
+        BEGIN {add}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS measurements_stats_delete
+        AFTER DELETE ON measurements
+        BEGIN {remove}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS measurements_stats_update
+        AFTER UPDATE OF status, rows, size_bytes ON measurements
+        BEGIN {remove} {add}
+        END
+    """)
+
+def rebuild_stats(cursor):
+    """Recalcula measurement_stats desde cero a partir de measurements."""
+    cursor.execute("DELETE FROM measurement_stats")
+    cursor.execute("""
+        INSERT INTO measurement_stats (status, runs, rows, size_bytes)
+        SELECT status, COUNT(*), COALESCE(SUM(rows), 0), COALESCE(SUM(size_bytes), 0)
+        FROM measurements GROUP BY status
+    """)
+
 def init_database():
     """Inicializa la base de datos SQLite con la tabla measurements."""
     
@@ -33,6 +200,14 @@ def init_database():
     cursor.execute("PRAGMA temp_store=MEMORY")
     cursor.execute("PRAGMA foreign_keys=ON")
     
+    # Espacio de mediciones borradas: lo devuelve de a poco el mantenimiento
+    # (ver maintenance.py). Una base existente sólo cambia de modo con VACUUM.
+    if cursor.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        if cursor.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0]:
+            print("Compactando la base para activar auto_vacuum incremental...")
+            cursor.execute("VACUUM")
+    
     # Crear tabla measurements
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS measurements (
@@ -46,16 +221,101 @@ def init_database():
             rows INTEGER DEFAULT 0,
             status TEXT NOT NULL DEFAULT 'writing',
             preview_json TEXT,
-            data_gz BLOB,
             sha256 TEXT,
+            gz_sha256 TEXT,
+            col_sha256 TEXT,
+            dominant_regimen TEXT,
+            file_name TEXT,
+            sensor_count INTEGER,
+            size_bytes INTEGER,
+            stats_json TEXT,
             UNIQUE(id)
         )
     """)
     
+    # Columnas agregadas después de la primera versión del esquema
+    add_missing_columns(cursor, "measurements", [
+        # Archivos .csv.gz y columnar en la tabla blobs (antes data_gz/data_col)
+        ("gz_sha256", "TEXT"),
+        ("col_sha256", "TEXT"),
+        # Campos de filtrado del historial (antes sólo dentro de preview_json)
+        ("dominant_regimen", "TEXT"),
+        ("file_name", "TEXT"),
+        ("sensor_count", "INTEGER"),
+        ("size_bytes", "INTEGER"),
+        # Estadísticas y sparkline por sensor (ver run_stats.py y backfill_stats.py)
+        ("stats_json", "TEXT"),
+    ])
+    
+    # Archivos de las mediciones, direccionados por contenido: una medición
+    # idéntica a otra ya guardada reutiliza su BLOB. Los datos van en una
+    # tabla aparte para que las consultas de metadatos no recorran sus páginas.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS blobs (
+            id INTEGER PRIMARY KEY,
+            sha256 TEXT NOT NULL UNIQUE,
+            size INTEGER NOT NULL,
+            refs INTEGER NOT NULL DEFAULT 0,
+            level INTEGER,
+            data BLOB NOT NULL
+        )
+    """)
+    # Nivel de compresión si el mantenimiento lo recomprimió (NULL: el de la escritura)
+    add_missing_columns(cursor, "blobs", [("level", "INTEGER")])
+    create_blob_triggers(cursor)
+    migrated = migrate_inline_blobs(conn)
+    
+    # Sensores de cada medición, para filtrar el historial por índice en vez
+    # de leer el JSON de `sensors` fila por fila; los mantienen los triggers
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS run_sensors (
+            sensor TEXT NOT NULL,
+            run_id TEXT NOT NULL,
+            PRIMARY KEY (sensor, run_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_run_sensors_run_id ON run_sensors(run_id)")
+    create_sensor_triggers(cursor)
+    backfill_history_columns(cursor)
+    
+    # Fragmentos comprimidos de mediciones en curso (POST /runs/{id}/append)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS measurement_chunks (
+            run_id TEXT NOT NULL REFERENCES measurements(id) ON DELETE CASCADE,
+            seq INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            kind TEXT NOT NULL DEFAULT 'gz',
+            PRIMARY KEY (run_id, seq)
+        )
+    """)
+    # 'gz': fragmento del .csv.gz; 'col': parte del archivo columnar
+    add_missing_columns(cursor, "measurement_chunks", [("kind", "TEXT NOT NULL DEFAULT 'gz'")])
+    
+    # Totales por estado que lee /stats; los mantienen los triggers
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS measurement_stats (
+            status TEXT PRIMARY KEY,
+            runs INTEGER NOT NULL DEFAULT 0,
+            rows INTEGER NOT NULL DEFAULT 0,
+            size_bytes INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    create_stats_triggers(cursor)
+    if cursor.execute("SELECT COUNT(*) FROM measurement_stats").fetchone()[0] == 0:
+        rebuild_stats(cursor)
+    
     # Crear índices para optimizar consultas
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_measurements_created_at ON measurements(created_at)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_measurements_status ON measurements(status)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_measurements_sha256 ON measurements(sha256)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_measurements_gz_sha256 ON measurements(gz_sha256)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_measurements_col_sha256 ON measurements(col_sha256)")
+    # Historial: paginación por cursor (status, created_at, id) y filtros
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_measurements_status_created ON measurements(status, created_at, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_measurements_regimen ON measurements(status, dominant_regimen, created_at, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_measurements_sensor_count ON measurements(status, sensor_count, created_at, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_measurements_file_name ON measurements(file_name COLLATE NOCASE)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_measurements_size ON measurements(status, size_bytes)")
     
     # Confirmar cambios
     conn.commit()
@@ -64,6 +324,8 @@ def init_database():
     print(f"Base de datos inicializada en: {db_path}")
     print("Tabla 'measurements' creada exitosamente")
     print("Índices creados para optimización de consultas")
+    if migrated:
+        print(f"{migrated} mediciones migradas a la tabla blobs (el mantenimiento devuelve de a poco el espacio anterior)")
 
 if __name__ == "__main__":
     init_database()
@@ -0,0 +1,247 @@
+"""
+Mantenimiento periódico de la base de datos de FRISAT, dentro del servidor.
+
+Trabajos:
+- reap: sella las mediciones cuyo escritor no recibe bloques hace
+  FRISAT_WRITER_IDLE_MIN minutos (cliente de /append que se cortó) y borra
+  las 'writing'/'failed' abandonadas (más viejas que FRISAT_STALE_RUN_HOURS
+  y sin grabación en curso).
+- checkpoint: `wal_checkpoint(TRUNCATE)`, para que el WAL no crezca sin límite.
+- vacuum: `incremental_vacuum` de a pocas páginas, devuelve el espacio libre.
+- recompress (opcional): recomprime los .csv.gz antiguos con más nivel; la
+  lectura y la compresión se hacen fuera del hilo de escritura, que sólo
+  se toma para reemplazar el BLOB.
+
+Cada trabajo avanza en pasos cortos que corren en el hilo de escritura de
+db_async, y cada paso espera a que no haya tráfico en vivo (/ws) desde hace
+al menos FRISAT_MAINTENANCE_IDLE_S segundos: mientras se adquiere, el
+mantenimiento no compite con las grabaciones.
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import database
+import db_async as db
+
+MAINTENANCE_ENABLED = os.environ.get("FRISAT_MAINTENANCE", "1") != "0"
+# Edad (horas) a partir de la cual una medición sin terminar se considera abandonada
+STALE_RUN_HOURS = float(os.environ.get("FRISAT_STALE_RUN_HOURS", 24))
+# Minutos sin bloques nuevos tras los que se sella una medición con escritor abierto
+WRITER_IDLE_MINUTES = float(os.environ.get("FRISAT_WRITER_IDLE_MIN", 30))
+# Segundos sin tráfico en /ws antes de dar cada paso
+IDLE_SECONDS = float(os.environ.get("FRISAT_MAINTENANCE_IDLE_S", 2))
+# Intervalo de cada trabajo (s)
+REAP_INTERVAL = float(os.environ.get("FRISAT_REAP_INTERVAL_S", 15 * 60))
+CHECKPOINT_INTERVAL = float(os.environ.get("FRISAT_CHECKPOINT_INTERVAL_S", 5 * 60))
+VACUUM_INTERVAL = float(os.environ.get("FRISAT_VACUUM_INTERVAL_S", 60 * 60))
+RECOMPRESS_INTERVAL = float(os.environ.get("FRISAT_RECOMPRESS_INTERVAL_S", 10 * 60))
+# Mediciones borradas por paso de reap
+REAP_BATCH = 100
+# Páginas liberadas por paso de vacuum
+VACUUM_STEP_PAGES = 256
+# Nivel de recompresión (0 = desactivada) y antigüedad mínima (días)
+RECOMPRESS_LEVEL = int(os.environ.get("FRISAT_RECOMPRESS_LEVEL", 0))
+RECOMPRESS_AGE_DAYS = float(os.environ.get("FRISAT_RECOMPRESS_AGE_DAYS", 7))
+# BLOBs recomprimidos por ejecución del trabajo
+RECOMPRESS_BATCH = 20
+# Espera antes de la primera ejecución de cada trabajo (s)
+STARTUP_DELAY = 30.0
+
+
+class Activity:
+    """Marca de tiempo del último tráfico en vivo, para saber si hay calma."""
+
+    def __init__(self):
+        self._last = 0.0
+
+    def touch(self) -> None:
+        self._last = time.monotonic()
+
+    def idle_for(self) -> float:
+        return time.monotonic() - self._last
+
+
+class MaintenanceJob:
+    """Un trabajo periódico y el registro de su última ejecución."""
+
+    def __init__(self, name: str, interval: float, run: Callable[[], Awaitable[Dict[str, Any]]]):
+        self.name = name
+        self.interval = interval
+        self.run = run
+        self.next_due = 0.0
+        self.runs = 0
+        self.running = False
+        self.last_run: Optional[str] = None
+        self.last_duration: Optional[float] = None   # Trabajo, sin contar esperas
+        self.last_waited: Optional[float] = None     # Esperando calma en /ws
+        self.last_result: Optional[Dict[str, Any]] = None
+        self.last_error: Optional[str] = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "interval_s": self.interval,
+            "running": self.running,
+            "runs": self.runs,
+            "last_run": self.last_run,
+            "last_duration_s": self.last_duration,
+            "last_waited_s": self.last_waited,
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+            "next_run_in_s": max(0.0, round(self.next_due - time.monotonic(), 1)),
+        }
+
+
+class MaintenanceScheduler:
+    """
+    Ejecuta los trabajos de mantenimiento cuando les toca, de a uno.
+
+    Args:
+        activity: Tráfico en vivo; los pasos esperan a que lleve `idle_seconds` en calma
+        idle_seconds: Calma necesaria antes de cada paso
+        stale_run_hours: Edad de las mediciones abandonadas que se borran
+        recompress_level: Nivel de recompresión de .csv.gz antiguos (0 = no recomprimir)
+    """
+
+    def __init__(self, activity: Activity, idle_seconds: float = IDLE_SECONDS,
+                 stale_run_hours: float = STALE_RUN_HOURS,
+                 recompress_level: int = RECOMPRESS_LEVEL):
+        self.activity = activity
+        self.idle_seconds = idle_seconds
+        self.stale_run_hours = stale_run_hours
+        self.recompress_level = recompress_level
+        self.jobs: List[MaintenanceJob] = [
+            MaintenanceJob("reap", REAP_INTERVAL, self._reap),
+            MaintenanceJob("checkpoint", CHECKPOINT_INTERVAL, self._checkpoint),
+            MaintenanceJob("vacuum", VACUUM_INTERVAL, self._vacuum),
+        ]
+        if recompress_level:
+            self.jobs.append(MaintenanceJob("recompress", RECOMPRESS_INTERVAL, self._recompress))
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._waited = 0.0
+
+    async def start(self, delay: float = STARTUP_DELAY) -> None:
+        """Arranca la tarea de fondo; cada trabajo corre por primera vez a los `delay` s."""
+        if self._task is None:
+            now = time.monotonic()
+            for job in self.jobs:
+                job.next_due = now + delay
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Detiene la tarea de fondo; un paso ya enviado a la base termina igual."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def trigger(self, name: str) -> bool:
+        """Adelanta un trabajo para que corra en cuanto haya calma."""
+        for job in self.jobs:
+            if job.name == name:
+                job.next_due = 0.0
+                if self._wake is not None:
+                    self._wake.set()
+                return True
+        return False
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self._task is not None,
+            "idle_for_s": round(self.activity.idle_for(), 1),
+            "idle_needed_s": self.idle_seconds,
+            "jobs": {job.name: job.status() for job in self.jobs},
+        }
+
+    async def _run(self) -> None:
+        while True:
+            now = time.monotonic()
+            due = [job for job in self.jobs if job.next_due <= now]
+            for job in due:
+                await self._run_job(job)
+            wait = min(job.next_due for job in self.jobs) - time.monotonic()
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=max(0.1, wait))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_job(self, job: MaintenanceJob) -> None:
+        job.running = True
+        started = datetime.now()
+        start = time.perf_counter()
+        self._waited = 0.0
+        try:
+            job.last_result = await job.run()
+            job.last_error = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job.last_error = str(e)
+            print(f"Error en mantenimiento '{job.name}': {e}")
+        finally:
+            job.running = False
+        job.runs += 1
+        job.last_run = started.isoformat()
+        job.last_waited = round(self._waited, 3)
+        job.last_duration = round(time.perf_counter() - start - self._waited, 3)
+        job.next_due = time.monotonic() + job.interval
+
+    async def _when_idle(self) -> None:
+        """Espera a que no haya tráfico en vivo."""
+        start = time.perf_counter()
+        while self.activity.idle_for() < self.idle_seconds:
+            await asyncio.sleep(max(0.1, self.idle_seconds - self.activity.idle_for()))
+        self._waited += time.perf_counter() - start
+
+    async def _step(self, fn: Callable, *args) -> Any:
+        """Un paso corto en el hilo de escritura, cuando no hay tráfico en vivo."""
+        await self._when_idle()
+        return await db.run_write(fn, *args)
+
+    async def _reap(self) -> Dict[str, Any]:
+        sealed = await self._step(database.seal_idle_runs, WRITER_IDLE_MINUTES * 60)
+        deleted = 0
+        while True:
+            n = await self._step(database.reap_stale_runs, self.stale_run_hours, REAP_BATCH)
+            deleted += n
+            if n < REAP_BATCH:
+                return {"sealed": len(sealed), "deleted": deleted}
+
+    async def _checkpoint(self) -> Dict[str, Any]:
+        return await self._step(database.checkpoint_wal)
+
+    async def _vacuum(self) -> Dict[str, Any]:
+        freed = 0
+        while True:
+            result = await self._step(database.incremental_vacuum, VACUUM_STEP_PAGES)
+            freed += result["freed"]
+            if result["remaining"] == 0 or result["freed"] == 0:
+                return {"freed_pages": freed, "remaining_pages": result["remaining"]}
+
+    async def _recompress(self) -> Dict[str, Any]:
+        blobs = before = after = 0
+        for _ in range(RECOMPRESS_BATCH):
+            await self._when_idle()
+            candidate = await db.run_read(database.find_recompress_candidate, RECOMPRESS_AGE_DAYS)
+            if candidate is None:
+                break
+            sha256, data = candidate
+            # Descomprimir y recomprimir fuera de la conexión de escritura
+            smaller = await asyncio.to_thread(database.recompress_gzip, data, self.recompress_level)
+            result = await self._step(database.swap_recompressed_blob, sha256, len(data),
+                                      smaller, self.recompress_level)
+            if result is None:
+                continue
+            blobs += 1
+            before += result["before"]
+            after += result["after"]
+        return {"blobs": blobs, "bytes_before": before, "bytes_after": after}
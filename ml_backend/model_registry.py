@@ -0,0 +1,406 @@
+"""
+Registro de versiones del modelo de FRISAT.
+
+Cada versión es un par modelo/normalización en FRISAT_MODELS_DIR:
+`Modelo_<versión>.h5` (o el .tflite / .npz que usa el motor elegido) y
+`MaxiMini_<versión>.npz`, o `MaxiMini.npz` si la versión no trae uno propio.
+
+Las versiones se cargan a pedido, cada una con su pool de inferencia y su
+planificador de micro-lotes, y quedan en memoria mientras sus pesos entren
+en FRISAT_MODEL_MEMORY_MB; al pasarse se descarga la usada hace más tiempo
+que no tenga sesiones abiertas. `reload` vuelve a mirar el disco y reemplaza
+en caliente las versiones cargadas cuyo archivo cambió: la nueva se carga y
+se calienta antes de tomar el lugar de la anterior, que termina sus lotes
+pendientes y recién entonces se descarga. La normalización (MINI/MAXI) va
+con la versión cargada, así que se renueva junto con los pesos; una versión
+que desaparece del disco sigue sirviendo a las sesiones que ya la usaban.
+
+Las sesiones con inferencia incremental (streaming.py) usan además los pesos
+NumPy de su versión en este mismo proceso: `LoadedModel.streaming_engine`
+los lee una vez por versión cargada, así van y vuelven junto con ella y con
+su normalización.
+"""
+
+import asyncio
+import functools
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from classification import load_normalization
+from inference import (NumpyEngine, create_executor, numpy_weights_path_for, predict_in_worker,
+                       unload_in_worker, warm_up)
+from scheduler import InferenceScheduler
+
+MODELS_DIR = os.environ.get("FRISAT_MODELS_DIR", os.path.dirname(os.path.abspath(__file__)))
+# Memoria para pesos de modelos cargados (MB); la versión por defecto no se descarga
+MODEL_MEMORY_MB = float(os.environ.get("FRISAT_MODEL_MEMORY_MB", 256))
+# Versión por defecto (si no se indica, la de Modelo_1500.h5 o la más reciente)
+DEFAULT_MODEL_VERSION = os.environ.get("FRISAT_MODEL_VERSION") or None
+# Espera máxima para que un modelo retirado termine sus lotes (s)
+DRAIN_TIMEOUT = 30.0
+
+MODEL_PREFIX = "Modelo_"
+NORMALIZATION_FILE = "MaxiMini.npz"
+# Archivo que necesita cada motor (los motores lo buscan al lado del .h5)
+BACKEND_SUFFIX = {
+    "keras": ".h5",
+    "tflite": ".tflite",
+    "tflite-float16": ".float16.tflite",
+    "tflite-int8": ".int8.tflite",
+    "numpy": ".npz",
+}
+
+
+def _version_key(version: str) -> Tuple[Any, ...]:
+    """Orden natural: '900' < '1500' < '1500b'."""
+    return tuple((0, int(part)) if part.isdigit() else (1, part)
+                 for part in re.findall(r"\d+|\D+", version))
+
+
+def _file_stamp(*paths: str) -> Tuple[Tuple[int, int], ...]:
+    stamps = []
+    for path in paths:
+        st = os.stat(path)
+        stamps.append((st.st_mtime_ns, st.st_size))
+    return tuple(stamps)
+
+
+class ModelFiles:
+    """Archivos de una versión en disco."""
+
+    def __init__(self, version: str, model_path: str, artifact: str,
+                 normalization_path: str, normalization_version: str):
+        self.version = version
+        self.model_path = model_path                  # .h5 (los otros motores buscan al lado)
+        self.artifact = artifact                      # Archivo que carga el motor
+        self.normalization_path = normalization_path
+        self.normalization_version = normalization_version
+        self.stamp = _file_stamp(artifact, normalization_path)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "file": os.path.basename(self.artifact),
+            "normalization": os.path.basename(self.normalization_path),
+            "normalization_version": self.normalization_version,
+        }
+
+
+def discover_models(directory: str = MODELS_DIR, backend: str = "keras") -> Dict[str, ModelFiles]:
+    """
+    Busca los pares modelo/normalización de `directory`.
+
+    Args:
+        directory: Carpeta con los `Modelo_*.h5` y `MaxiMini*.npz`
+        backend: Motor de inferencia; sólo cuentan las versiones que tienen su archivo
+
+    Returns:
+        Versiones encontradas, por nombre
+    """
+    suffix = BACKEND_SUFFIX[backend]
+    default_norm = os.path.join(directory, NORMALIZATION_FILE)
+    found: Dict[str, ModelFiles] = {}
+    for name in sorted(os.listdir(directory)):
+        if not name.startswith(MODEL_PREFIX) or not name.endswith(suffix):
+            continue
+        version = name[len(MODEL_PREFIX):-len(suffix)]
+        if not version or "." in version:
+            # Modelo_1500.int8.tflite no es la versión '1500.int8' del motor 'tflite'
+            continue
+        norm = os.path.join(directory, f"MaxiMini_{version}.npz")
+        norm_version = version
+        if not os.path.exists(norm):
+            norm, norm_version = default_norm, "default"
+        if not os.path.exists(norm):
+            continue
+        artifact = os.path.join(directory, name)
+        model_path = os.path.join(directory, f"Modelo_{version}.h5")
+        try:
+            found[version] = ModelFiles(version, model_path, artifact, norm, norm_version)
+        except OSError:
+            # Se borró mientras se recorría la carpeta
+            continue
+    return found
+
+
+class LoadedModel:
+    """
+    Una versión cargada: su pool de inferencia, su planificador de micro-lotes
+    y la normalización `(mini, maxi)` con la que se entrenaron esos pesos.
+    """
+
+    def __init__(self, files: ModelFiles, executor, scheduler: InferenceScheduler,
+                 warmup: Dict[str, Any], nbytes: int, normalization: Tuple[float, float]):
+        self.files = files
+        self.version = files.version
+        self.normalization = normalization
+        self.executor = executor
+        self.scheduler = scheduler
+        self.warmup = warmup
+        self.nbytes = nbytes
+        self.loaded_at = time.time()
+        self.last_used = time.monotonic()
+        self._streaming: Optional[NumpyEngine] = None
+
+    async def predict(self, windows: np.ndarray) -> np.ndarray:
+        """Ventanas `(n, WINDOW, 1)` ya normalizadas por el micro-lote compartido."""
+        self.last_used = time.monotonic()
+        return await self.scheduler.submit(windows)
+
+    def predict_sync(self, batch: np.ndarray) -> np.ndarray:
+        """Lote grande, bloqueante (desde un hilo), en el mismo pool que las sesiones."""
+        self.last_used = time.monotonic()
+        return self.executor.submit(
+            predict_in_worker, batch, self.files.model_path, self.files.stamp
+        ).result()
+
+    def streaming_engine(self) -> NumpyEngine:
+        """
+        Motor NumPy de esta versión en el proceso del servidor, para la
+        inferencia incremental; lo comparten (sólo leen) todas sus sesiones.
+        Se lee la primera vez y queda con esta carga: una recarga de la
+        versión es otro `LoadedModel`. FileNotFoundError si no hay .npz.
+        """
+        if self._streaming is None:
+            path = numpy_weights_path_for(self.files.model_path)
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"No existe {path}; genérelo con: python export_model.py --numpy")
+            self._streaming = NumpyEngine(path)
+        return self._streaming
+
+
+class ModelRegistry:
+    """
+    Versiones disponibles y cargadas del modelo.
+
+    Args:
+        backend: Motor de inferencia (una clave de `inference.ENGINES`)
+        executor_kind: Pool de cada versión, 'thread' o 'process'
+        workers: Trabajadores del pool de cada versión
+        max_batch_size: Tamaño máximo de los micro-lotes
+        max_wait_ms: Espera máxima para juntar un micro-lote
+        warmup_batch_sizes: Tamaños de lote del calentamiento al cargar
+        window: Muestras por ventana
+        memory_mb: Memoria para pesos de versiones cargadas
+        directory: Carpeta de los modelos
+        default_version: Versión por defecto (si no, la de Modelo_1500.h5 o la más reciente)
+    """
+
+    def __init__(self, backend: str = "keras", executor_kind: str = "thread", workers: int = 1,
+                 max_batch_size: int = 32, max_wait_ms: float = 5.0,
+                 warmup_batch_sizes: Sequence[int] = (1,), window: int = 350,
+                 memory_mb: float = MODEL_MEMORY_MB, directory: str = MODELS_DIR,
+                 default_version: Optional[str] = DEFAULT_MODEL_VERSION):
+        self.backend = backend
+        self.executor_kind = executor_kind
+        self.workers = max(1, int(workers))
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.warmup_batch_sizes = list(warmup_batch_sizes)
+        self.window = window
+        self.memory_budget = int(memory_mb * 1024 * 1024)
+        self.directory = directory
+        self.requested_default = default_version
+        self.available: Dict[str, ModelFiles] = {}
+        self.loaded: Dict[str, LoadedModel] = {}
+        self.default_version: Optional[str] = None
+        # Sesiones abiertas por versión: esas versiones no se descargan
+        self._sessions: Dict[str, int] = {}
+        self._loading: Dict[str, asyncio.Lock] = {}
+        self._normalization: Dict[Tuple[str, Any], Tuple[float, float]] = {}
+        self._retiring: set = set()
+
+    def scan(self) -> Dict[str, List[str]]:
+        """Vuelve a buscar versiones en disco; no carga ni descarga nada."""
+        before = set(self.available)
+        self.available = discover_models(self.directory, self.backend)
+        if self.requested_default and self.requested_default in self.available:
+            self.default_version = self.requested_default
+        elif "1500" in self.available:
+            self.default_version = "1500"
+        elif self.available:
+            self.default_version = max(self.available, key=_version_key)
+        else:
+            self.default_version = None
+        return {
+            "added": sorted(set(self.available) - before, key=_version_key),
+            "removed": sorted(before - set(self.available), key=_version_key),
+        }
+
+    def resolve(self, version: Optional[str] = None) -> ModelFiles:
+        """Archivos de `version` (o de la versión por defecto); KeyError si no existe."""
+        version = str(version) if version else self.default_version
+        if version is None or version not in self.available:
+            raise KeyError(f"Versión de modelo desconocida: {version}")
+        return self.available[version]
+
+    def normalization(self, version: Optional[str] = None) -> Tuple[float, float]:
+        """
+        `(mini, maxi)` de una versión: la de sus pesos si está cargada (aunque
+        ya no esté en disco); si no, la del disco, sin cargar el modelo.
+        """
+        model = self.peek(version)
+        if model is not None:
+            return model.normalization
+        return self._read_normalization(self.resolve(version))
+
+    def _read_normalization(self, files: ModelFiles) -> Tuple[float, float]:
+        key = (files.normalization_path, files.stamp[1])
+        if key not in self._normalization:
+            self._normalization[key] = load_normalization(files.normalization_path)
+        return self._normalization[key]
+
+    def peek(self, version: Optional[str] = None) -> Optional[LoadedModel]:
+        """La versión si está cargada ahora mismo (sin cargarla); si no, None."""
+        return self.loaded.get(str(version) if version else self.default_version)
+
+    async def get(self, version: Optional[str] = None) -> LoadedModel:
+        """
+        La versión cargada y caliente; la carga si hace falta. Una versión
+        cargada se sirve aunque se haya quitado del disco (sus sesiones la
+        siguen usando hasta cerrarse).
+        """
+        model = self.peek(version)
+        if model is not None:
+            model.last_used = time.monotonic()
+            return model
+        files = self.resolve(version)
+        lock = self._loading.setdefault(files.version, asyncio.Lock())
+        async with lock:
+            model = self.loaded.get(files.version)
+            if model is None:
+                model = await self._load(files)
+                self.loaded[files.version] = model
+                self._evict()
+        model.last_used = time.monotonic()
+        return model
+
+    def acquire(self, version: Optional[str] = None) -> ModelFiles:
+        """Marca una versión en uso por una sesión: no se descarga hasta `release`."""
+        files = self.resolve(version)
+        self._sessions[files.version] = self._sessions.get(files.version, 0) + 1
+        return files
+
+    def release(self, version: str) -> None:
+        count = self._sessions.get(version, 0) - 1
+        if count > 0:
+            self._sessions[version] = count
+        else:
+            self._sessions.pop(version, None)
+            if version not in self.available and version in self.loaded:
+                # Se quitó del disco y era su última sesión
+                self._retire(self.loaded.pop(version))
+            self._evict()
+
+    async def reload(self) -> Dict[str, Any]:
+        """
+        Vuelve a mirar el disco y reemplaza en caliente las versiones cargadas
+        cuyos archivos cambiaron. Las sesiones siguen con la misma versión y,
+        desde el siguiente lote, usan los pesos y la normalización nuevos.
+
+        Returns:
+            Versiones agregadas, quitadas, recargadas y las que fallaron
+        """
+        changes = self.scan()
+        reloaded, failed = [], {}
+        for version, old in list(self.loaded.items()):
+            files = self.available.get(version)
+            if files is None:
+                # Ya no está en disco: se descarga si nadie la usa
+                if not self._sessions.get(version):
+                    self._retire(self.loaded.pop(version))
+                continue
+            if files.stamp == old.files.stamp:
+                continue
+            try:
+                new = await self._load(files)
+            except Exception as e:
+                failed[version] = str(e)
+                continue
+            self.loaded[version] = new
+            self._retire(old)
+            reloaded.append(version)
+        self._evict()
+        return {**changes, "reloaded": reloaded, "failed": failed, "default": self.default_version}
+
+    async def close(self) -> None:
+        for model in list(self.loaded.values()):
+            await model.scheduler.stop()
+            model.executor.shutdown(wait=False, cancel_futures=True)
+        self.loaded.clear()
+
+    def memory_used(self) -> int:
+        return sum(model.nbytes for model in self.loaded.values())
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "default": self.default_version,
+            "memory_budget_bytes": self.memory_budget,
+            "memory_used_bytes": self.memory_used(),
+            "versions": [
+                {
+                    **files.describe(),
+                    "loaded": version in self.loaded,
+                    "sessions": self._sessions.get(version, 0),
+                    **({
+                        "nbytes": self.loaded[version].nbytes,
+                        "loaded_at": self.loaded[version].loaded_at,
+                        "warmup": self.loaded[version].warmup,
+                    } if version in self.loaded else {}),
+                }
+                for version, files in sorted(self.available.items(), key=lambda kv: _version_key(kv[0]))
+            ],
+        }
+
+    async def _load(self, files: ModelFiles) -> LoadedModel:
+        """Crea el pool de la versión y la calienta antes de devolverla."""
+        normalization = self._read_normalization(files)
+        executor = create_executor(self.executor_kind, self.workers, self.backend,
+                                   files.model_path, files.stamp)
+        try:
+            warmup = await asyncio.get_running_loop().run_in_executor(
+                None, warm_up, executor, self.workers, self.warmup_batch_sizes,
+                self.window, 1, files.model_path, files.stamp
+            )
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        scheduler = InferenceScheduler(
+            functools.partial(predict_in_worker, model_path=files.model_path, stamp=files.stamp),
+            self.max_batch_size, self.max_wait_ms,
+            executor=executor, max_in_flight=self.workers
+        )
+        await scheduler.start()
+        # Con procesos, cada trabajador tiene su copia de los pesos
+        copies = self.workers if self.executor_kind == "process" else 1
+        return LoadedModel(files, executor, scheduler, warmup, warmup["nbytes"] * copies, normalization)
+
+    def _evict(self) -> None:
+        """Descarga las versiones usadas hace más tiempo hasta entrar en el presupuesto."""
+        while self.memory_used() > self.memory_budget:
+            idle = [
+                model for version, model in self.loaded.items()
+                if version != self.default_version and not self._sessions.get(version)
+            ]
+            if not idle:
+                return
+            victim = min(idle, key=lambda model: model.last_used)
+            self._retire(self.loaded.pop(victim.version))
+
+    def _retire(self, model: LoadedModel) -> None:
+        task = asyncio.create_task(self._shutdown(model))
+        self._retiring.add(task)
+        task.add_done_callback(self._retiring.discard)
+
+    async def _shutdown(self, model: LoadedModel) -> None:
+        # Las sesiones que ya enviaron ventanas reciben su resultado
+        await model.scheduler.drain(DRAIN_TIMEOUT)
+        await model.scheduler.stop()
+        model.executor.shutdown(wait=False, cancel_futures=True)
+        if self.executor_kind == "thread":
+            unload_in_worker(model.files.model_path, model.files.stamp)
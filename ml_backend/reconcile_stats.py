@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Script para recalcular desde cero los totales que muestra /stats.
+Los triggers de measurement_stats los mantienen al día; éste compara esos
+totales con un recorrido completo de la tabla y reporta (y corrige) las
+diferencias.
+"""
+
+import argparse
+
+from database import reconcile_database_stats
+
+def reconcile_stats(fix: bool = True) -> None:
+    report = reconcile_database_stats(fix)
+    stale = report['stale_size_runs']
+    if stale:
+        action = "corregido" if fix else "sin corregir"
+        print(f"[WARN] size_bytes desactualizado en {len(stale)} mediciones ({action})")
+        for run_id in stale[:10]:
+            print(f"       - {run_id}")
+    refs = report['stale_blob_refs']
+    if refs:
+        action = "corregido" if fix else "sin corregir"
+        print(f"[WARN] Contador de referencias desactualizado en {len(refs)} BLOBs ({action})")
+    drift = report['drift']
+    if not drift:
+        print("[OK] Los totales guardados coinciden con la tabla")
+    else:
+        for key, delta in drift.items():
+            print(f"[WARN] {key}: guardado {report['stored'][key]}, real {report['actual'][key]} ({delta:+d})")
+        print("[OK] Totales reconstruidos" if fix else "[INFO] Ejecutar sin --check para corregir")
+    actual = report['actual']
+    print(f"[INFO] {actual['total_runs']} mediciones, {actual['total_rows']} filas, "
+          f"{actual['total_size_bytes'] / 1024 / 1024:.1f} MB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstruye los totales de /stats y reporta diferencias")
+    parser.add_argument("--check", action="store_true", help="Sólo reportar, sin corregir")
+    args = parser.parse_args()
+    reconcile_stats(not args.check)
@@ -0,0 +1,125 @@
+"""
+Grabación de las muestras que llegan por /ws directamente en una medición.
+Las muestras se acumulan en memoria y se escriben por bloques con
+`append_run_block`, en el hilo de escritura de db_async.
+
+Si la sesión se corta y el cliente no llama a /finalize en
+FRISAT_RECORDING_GRACE_S segundos, la medición se sella sola con lo grabado
+(ver `seal_when_abandoned`).
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+
+import db_async as db
+
+# Se escribe un bloque cada FLUSH_ROWS muestras o cada FLUSH_SECONDS segundos
+FLUSH_ROWS = 2000
+FLUSH_SECONDS = 1.0
+# Espera tras cortarse la sesión antes de sellar la medición (s); mientras
+# tanto el cliente puede finalizarla con /finalize o seguir grabando en ella
+GRACE_SECONDS = float(os.environ.get("FRISAT_RECORDING_GRACE_S", 60))
+
+# Sellados programados (se guardan para que no los recolecte el GC)
+_sealing: Set[asyncio.Task] = set()
+
+
+class RunRecorder:
+    """
+    Copia ("tee") de las muestras crudas de una sesión hacia un run.
+
+    Args:
+        run_id: Medición en estado 'writing' creada con /runs/start
+        sensors: Nombres de las columnas de sensores (p. ej. ['sensor1'])
+        sampling_hz: Frecuencia para la columna `time`
+        meta: Metadatos del preámbulo del CSV
+    """
+
+    def __init__(self, run_id: str, sensors: List[str], sampling_hz: float,
+                 meta: Optional[Dict[str, Any]] = None,
+                 flush_rows: int = FLUSH_ROWS, flush_seconds: float = FLUSH_SECONDS):
+        self.run_id = run_id
+        self.header = ["time"] + list(sensors)
+        self.sampling_hz = float(sampling_hz) if sampling_hz else 1.0
+        self.meta = meta or {}
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.samples = 0
+        self.error: Optional[str] = None
+        self._pending: List[np.ndarray] = []
+        self._pending_rows = 0
+        self._last_flush = time.monotonic()
+        # Los bloques se escriben de uno en uno y en orden
+        self._lock = asyncio.Lock()
+        self._tasks: List[asyncio.Task] = []
+
+    def add(self, block: np.ndarray) -> None:
+        """Agrega un bloque crudo `[n, n_sensores]`; escribe si toca."""
+        if self.error:
+            return
+        n = block.shape[0]
+        times = (self.samples + np.arange(n)) / self.sampling_hz
+        self._pending.append(np.column_stack([times, block]))
+        self._pending_rows += n
+        self.samples += n
+        if (self._pending_rows >= self.flush_rows
+                or time.monotonic() - self._last_flush >= self.flush_seconds):
+            self.flush()
+
+    def flush(self) -> None:
+        """Programa la escritura de lo pendiente sin esperar a que termine."""
+        if not self._pending:
+            return
+        block = np.concatenate(self._pending, axis=0)
+        self._pending = []
+        self._pending_rows = 0
+        self._last_flush = time.monotonic()
+        self._tasks = [t for t in self._tasks if not t.done()]
+        self._tasks.append(asyncio.create_task(self._write(block)))
+
+    async def _write(self, block: np.ndarray) -> None:
+        async with self._lock:
+            if self.error:
+                return
+            try:
+                total = await db.append_run_block(self.run_id, block, self.header, self.meta)
+            except Exception as e:
+                self.error = f"Error grabando la medición: {str(e)}"
+                return
+            if total is None:
+                self.error = "La medición no admite más datos (no existe o ya fue finalizada)"
+
+    async def close(self) -> None:
+        """Escribe lo pendiente y espera a que terminen todas las escrituras."""
+        self.flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+def seal_when_abandoned(recorder: RunRecorder, grace: Optional[float] = None) -> None:
+    """
+    Termina de escribir lo pendiente de `recorder` y programa el sellado de
+    su medición para dentro de `grace` segundos (por defecto GRACE_SECONDS).
+    Si para entonces la medición ya se finalizó, o recibió bloques de otra
+    sesión en ese lapso, no se hace nada. Corre en su propia tarea: sigue
+    aunque se cancele la sesión que la programó.
+    """
+    grace = GRACE_SECONDS if grace is None else grace
+    recorder.flush()
+    task = asyncio.create_task(_seal_later(recorder, grace))
+    _sealing.add(task)
+    task.add_done_callback(_sealing.discard)
+
+
+async def _seal_later(recorder: RunRecorder, grace: float) -> None:
+    await recorder.close()
+    await asyncio.sleep(grace)
+    try:
+        await db.seal_idle_runs(grace, [recorder.run_id])
+    except Exception as e:
+        print(f"Error sellando la medición abandonada {recorder.run_id}: {e}")
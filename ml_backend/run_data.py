@@ -0,0 +1,183 @@
+"""
+Consulta de rangos de una medición guardada para graficar.
+Las mediciones decodificadas se guardan en un caché LRU limitado por
+memoria; como una medición 'ready' no cambia, el caché sólo se invalida
+al borrarla.
+"""
+
+import gzip
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from classification import parse_measurement_text, sensor_columns
+from columnar import read_columns, read_index
+from database import get_run_columns, get_run_file, get_run_metadata
+from downsample import METHODS, downsample_indices
+
+# Memoria máxima del caché de mediciones decodificadas (MB)
+DATA_CACHE_MB = float(os.environ.get("FRISAT_DATA_CACHE_MB", 64))
+DEFAULT_MAX_POINTS = 2000
+
+
+class RunData:
+    """Medición decodificada: eje de tiempo (s) y una columna float32 por sensor."""
+
+    def __init__(self, time: np.ndarray, sensors: Dict[str, np.ndarray]):
+        self.time = np.ascontiguousarray(time, dtype=np.float64)
+        self.sensors = {name: np.ascontiguousarray(v, dtype=np.float32) for name, v in sensors.items()}
+
+    @property
+    def nbytes(self) -> int:
+        return self.time.nbytes + sum(v.nbytes for v in self.sensors.values())
+
+
+class RunDataCache:
+    """LRU de `RunData` por run_id con tope de memoria en bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = int(max_bytes)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[str, RunData]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, run_id: str) -> Optional[RunData]:
+        with self._lock:
+            data = self._items.get(run_id)
+            if data is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(run_id)
+            self.hits += 1
+            return data
+
+    def put(self, run_id: str, data: RunData) -> None:
+        if data.nbytes > self.max_bytes:
+            return  # No cabe: se usa una vez y se descarta
+        with self._lock:
+            old = self._items.pop(run_id, None)
+            if old is not None:
+                self.size -= old.nbytes
+            self._items[run_id] = data
+            self.size += data.nbytes
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= evicted.nbytes
+
+    def invalidate(self, run_id: str) -> None:
+        with self._lock:
+            old = self._items.pop(run_id, None)
+            if old is not None:
+                self.size -= old.nbytes
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "runs": len(self._items),
+                "size_bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+cache = RunDataCache(int(DATA_CACHE_MB * 1024 * 1024))
+
+
+def _time_axis(header: List[str], columns: Dict[str, np.ndarray], rows: int,
+               run_id: str) -> np.ndarray:
+    if "time" in header:
+        return columns["time"]
+    # Sin columna de tiempo: índice de muestra / frecuencia de la medición
+    metadata = get_run_metadata(run_id) or {}
+    return np.arange(rows) / float(metadata.get("sampling_hz") or 1)
+
+
+def _compact(values: np.ndarray) -> List[float]:
+    # float32 -> 7 cifras significativas, sin los decimales espurios del float64
+    return [float(f"{v:.7g}") for v in values.tolist()]
+
+
+def decode_run(run_id: str) -> Optional[RunData]:
+    """Decodifica una medición; prefiere el formato columnar si existe."""
+    blob = get_run_columns(run_id)
+    if blob:
+        index = read_index(blob)
+        header = [c["name"] for c in index["columns"]]
+        wanted = [header[i] for i in sensor_columns(header)] + (["time"] if "time" in header else [])
+        columns = read_columns(blob, wanted, index=index)
+        rows = index["rows"]
+    else:
+        file_data = get_run_file(run_id)
+        if not file_data:
+            return None
+        header, table, _ = parse_measurement_text(gzip.decompress(file_data).decode("utf-8"))
+        columns = {name: table[:, i] for i, name in enumerate(header)}
+        rows = table.shape[0]
+    time = _time_axis(header, columns, rows, run_id)
+    return RunData(time, {header[i]: columns[header[i]] for i in sensor_columns(header)})
+
+
+def load_run(run_id: str) -> Optional[RunData]:
+    """`decode_run` a través del caché."""
+    data = cache.get(run_id)
+    if data is None:
+        data = decode_run(run_id)
+        if data is not None:
+            cache.put(run_id, data)
+    return data
+
+
+def query_run_data(run_id: str, start: Optional[float] = None, end: Optional[float] = None,
+                   sensors: Optional[List[str]] = None, max_points: int = DEFAULT_MAX_POINTS,
+                   method: str = "lttb") -> Optional[Dict[str, Any]]:
+    """
+    Tramo `[start, end]` (en segundos) de una medición, reducido para graficar.
+
+    Args:
+        run_id: ID de la medición
+        start: Tiempo inicial (desde el comienzo si es None)
+        end: Tiempo final, inclusive (hasta el final si es None)
+        sensors: Sensores a devolver (todos si es None)
+        max_points: Máximo de puntos a devolver (compartidos por todos los sensores)
+        method: "lttb" o "minmax" (ver downsample.py)
+
+    Returns:
+        Diccionario con `time` y una lista de valores por sensor, o None si
+        la medición no existe
+    """
+    data = load_run(run_id)
+    if data is None:
+        return None
+    names = list(sensors) if sensors else list(data.sensors)
+    unknown = [name for name in names if name not in data.sensors]
+    if unknown:
+        raise ValueError(f"Sensores inexistentes: {', '.join(unknown)}")
+    if max_points < 2:
+        raise ValueError("max_points debe ser al menos 2")
+    if method not in METHODS:
+        raise ValueError(f"Método desconocido: {method} (opciones: {', '.join(METHODS)})")
+
+    lo = 0 if start is None else int(np.searchsorted(data.time, start, side="left"))
+    hi = len(data.time) if end is None else int(np.searchsorted(data.time, end, side="right"))
+    hi = max(lo, hi)
+    time = data.time[lo:hi]
+    series = [data.sensors[name][lo:hi] for name in names]
+    keep = downsample_indices(time, series, max_points, method)
+
+    return {
+        "run_id": run_id,
+        "start": float(time[0]) if len(time) else start,
+        "end": float(time[-1]) if len(time) else end,
+        "total_samples": len(data.time),
+        "slice_samples": hi - lo,
+        "points": len(keep),
+        "method": method if len(keep) < hi - lo else "raw",
+        "time": time[keep].tolist(),
+        "sensors": {name: _compact(values[keep]) for name, values in zip(names, series)},
+    }
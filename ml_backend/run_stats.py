@@ -0,0 +1,108 @@
+"""
+Estadísticas por sensor y sparkline de una medición, en una sola pasada.
+Se alimenta por bloques mientras se escribe la medición, así al finalizar
+no hace falta volver a leer el archivo.
+"""
+
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+# Puntos del sparkline guardado con cada medición
+SPARKLINE_POINTS = 64
+
+
+class StreamingStats:
+    """
+    Media, desviación estándar muestral, mínimo y máximo por columna, más un
+    sparkline de largo fijo.
+
+    Los bloques se combinan con la fórmula de Chan (media y M2 por bloque),
+    que es estable aunque la medición sea larga. El sparkline guarda sumas
+    por tramos de `width` muestras; cuando hay más de `2 * points` tramos se
+    juntan de a pares y el ancho se duplica, así la memoria no depende del
+    largo de la medición.
+
+    Args:
+        names: Nombre de cada columna del bloque
+        points: Largo del sparkline
+    """
+
+    def __init__(self, names: Sequence[str], points: int = SPARKLINE_POINTS):
+        k = len(names)
+        self.names = list(names)
+        self.points = int(points)
+        self.count = 0
+        self.mean = np.zeros(k)
+        self.m2 = np.zeros(k)
+        self.min = np.full(k, np.inf)
+        self.max = np.full(k, -np.inf)
+        self.width = 1
+        self._sums: List[np.ndarray] = []   # Tramos completos (suma de `width` muestras)
+        self._tail = np.zeros(k)            # Tramo en curso
+        self._tail_count = 0
+
+    def update(self, block: np.ndarray) -> None:
+        """Agrega un bloque `[n, len(names)]`."""
+        block = np.asarray(block, dtype=np.float64)
+        n = block.shape[0]
+        if n == 0:
+            return
+        mean = block.mean(axis=0)
+        m2 = ((block - mean) ** 2).sum(axis=0)
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (n / total)
+        self.m2 = self.m2 + m2 + delta ** 2 * (self.count * n / total)
+        self.count = total
+        self.min = np.minimum(self.min, block.min(axis=0))
+        self.max = np.maximum(self.max, block.max(axis=0))
+        self._add_sparkline(block)
+
+    def _add_sparkline(self, block: np.ndarray) -> None:
+        pos = 0
+        n = block.shape[0]
+        while pos < n:
+            take = min(n - pos, self.width - self._tail_count)
+            self._tail += block[pos:pos + take].sum(axis=0)
+            self._tail_count += take
+            pos += take
+            if self._tail_count == self.width:
+                self._sums.append(self._tail)
+                self._tail = np.zeros(len(self.names))
+                self._tail_count = 0
+                if len(self._sums) >= 2 * self.points:
+                    self._sums = [a + b for a, b in zip(self._sums[0::2], self._sums[1::2])]
+                    self.width *= 2
+
+    def sparkline(self) -> np.ndarray:
+        """Promedios `[<= points, len(names)]` en tramos de igual duración."""
+        sums = list(self._sums)
+        counts = [self.width] * len(sums)
+        if self._tail_count:
+            sums.append(self._tail)
+            counts.append(self._tail_count)
+        if not sums:
+            return np.empty((0, len(self.names)))
+        sums_arr = np.array(sums)
+        counts_arr = np.array(counts, dtype=np.float64)
+        groups = np.array_split(np.arange(len(sums)), min(self.points, len(sums)))
+        return np.array([sums_arr[g].sum(axis=0) / counts_arr[g].sum() for g in groups])
+
+    def result(self) -> Dict[str, Dict[str, Any]]:
+        """Resumen por columna, listo para guardar como JSON."""
+        if self.count == 0:
+            return {}
+        std = np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.zeros(len(self.names))
+        line = self.sparkline()
+        return {
+            name: {
+                "count": self.count,
+                "mean": round(float(self.mean[j]), 4),
+                "std": round(float(std[j]), 4),
+                "min": float(self.min[j]),
+                "max": float(self.max[j]),
+                "sparkline": [round(float(v), 3) for v in line[:, j]],
+            }
+            for j, name in enumerate(self.names)
+        }
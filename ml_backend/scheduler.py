@@ -0,0 +1,164 @@
+"""
+Planificador de inferencia por micro-lotes para FRISAT.
+Agrupa las ventanas listas de todas las sesiones WebSocket abiertas y
+ejecuta una sola pasada del modelo para todo el lote.
+"""
+
+import asyncio
+import time
+from concurrent.futures import Executor
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+PredictFn = Callable[[np.ndarray], np.ndarray]
+
+
+class InferenceScheduler:
+    """
+    Cola compartida de inferencia con lotes limitados por tamaño y espera.
+
+    Cada sesión llama a `submit` con un arreglo `(n, WINDOW, canales)` y
+    recibe las `n` filas de probabilidades correspondientes. El planificador
+    junta las peticiones que llegan dentro de `max_wait_ms` (o hasta reunir
+    `max_batch_size` ventanas) y llama a `predict_fn` una vez por lote.
+
+    Si se indica `executor`, `predict_fn` se ejecuta en ese pool y el bucle
+    de eventos queda libre; hasta `max_in_flight` lotes corren a la vez.
+    """
+
+    def __init__(self, predict_fn: PredictFn, max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0, executor: Optional[Executor] = None,
+                 max_in_flight: int = 1):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.executor = executor
+        self.max_in_flight = max(1, int(max_in_flight))
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._in_flight: Set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        """Arranca la tarea de fondo que vacía la cola."""
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Detiene la tarea de fondo; las peticiones pendientes se cancelan."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._in_flight):
+            task.cancel()
+        if self._queue is not None:
+            while not self._queue.empty():
+                _, future = self._queue.get_nowait()
+                if not future.done():
+                    future.cancel()
+            self._queue = None
+
+    async def drain(self, timeout: float = 30.0) -> bool:
+        """
+        Espera a que se vacíe la cola y terminen los lotes en curso (por
+        ejemplo, antes de retirar un modelo reemplazado).
+
+        Returns:
+            True si quedó vacío antes de `timeout` segundos
+        """
+        deadline = time.monotonic() + timeout
+        while (self._queue is not None and not self._queue.empty()) or self._in_flight:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.01)
+        return True
+
+    async def submit(self, windows: np.ndarray) -> np.ndarray:
+        """
+        Encola ventanas para el siguiente lote y espera su resultado.
+
+        Args:
+            windows: Arreglo `(n, WINDOW, canales)` ya normalizado
+
+        Returns:
+            Arreglo `(n, clases)` con las probabilidades de cada ventana
+        """
+        if self._task is None:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((windows, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[np.ndarray, asyncio.Future]]:
+        """Reúne peticiones hasta llenar el lote o agotar la espera máxima."""
+        first = await self._queue.get()
+        pending = [first]
+        count = first[0].shape[0]
+        deadline = time.monotonic() + self.max_wait
+        while count < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            pending.append(item)
+            count += item[0].shape[0]
+        return pending
+
+    async def _run(self) -> None:
+        while True:
+            pending = await self._collect()
+
+            # Agrupar por forma de ventana: sólo se apilan entradas compatibles
+            groups: Dict[Tuple[int, ...], List[Tuple[np.ndarray, asyncio.Future]]] = {}
+            for windows, future in pending:
+                if future.cancelled():
+                    continue
+                groups.setdefault(windows.shape[1:], []).append((windows, future))
+
+            for items in groups.values():
+                # Esperar un hueco libre antes de lanzar el siguiente lote
+                await self._slots.acquire()
+                task = asyncio.create_task(self._dispatch(items))
+                self._in_flight.add(task)
+                task.add_done_callback(self._release)
+
+    def _release(self, task: asyncio.Task) -> None:
+        self._in_flight.discard(task)
+        self._slots.release()
+
+    async def _dispatch(self, items: List[Tuple[np.ndarray, asyncio.Future]]) -> None:
+        """Ejecuta una pasada del modelo y reparte las filas a cada petición."""
+        batch = np.concatenate([windows for windows, _ in items], axis=0)
+        try:
+            if self.executor is not None:
+                loop = asyncio.get_running_loop()
+                probs = await loop.run_in_executor(self.executor, self.predict_fn, batch)
+            else:
+                probs = self.predict_fn(batch)
+            probs = np.asarray(probs)
+        except asyncio.CancelledError:
+            for _, future in items:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        offset = 0
+        for windows, future in items:
+            n = windows.shape[0]
+            if not future.done():
+                future.set_result(probs[offset:offset + n])
+            offset += n
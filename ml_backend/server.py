@@ -1,16 +1,50 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Response
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import os
+import asyncio
+import gzip
 import numpy as np
-from keras.models import load_model
 import json
-from typing import Dict, Any, List
-from database import create_run, finalize_run, list_runs, get_run_file, get_run_metadata, delete_run, get_database_stats
+import time
+from datetime import date
+from typing import Dict, Any, List, Optional, Tuple
+import db_async as db
+from database import encode_cursor
+from window_buffer import SlidingWindowBuffer
+from classification import LABELS, classify_measurement, classify_table, normalize
+from columnar import read_table
+from run_data import DEFAULT_MAX_POINTS, cache as run_data_cache, query_run_data
+from recorder import RunRecorder, seal_when_abandoned
+from export import ARCHIVE_FORMATS, DEFAULT_HOP, iter_archive, iter_npz, plan_dataset
+from maintenance import MAINTENANCE_ENABLED, Activity, MaintenanceScheduler
+from model_registry import LoadedModel, ModelRegistry
+from streaming import StreamingForward
 
 WINDOW = 350
 MAX_SENSORS = 5
 
+# Micro-lotes compartidos entre sesiones: tamaño máximo y espera máxima (ms)
+MAX_BATCH_SIZE = int(os.environ.get("FRISAT_MAX_BATCH_SIZE", 32))
+MAX_BATCH_WAIT_MS = float(os.environ.get("FRISAT_MAX_BATCH_WAIT_MS", 5))
+
+# Pool donde corre el modelo: "thread" o "process", y número de trabajadores
+INFERENCE_EXECUTOR = os.environ.get("FRISAT_INFERENCE_EXECUTOR", "thread")
+INFERENCE_WORKERS = int(os.environ.get("FRISAT_INFERENCE_WORKERS", 1))
+# Motor de inferencia: "keras", "tflite" o "numpy" (ver export_model.py); en la Pi
+# también "tflite-float16" o "tflite-int8", si bench_quantization.py lo justifica
+INFERENCE_BACKEND = os.environ.get("FRISAT_INFERENCE_BACKEND", "keras")
+# Ventanas por llamada al modelo en /classify (si no se indica otra cosa)
+CLASSIFY_BATCH_SIZE = 256
+# Calentamiento del modelo al arrancar (0 = se carga con la primera predicción)
+WARMUP_ENABLED = os.environ.get("FRISAT_WARMUP", "1") != "0"
+# Tamaños de lote del calentamiento: los de las sesiones en vivo y el de /classify
+WARMUP_BATCH_SIZES = [
+    int(n) for n in os.environ.get(
+        "FRISAT_WARMUP_BATCHES", f"1,{MAX_BATCH_SIZE},{CLASSIFY_BATCH_SIZE}"
+    ).split(",") if n.strip()
+]
+
 app = FastAPI()
 
 # Configurar CORS
@@ -22,107 +56,373 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-model_path = os.path.join(os.path.dirname(__file__), "Modelo_1500.h5")
-model = load_model(model_path, compile=False)
 
-mm_path = os.path.join(os.path.dirname(__file__), "MaxiMini.npz")
-mm = np.load(mm_path)
-MINI, MAXI = float(mm["mini"]), float(mm["maxi"])
+# Versiones del modelo (Modelo_*.h5 + MaxiMini*.npz). Cada una tiene su pool
+# de inferencia y su planificador; se cargan dentro del pool, no en el bucle
+# de eventos, y se eligen por sesión con `model_version` en el CONFIG.
+registry = ModelRegistry(INFERENCE_BACKEND, INFERENCE_EXECUTOR, INFERENCE_WORKERS,
+                         MAX_BATCH_SIZE, MAX_BATCH_WAIT_MS, WARMUP_BATCH_SIZES, WINDOW)
+# Estado del modelo para /ready: 'starting', 'warming', 'ready', 'lazy' o 'failed'
+model_status: Dict[str, Any] = {"status": "starting", "backend": INFERENCE_BACKEND}
+warmup_task: Optional[asyncio.Task] = None
+# Tráfico en vivo (/ws y /append): el mantenimiento espera a que se calme
+live_activity = Activity()
+maintenance = MaintenanceScheduler(live_activity)
+
+async def warm_up_model(started: float):
+    """Carga la versión por defecto y la pasa por los tamaños de lote del servidor."""
+    model_status.update(status="warming", model_version=registry.default_version)
+    try:
+        result = (await registry.get()).warmup
+    except Exception as e:
+        model_status.update(status="failed", error=str(e))
+        print(f"Error al calentar el modelo: {e}")
+        return
+    model_status.update(status="ready", warmup=result,
+                        ready_after_s=round(time.perf_counter() - started, 3))
+    print(f"Modelo {registry.default_version} ({INFERENCE_BACKEND}) listo: primera predicción en "
+          f"{result['time_to_first_prediction_s']:.2f} s, calentamiento completo en "
+          f"{result['duration_s']:.2f} s (lotes {result['batch_sizes']}, "
+          f"{result['workers']} trabajador(es))")
 
-LABELS = ["LAMINAR", "TRANSITION", "TURBULENT"]
+@app.on_event("startup")
+async def start_scheduler():
+    global warmup_task
+    started = time.perf_counter()
+    registry.scan()
+    if WARMUP_ENABLED:
+        # En segundo plano: el historial y las descargas se atienden mientras tanto
+        warmup_task = asyncio.create_task(warm_up_model(started))
+    else:
+        model_status["status"] = "lazy"
+    if MAINTENANCE_ENABLED:
+        await maintenance.start()
 
-def clip_norm(x):
-    x = np.clip(x, MINI, MAXI)
-    return (x - MINI) / (MAXI - MINI)
+@app.on_event("shutdown")
+async def stop_scheduler():
+    if warmup_task is not None:
+        warmup_task.cancel()
+    await maintenance.stop()
+    await registry.close()
+    await db.close()
+
+async def prediction_message(windows: np.ndarray, model_version: str) -> Dict[str, Any]:
+    """
+    Clasifica las ventanas crudas `(n_sensors, WINDOW, 1)` de una sesión en un
+    solo envío al planificador de su versión del modelo y arma el mensaje
+    PREDICTION: una etiqueta por sensor más el régimen global, que promedia
+    las probabilidades. Se normalizan con el MINI/MAXI de los pesos que las
+    clasifican, así una recarga del modelo renueva ambos a la vez.
+    """
+    model = await registry.get(model_version)
+    probs = await model.predict(normalize(windows, *model.normalization))
+    return format_prediction(probs, model.version)
+
+async def streaming_message(stream: StreamingForward, windows: np.ndarray, start: int,
+                            model_version: str) -> Dict[str, Any]:
+    """
+    Como `prediction_message`, pero con la pasada incremental de la sesión
+    (ventanas ya normalizadas): sólo se calculan las muestras nuevas de la
+    ventana que empieza en `start`. Corre en un hilo para no frenar el bucle
+    de eventos.
+    """
+    probs = await asyncio.get_running_loop().run_in_executor(None, stream.predict, windows, start)
+    return format_prediction(probs, model_version)
+
+def format_prediction(probs: np.ndarray, model_version: str) -> Dict[str, Any]:
+    """Mensaje PREDICTION a partir de las probabilidades `(n_sensors, clases)`."""
+    fused = probs.mean(axis=0)
+    k = int(np.argmax(fused))
+    return {
+        "type": "PREDICTION",
+        "label": LABELS[k],
+        "probs": fused.tolist(),
+        "window": WINDOW,
+        "model_version": model_version,
+        "sensors": [
+            {
+                "sensor": f"sensor{i+1}",
+                "label": LABELS[int(np.argmax(p))],
+                "probs": p.tolist()
+            }
+            for i, p in enumerate(probs)
+        ]
+    }
+
+async def send_in_order(ws: WebSocket, outbox: asyncio.Queue):
+    """
+    Envía las respuestas de una sesión en el orden en que se generaron.
+    Las predicciones se encolan como tareas y se esperan aquí, así la
+    recepción de muestras no se detiene mientras el modelo trabaja.
+    """
+    while True:
+        item = await outbox.get()
+        if item is None:
+            return
+        try:
+            message = await item if isinstance(item, asyncio.Future) else item
+        except Exception as e:
+            message = {"type": "ERROR", "msg": f"Error en la predicción: {str(e)}"}
+        await ws.send_json(message)
 
 @app.websocket("/ws")
 async def ws_predict(ws: WebSocket):
     await ws.accept()
     n_sensors = 1
     hop = 30
-    buffers = [np.zeros(WINDOW, dtype=np.float32) for _ in range(MAX_SENSORS)]
-    idxs = [0] * MAX_SENSORS
-    filled = [0] * MAX_SENSORS
+    binary = False
+    ring = SlidingWindowBuffer(WINDOW, n_sensors)
     hop_count = 0
     sensors_active = list(range(n_sensors))
+    recorder: Optional[RunRecorder] = None
+    outbox: asyncio.Queue = asyncio.Queue()
+    sender = asyncio.create_task(send_in_order(ws, outbox))
+    # Versión del modelo de la sesión; no se descarga mientras esté abierta
+    model_version: Optional[str] = None
+    # Inferencia incremental (CONFIG "streaming"): reutiliza el solapamiento
+    # entre ventanas consecutivas, para poder predecir con saltos cortos
+    streaming = False
+    stream: Optional[StreamingForward] = None
+    # Versión cargada de la que salen los pesos y la normalización de `stream`
+    stream_model: Optional[LoadedModel] = None
+
+    def emit_prediction():
+        # El modelo es de un canal: cada sensor es una ventana (WINDOW, 1) del
+        # mismo lote. Se copia una sola vez porque el anillo sigue recibiendo
+        # muestras mientras el lote espera.
+        windows = np.ascontiguousarray(ring.view().T)[:, :, np.newaxis]
+        model = registry.peek(model_version)
+        if stream is not None and model is not None and model is not stream_model:
+            # Se recargó la versión: pesos nuevos, activaciones guardadas nuevas
+            build_stream(model)
+        if stream is not None:
+            windows = normalize(windows, *stream_model.normalization)
+            start = ring.total - WINDOW
+            outbox.put_nowait(asyncio.ensure_future(streaming_message(stream, windows, start, model_version)))
+            return
+        outbox.put_nowait(asyncio.ensure_future(prediction_message(windows, model_version)))
+
+    def build_stream(model: LoadedModel):
+        """Pasada incremental con los pesos de `model`; sin pesos NumPy se usa la completa."""
+        nonlocal stream, stream_model
+        stream, stream_model = None, None
+        try:
+            stream = StreamingForward(model.streaming_engine(), WINDOW, n_sensors)
+            stream_model = model
+        except (OSError, ValueError) as e:
+            outbox.put_nowait({"type": "ERROR", "msg": f"Inferencia incremental no disponible: {e}"})
+
+    async def open_stream():
+        """Prepara la pasada incremental de la sesión con su versión cargada."""
+        nonlocal stream, stream_model
+        stream, stream_model = None, None
+        if not streaming:
+            return
+        try:
+            model = await registry.get(model_version)
+        except (KeyError, OSError, ValueError) as e:
+            outbox.put_nowait({"type": "ERROR", "msg": f"Inferencia incremental no disponible: {e}"})
+            return
+        build_stream(model)
+
+    def use_model(version: Optional[str]) -> bool:
+        """Cambia la versión del modelo de la sesión; False si no existe."""
+        nonlocal model_version
+        try:
+            files = registry.acquire(version)
+        except KeyError as e:
+            outbox.put_nowait({"type": "ERROR", "msg": str(e.args[0])})
+            return False
+        if model_version is not None:
+            registry.release(model_version)
+        model_version = files.version
+        return True
+
+    async def open_recorder(msg: Dict[str, Any]) -> Optional[RunRecorder]:
+        """Prepara la grabación en `run_id` si el CONFIG la pide."""
+        run_id = msg.get("run_id")
+        if not run_id:
+            return None
+        run = await db.get_run_metadata(run_id)
+        if run is None or run.get("status") != "writing":
+            outbox.put_nowait({"type": "ERROR", "msg": "La medición no existe o no admite más datos"})
+            return None
+        sensors = msg.get("sensors") or run.get("sensors") or []
+        if len(sensors) != n_sensors:
+            sensors = [f"sensor{i + 1}" for i in range(n_sensors)]
+        return RunRecorder(run_id, sensors,
+                           msg.get("sampling_hz") or run.get("sampling_hz"),
+                           msg.get("meta"))
+
+    def record(block: np.ndarray):
+        """Copia las muestras crudas a la medición, si se está grabando."""
+        nonlocal recorder
+        if recorder is None:
+            return
+        if recorder.error:
+            # La escritura anterior falló: se avisa una vez y se deja de grabar
+            outbox.put_nowait({"type": "ERROR", "msg": recorder.error})
+            recorder = None
+            return
+        recorder.add(block)
+
+    def ingest(block: np.ndarray):
+        """
+        Ingresa un bloque crudo `[n, n_sensors]`; se normaliza al predecir,
+        con la versión del modelo que lo clasifica. El bloque se parte
+        en los puntos donde toca predecir, de modo que cada salto genera la
+        misma ventana que si las muestras llegaran una por una.
+        """
+        nonlocal hop_count
+        pos = 0
+        n = block.shape[0]
+        while pos < n:
+            if not ring.is_full:
+                take = min(n - pos, WINDOW - ring.filled)
+                ring.push(block[pos:pos + take])
+                pos += take
+                if not ring.is_full:
+                    break
+                # La muestra que completa la ventana ya cuenta para el salto
+                hop_count += 1
+            else:
+                take = min(n - pos, hop - hop_count)
+                ring.push(block[pos:pos + take])
+                pos += take
+                hop_count += take
+            if hop_count >= hop:
+                hop_count = 0
+                emit_prediction()
+
+        if not ring.is_full:
+            outbox.put_nowait({
+                "type": "FILLING",
+                "have": ring.filled,
+                "need": WINDOW - ring.filled
+            })
 
     try:
+        use_model(None)
         while True:
-            msg = await ws.receive_json()
-            print("Mensaje recibido:", msg)  # <-- Agrega este print
+            frame = await ws.receive()
+            live_activity.touch()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+
+            if frame.get("bytes") is not None:
+                # Bloque binario: float32 little-endian con forma [n_muestras, n_sensores]
+                data = frame["bytes"]
+                if not binary:
+                    outbox.put_nowait({"type": "ERROR", "msg": "Tramas binarias no negociadas en CONFIG"})
+                    continue
+                if len(data) % (4 * n_sensors) != 0:
+                    outbox.put_nowait({"type": "ERROR", "msg": "Tamaño de bloque binario inválido"})
+                    continue
+                block = np.frombuffer(data, dtype="<f4").reshape(-1, n_sensors)
+                record(block)
+                ingest(block)
+                continue
+
+            msg = json.loads(frame["text"])
             t = msg.get("type")
             if t == "CONFIG":
                 n_sensors = int(msg.get("n_sensors", 1))
                 n_sensors = max(1, min(n_sensors, MAX_SENSORS))
-                hop = int(msg.get("hop", hop))
+                hop = max(1, int(msg.get("hop", hop)))
+                binary = bool(msg.get("binary", False))
+                streaming = bool(msg.get("streaming", False))
+                if msg.get("model_version") and str(msg["model_version"]) != model_version:
+                    use_model(str(msg["model_version"]))
                 sensors_active = list(range(n_sensors))
-                buffers = [np.zeros(WINDOW, dtype=np.float32) for _ in range(n_sensors)]
-                idxs = [0] * n_sensors
-                filled = [0] * n_sensors
+                ring = SlidingWindowBuffer(WINDOW, n_sensors)
                 hop_count = 0
-                await ws.send_json({"type": "ACK", "hop": hop, "n_sensors": n_sensors})
+                await open_stream()
+                if recorder is not None:
+                    await recorder.close()
+                    seal_when_abandoned(recorder)
+                recorder = await open_recorder(msg)
+                ack = {"type": "ACK", "hop": hop, "n_sensors": n_sensors, "model_version": model_version}
+                if binary:
+                    ack.update({"binary": True, "dtype": "float32-le"})
+                if stream is not None:
+                    ack["streaming"] = True
+                if recorder is not None:
+                    ack["recording"] = recorder.run_id
+                outbox.put_nowait(ack)
                 continue
 
             if t == "SAMPLES":
                 values = msg.get("values", [])
-                print("Valores recibidos:", values)  # <-- Agrega este print
                 # values: [s1, s2, ...] por muestra
                 if len(values) != n_sensors:
-                    await ws.send_json({"type": "ERROR", "msg": "Número de sensores no coincide"})
+                    outbox.put_nowait({"type": "ERROR", "msg": "Número de sensores no coincide"})
                     continue
-                arr = clip_norm(np.array(values, dtype=np.float32))
-                for i, v in enumerate(arr):
-                    buffers[i][idxs[i]] = v
-                    idxs[i] = (idxs[i] + 1) % WINDOW
-                    if filled[i] < WINDOW:
-                        filled[i] += 1
-
-                if all(f == WINDOW for f in filled):
-                    hop_count += 1
-                    if hop_count >= hop:
-                        hop_count = 0
-                        # Reconstruir ventana por sensor
-                        window_data = []
-                        for i in range(n_sensors):
-                            start = idxs[i]
-                            win = np.concatenate([buffers[i][start:], buffers[i][:start]])
-                            window_data.append(win)
-                        # Transponer para [WINDOW, n_sensors]
-                        win_matrix = np.stack(window_data, axis=-1)
-                        win_matrix = win_matrix.reshape(1, WINDOW, n_sensors)
-                        probs = model.predict(win_matrix, verbose=0)[0]
-                        k = int(np.argmax(probs))
-                        label = LABELS[k]
-                        print("Predicción enviada:", label, probs)
-                        await ws.send_json({
-                            "type": "PREDICTION",
-                            "label": label,
-                            "probs": probs.tolist(),
-                            "window": WINDOW
-                        })
-                else:
-                    await ws.send_json({
-                        "type": "FILLING",
-                        "have": min(filled),
-                        "need": WINDOW - min(filled)
-                    })
+                raw = np.array(values, dtype=np.float32).reshape(1, n_sensors)
+                record(raw)
+                ingest(raw)
 
     except WebSocketDisconnect:
         return
+    finally:
+        # Lo grabado queda en la medición; el cliente la cierra con /finalize
+        # y, si no lo hace (p. ej. se cerró el navegador), se sella sola. La
+        # escritura de lo pendiente sigue en otra tarea aunque se cancele esta.
+        if recorder is not None:
+            seal_when_abandoned(recorder)
+        if model_version is not None:
+            registry.release(model_version)
+        sender.cancel()
+        while not outbox.empty():
+            item = outbox.get_nowait()
+            if isinstance(item, asyncio.Future):
+                item.cancel()
 
 # Endpoints para gestión de mediciones
+async def run_not_writing(run_id: str, detail: str) -> HTTPException:
+    """
+    Error para una medición que no acepta datos: 404 si no existe, 409 con el
+    estado si ya no está en 'writing' (finalizada, o 'failed' si no se pudo
+    retomar) y 400 con `detail` en otro caso.
+    """
+    run = await db.get_run_metadata(run_id)
+    if run is None:
+        return HTTPException(status_code=404, detail="Measurement not found")
+    if run["status"] != "writing":
+        return HTTPException(status_code=409, detail=f"Measurement is '{run['status']}', not 'writing'")
+    return HTTPException(status_code=400, detail=detail)
+
 @app.post("/runs/start")
 async def start_measurement_run(metadata: Dict[str, Any]):
     """Inicia una nueva medición y retorna el ID del run."""
     try:
-        run_id = create_run(metadata)
+        run_id = await db.create_run(metadata)
         return {"run_id": run_id, "status": "created"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating run: {str(e)}")
 
+@app.post("/runs/{run_id}/append")
+async def append_measurement_rows(run_id: str, data: Dict[str, Any]):
+    """Agrega un bloque de filas a una medición en curso (compresión incremental)."""
+    try:
+        rows = data.get("rows", [])
+        header = data.get("header")
+        meta = data.get("meta", {})
+        live_activity.touch()
+        total = await db.append_run_rows(run_id, rows, header, meta)
+        if total is None:
+            raise await run_not_writing(run_id, "Missing header in the first block")
+        return {"status": "success", "rows": total}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error appending rows: {str(e)}")
+
 @app.post("/runs/{run_id}/finalize")
 async def finalize_measurement_run(run_id: str, data: Dict[str, Any]):
-    """Finaliza una medición guardando los datos en la base de datos."""
+    """
+    Finaliza una medición guardando los datos en la base de datos.
+    Si los datos ya llegaron con /append, basta con enviar `meta`.
+    """
     try:
         # Extraer datos del request
         rows_data = data.get("rows", [])
@@ -134,22 +434,95 @@ async def finalize_measurement_run(run_id: str, data: Dict[str, Any]):
             for row in rows_data:
                 yield row
         
-        success = finalize_run(run_id, rows_iterator(), header, meta)
+        success = await db.finalize_run(run_id, rows_iterator(), header, meta)
         
         if success:
             return {"status": "success", "message": "Measurement finalized successfully"}
         else:
-            raise HTTPException(status_code=400, detail="Failed to finalize measurement")
+            raise await run_not_writing(run_id, "Failed to finalize measurement")
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error finalizing run: {str(e)}")
 
+@app.post("/runs/{run_id}/classify")
+async def classify_measurement_run(run_id: str, options: Optional[Dict[str, Any]] = None):
+    """Clasifica una medición guardada por ventanas deslizantes y devuelve la línea de tiempo."""
+    options = options or {}
+    window = int(options.get("window", WINDOW))
+    hop = int(options.get("hop", 30))
+    batch_size = int(options.get("batch_size", CLASSIFY_BATCH_SIZE))
+    if window != WINDOW:
+        raise HTTPException(status_code=400, detail=f"El modelo espera ventanas de {WINDOW} muestras")
+    if hop < 1 or batch_size < 1:
+        raise HTTPException(status_code=400, detail="hop y batch_size deben ser positivos")
+    try:
+        model = await registry.get(options.get("model_version"))
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error loading model: {str(e)}")
+    # La normalización de los mismos pesos que clasifican
+    mini, maxi = model.normalization
+
+    try:
+        columns = await db.get_run_columns(run_id)
+        file_data = None if columns else await db.get_run_file(run_id)
+        if not columns and not file_data:
+            raise HTTPException(status_code=404, detail="Measurement file not found")
+
+        def predict(chunk: np.ndarray) -> np.ndarray:
+            # Cada lote grande corre en el mismo pool que las sesiones en vivo
+            return model.predict_sync(chunk)
+
+        def run() -> Dict[str, Any]:
+            if columns:
+                # Formato columnar: los datos salen directo como arreglos
+                header, data, _ = read_table(columns)
+                return classify_table(header, data, predict, mini, maxi, window, hop, batch_size)
+            text = gzip.decompress(file_data).decode("utf-8")
+            return classify_measurement(text, predict, mini, maxi, window, hop, batch_size)
+
+        result = await asyncio.get_running_loop().run_in_executor(None, run)
+        result["run_id"] = run_id
+        result["model_version"] = model.version
+        return result
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error classifying run: {str(e)}")
+
 @app.get("/historial")
-async def get_measurement_history(limit: int = 50, offset: int = 0):
-    """Obtiene el historial de mediciones desde la base de datos."""
+async def get_measurement_history(limit: int = 50, offset: int = 0, cursor: Optional[str] = None,
+                                  date_from: Optional[str] = None, date_to: Optional[str] = None,
+                                  regimen: Optional[str] = None, sensor_count: Optional[int] = None,
+                                  sensor: Optional[str] = None, file_name: Optional[str] = None,
+                                  min_size: Optional[int] = None, max_size: Optional[int] = None,
+                                  stats: bool = True):
+    """
+    Obtiene el historial de mediciones desde la base de datos.
+    Para recorrerlo, pasar en `cursor` el `next_cursor` de la página anterior.
+    Con `stats=false` se omiten las estadísticas y sparklines por sensor.
+    """
+    filters = {
+        "date_from": date_from, "date_to": date_to, "regimen": regimen,
+        "sensor_count": sensor_count, "sensor": sensor, "file_name": file_name,
+        "min_size": min_size, "max_size": max_size,
+    }
+    filters = {key: value for key, value in filters.items() if value is not None}
+    limit = max(1, min(limit, 500))
     try:
-        runs = list_runs(limit, offset)
-        return {"runs": runs, "total": len(runs)}
+        runs, total = await asyncio.gather(
+            db.list_runs(limit, offset, cursor, stats, **filters),
+            db.count_runs(**filters),
+        )
+        next_cursor = encode_cursor(runs[-1]["created_at"], runs[-1]["id"]) if len(runs) == limit else None
+        return {"runs": runs, "total": total, "next_cursor": next_cursor}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting history: {str(e)}")
 
@@ -157,7 +530,7 @@ async def get_measurement_history(limit: int = 50, offset: int = 0):
 async def get_measurement_details(run_id: str):
     """Obtiene los detalles de una medición específica."""
     try:
-        metadata = get_run_metadata(run_id)
+        metadata = await db.get_run_metadata(run_id)
         if not metadata:
             raise HTTPException(status_code=404, detail="Measurement not found")
         return metadata
@@ -166,47 +539,189 @@ async def get_measurement_details(run_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting measurement details: {str(e)}")
 
+@app.get("/runs/{run_id}/data")
+async def get_measurement_data(run_id: str, start: Optional[float] = None, end: Optional[float] = None,
+                               sensors: Optional[str] = None, max_points: int = DEFAULT_MAX_POINTS,
+                               method: str = "lttb"):
+    """Devuelve un tramo de la medición, reducido en el servidor para graficar."""
+    names = [name.strip() for name in sensors.split(",") if name.strip()] if sensors else None
+    try:
+        result = await db.run_read(query_run_data, run_id, start, end, names, max_points, method)
+        if result is None:
+            raise HTTPException(status_code=404, detail="Measurement file not found")
+        return result
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading measurement data: {str(e)}")
+
+def download_filename(run_id: str, created_at: str, user_file_name: Any) -> str:
+    """Nombre del archivo de descarga de una medición."""
+    created_at = created_at[:10]  # YYYY-MM-DD
+    base_name = None
+    if isinstance(user_file_name, str) and user_file_name.strip():
+        # Sanitizar nombre básico (solo por seguridad básica)
+        safe_name = "".join(ch for ch in user_file_name if ch.isalnum() or ch in ("-", "_"))
+        base_name = safe_name or f"medicion_{run_id[:8]}_{created_at}"
+    else:
+        base_name = f"medicion_{run_id[:8]}_{created_at}"
+    return f"{base_name}.csv.gz"
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Compara If-None-Match contra el ETag (comparación débil: ignora el prefijo W/)."""
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in tags)
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpreta un encabezado `Range: bytes=...` de un solo rango.
+
+    Returns:
+        (inicio, fin) inclusive, o None si no hay rango utilizable
+        (varios rangos o sintaxis desconocida: se envía el archivo completo)
+
+    Raises:
+        ValueError: Si el rango no se puede satisfacer
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, sep, last = header[len("bytes="):].strip().partition("-")
+    valid = sep and (first.isdigit() or first == "") and (last.isdigit() or last == "")
+    if not valid or first == last == "":
+        return None
+    if first == "":
+        # bytes=-N: los últimos N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Rango vacío")
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size:
+        raise ValueError("Rango fuera del archivo")
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
 @app.get("/runs/{run_id}/download")
-async def download_measurement_file(run_id: str):
-    """Descarga el archivo comprimido de una medición."""
+async def download_measurement_file(run_id: str, request: Request):
+    """Descarga el archivo comprimido de una medición (admite Range y ETag)."""
     try:
-        file_data = get_run_file(run_id)
-        if not file_data:
+        run_file = await db.open_run_file(run_id)
+        if run_file is None:
             raise HTTPException(status_code=404, detail="Measurement file not found")
-        
-        # Obtener metadatos para el nombre del archivo
-        metadata = get_run_metadata(run_id)
-        if not metadata:
-            raise HTTPException(status_code=404, detail="Measurement not found")
-        
-        # Generar nombre de archivo
-        created_at = metadata["created_at"][:10]  # YYYY-MM-DD
-        user_file_name = metadata.get("file_name")
-        base_name = None
-        if isinstance(user_file_name, str) and user_file_name.strip():
-            # Sanitizar nombre básico (solo por seguridad básica)
-            safe_name = "".join(ch for ch in user_file_name if ch.isalnum() or ch in ("-", "_"))
-            base_name = safe_name or f"medicion_{run_id[:8]}_{created_at}"
-        else:
-            base_name = f"medicion_{run_id[:8]}_{created_at}"
-        
-        filename = f"{base_name}.csv.gz"
-        
-        return StreamingResponse(
-            iter([file_data]),
-            media_type="application/gzip",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error downloading file: {str(e)}")
 
+    # Guardado: el SHA-256 del .csv.gz (`gz_sha256`) identifica exactamente
+    # sus bytes. Generado a pedido: ETag débil, el del contenido columnar.
+    etag = run_file.etag
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "no-cache",
+        "Content-Disposition": f"attachment; filename={download_filename(run_id, run_file.created_at, run_file.file_name)}",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        run_file.close()
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+    if run_file.size is None:
+        # Se comprime mientras se envía: sin largo de antemano ni rangos
+        headers["Accept-Ranges"] = "none"
+        return StreamingResponse(run_file.iter_bytes(), media_type="application/gzip", headers=headers)
+
+    size = run_file.size
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range.strip() == etag:
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except ValueError:
+            run_file.close()
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(run_file.iter_bytes(), media_type="application/gzip", headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(run_file.iter_bytes(start, end), status_code=206,
+                             media_type="application/gzip", headers=headers)
+
+def export_filters(date_from: Optional[str], date_to: Optional[str], regimen: Optional[str],
+                   sensor: Optional[str]) -> Dict[str, Any]:
+    filters = {"date_from": date_from, "date_to": date_to, "regimen": regimen, "sensor": sensor}
+    return {key: value for key, value in filters.items() if value is not None}
+
+@app.get("/export")
+async def export_measurements(format: str = "zip", date_from: Optional[str] = None,
+                              date_to: Optional[str] = None, regimen: Optional[str] = None,
+                              sensor: Optional[str] = None):
+    """
+    Descarga en un solo .zip o .tar los .csv.gz de las mediciones que cumplen
+    los filtros (`sensor` admite varios separados por comas). El archivo se
+    genera por trozos mientras se envía.
+    """
+    if format not in ARCHIVE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato desconocido: {format}")
+    filters = export_filters(date_from, date_to, regimen, sensor)
+    try:
+        total = await db.count_runs(**filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {
+        "Content-Disposition": f"attachment; filename=mediciones_{date.today().isoformat()}.{format}",
+        "X-Run-Count": str(total),
+    }
+    media_type = "application/zip" if format == "zip" else "application/x-tar"
+    return StreamingResponse(iter_archive(format, **filters), media_type=media_type, headers=headers)
+
+@app.get("/export/dataset")
+async def export_dataset(hop: int = DEFAULT_HOP, sensors: Optional[str] = None,
+                         date_from: Optional[str] = None, date_to: Optional[str] = None,
+                         regimen: Optional[str] = None, sensor: Optional[str] = None,
+                         model_version: Optional[str] = None):
+    """
+    Descarga un .npz para entrenar: `X` (ventanas normalizadas `(n, 350, 1)`
+    float32), `y` (índice en LABELS del régimen dominante de la medición),
+    `run_index` y `run_ids`. `sensors` elige qué sensores se ventanean y
+    `model_version`, con qué normalización (por defecto, la del modelo actual).
+    """
+    filters = export_filters(date_from, date_to, regimen, sensor)
+    names = [name.strip() for name in sensors.split(",") if name.strip()] if sensors else None
+    try:
+        mini, maxi = registry.normalization(model_version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    try:
+        plan = await db.run_read(plan_dataset, names, hop, WINDOW, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error preparing dataset: {str(e)}")
+    headers = {
+        "Content-Disposition": f"attachment; filename=dataset_{date.today().isoformat()}.npz",
+        "X-Run-Count": str(len(plan["runs"])),
+        "X-Window-Count": str(plan["windows"]),
+    }
+    return StreamingResponse(iter_npz(plan, mini, maxi), media_type="application/octet-stream",
+                             headers=headers)
+
 @app.delete("/runs/{run_id}")
 async def delete_measurement(run_id: str):
     """Elimina una medición de la base de datos."""
     try:
-        success = delete_run(run_id)
+        success = await db.delete_run(run_id)
+        run_data_cache.invalidate(run_id)
         if success:
             return {"status": "success", "message": "Measurement deleted successfully"}
         else:
@@ -216,11 +731,56 @@ async def delete_measurement(run_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting measurement: {str(e)}")
 
+@app.get("/ready")
+async def readiness_probe():
+    """
+    Listo para clasificar: 200 cuando el modelo terminó de calentarse (o si se
+    carga con la primera predicción, FRISAT_WARMUP=0); 503 mientras tanto.
+    """
+    ready = model_status["status"] in ("ready", "lazy")
+    return JSONResponse({"ready": ready, **model_status}, status_code=200 if ready else 503)
+
+@app.get("/models")
+async def list_models():
+    """Versiones del modelo en disco, cuáles están cargadas y cuánta memoria usan."""
+    return registry.status()
+
+@app.post("/models/reload")
+async def reload_models():
+    """
+    Vuelve a buscar modelos en disco y reemplaza en caliente las versiones
+    cargadas cuyo archivo cambió; las sesiones abiertas no se cortan.
+    """
+    return await registry.reload()
+
+@app.post("/models/{version}/load")
+async def load_model(version: str):
+    """Carga y calienta una versión antes de usarla (p. ej. antes de un ensayo)."""
+    try:
+        model = await registry.get(version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error loading model: {str(e)}")
+    return {"status": "loaded", "version": model.version, "warmup": model.warmup}
+
+@app.get("/maintenance")
+async def get_maintenance_status():
+    """Estado de los trabajos de mantenimiento: última ejecución, duración y resultado."""
+    return maintenance.status()
+
+@app.post("/maintenance/{job}")
+async def run_maintenance_job(job: str):
+    """Adelanta un trabajo de mantenimiento; corre en cuanto no haya tráfico en vivo."""
+    if not maintenance.trigger(job):
+        raise HTTPException(status_code=404, detail=f"Trabajo desconocido: {job}")
+    return {"status": "scheduled", "job": job}
+
 @app.get("/stats")
 async def get_database_statistics():
     """Obtiene estadísticas de la base de datos."""
     try:
-        stats = get_database_stats()
+        stats = await db.get_database_stats()
         return stats
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting statistics: {str(e)}")
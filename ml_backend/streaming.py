@@ -0,0 +1,200 @@
+"""
+Inferencia incremental para las sesiones en vivo de FRISAT.
+
+Con WINDOW = 350 y saltos cortos, dos ventanas consecutivas comparten casi
+todas sus muestras. `StreamingForward` guarda las salidas de las capas
+convolucionales del modelo (Conv1D, MaxPooling1D y las capas punto a punto
+que las siguen) indexadas por la posición absoluta de la muestra en la
+sesión, y en cada salto sólo calcula las posiciones nuevas antes de pasar
+por las capas densas.
+
+Una salida se reutiliza sólo si su campo receptivo queda entero dentro de
+la ventana: las de los bordes dependen del relleno 'same' y se recalculan
+siempre. Así el resultado es el mismo que el de la pasada completa de
+`NumpyEngine` (salvo el redondeo de float32).
+
+El servidor la usa en las sesiones que piden `streaming` en el CONFIG, con
+los pesos NumPy de su versión del modelo (python export_model.py --numpy).
+"""
+
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from inference import NumpyEngine, _activation, _same_padding
+
+# Capas que actúan muestra por muestra: se aplican a las posiciones nuevas
+POINTWISE = ("InputLayer", "Dropout", "BatchNormalization", "LeakyReLU", "Activation")
+
+
+class _Stage:
+    """Una Conv1D o MaxPooling1D con las capas punto a punto que la siguen."""
+
+    def __init__(self, layer: Dict[str, Any], in_len: int, in_step: int):
+        self.layer = layer
+        self.tail: List[Dict[str, Any]] = []
+        kind, cfg = layer["class_name"], layer["config"]
+        if kind == "Conv1D":
+            if tuple(cfg.get("strides", (1,))) != (1,) or tuple(cfg.get("dilation_rate", (1,))) != (1,):
+                raise ValueError("La inferencia incremental sólo soporta Conv1D con stride y dilatación 1")
+            kernel = layer["weights"][0]
+            self.kernel, self.stride = kernel.shape[0], 1
+            # Los k desplazamientos en un solo producto: (k * cin, cout)
+            self.matrix = kernel.reshape(-1, kernel.shape[-1])
+            self.pad_value = 0.0
+        else:
+            pool = cfg["pool_size"][0] if isinstance(cfg["pool_size"], list) else cfg["pool_size"]
+            stride = cfg.get("strides") or pool
+            self.kernel, self.stride = pool, stride[0] if isinstance(stride, list) else stride
+            self.pad_value = -np.inf
+        if cfg.get("padding", "valid") == "same":
+            left, right = _same_padding(in_len, self.kernel, self.stride)
+        else:
+            left = right = 0
+        self.out_len = (in_len + left + right - self.kernel) // self.stride + 1
+        # Distancia en muestras de la señal entre dos salidas consecutivas
+        self.step = in_step * self.stride
+        self.offsets = np.arange(self.out_len) * self.step
+        # Fila de la entrada que lee cada salida; el relleno apunta a la fila
+        # extra `in_len`, que trae el valor de relleno de esta etapa
+        taps = np.arange(self.out_len)[:, None] * self.stride + np.arange(self.kernel) - left
+        inside = (taps >= 0) & (taps < in_len)
+        self.taps = np.where(inside, taps, in_len)
+        self.inside = inside.all(axis=1)
+        self.edge: Optional[np.ndarray] = None
+        self.next_pad = 0.0
+        self.keys: Optional[np.ndarray] = None
+        self.values: Optional[np.ndarray] = None
+
+    def settle(self, clean_in: np.ndarray) -> np.ndarray:
+        """
+        Marca las salidas de borde: las que leen relleno o bordes de la etapa
+        anterior dependen de dónde empieza la ventana y no se guardan.
+        """
+        clean = self.inside & clean_in[np.minimum(self.taps, len(clean_in) - 1)].all(axis=1)
+        self.edge = ~clean
+        return clean
+
+    def compute(self, x: np.ndarray, rows: np.ndarray, apply) -> np.ndarray:
+        """Salidas `rows` de la etapa a partir de su entrada `x (n, L + 1, c)`."""
+        taps = x[:, self.taps[rows]]
+        if self.layer["class_name"] == "Conv1D":
+            weights, cfg = self.layer["weights"], self.layer["config"]
+            y = taps.reshape(taps.shape[0], taps.shape[1], -1) @ self.matrix
+            if cfg.get("use_bias", True):
+                y += weights[1]
+            y = _activation(y, cfg.get("activation"))
+        else:
+            y = taps.max(axis=2)
+        for layer in self.tail:
+            y = apply(layer, y)
+        return y
+
+
+class StreamingForward:
+    """
+    Pasada incremental de un `NumpyEngine` para las ventanas de una sesión.
+
+    Cada llamada a `predict` recibe la ventana completa de cada sensor y la
+    posición absoluta de su primera muestra (muestras recibidas desde el
+    CONFIG menos WINDOW). Las ventanas deben venir de una misma señal: si
+    la sesión se reinicia hay que llamar a `reset` (o crear otro objeto).
+
+    Args:
+        engine: Motor NumPy con los pesos del modelo (se comparte, sólo se lee)
+        window: Largo de la ventana
+        streams: Ventanas por llamada (una por sensor)
+    """
+
+    def __init__(self, engine: NumpyEngine, window: int, streams: int = 1):
+        self.engine = engine
+        self.window = int(window)
+        self.streams = int(streams)
+        self.stages: List[_Stage] = []
+        layers = list(engine.layers)
+        length, step = self.window, 1
+        clean = np.ones(length, bool)
+        while layers and layers[0]["class_name"] != "Flatten":
+            layer = layers.pop(0)
+            kind = layer["class_name"]
+            if kind in ("Conv1D", "MaxPooling1D"):
+                stage = _Stage(layer, length, step)
+                clean = stage.settle(clean)
+                self.stages.append(stage)
+                length, step = stage.out_len, stage.step
+            elif kind in POINTWISE and self.stages:
+                self.stages[-1].tail.append(layer)
+            elif kind not in ("InputLayer", "Dropout"):
+                raise ValueError(f"Capa no soportada en la inferencia incremental: {kind}")
+        if not layers or not self.stages:
+            raise ValueError("La inferencia incremental necesita capas convolucionales seguidas de Flatten")
+        self.head = layers
+        # Posiciones guardadas por etapa: las de una misma ventana nunca chocan
+        self.span = 2 * self.window
+        # Cada etapa deja en su fila extra el relleno de la siguiente
+        pads = [stage.pad_value for stage in self.stages[1:]] + [0.0]
+        for stage, pad in zip(self.stages, pads):
+            stage.next_pad = pad
+        self.computed = 0
+        self.reused = 0
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        """Olvida las activaciones guardadas (p. ej. tras un nuevo CONFIG)."""
+        with self._lock:
+            for stage in self.stages:
+                stage.keys = stage.values = None
+            self.computed = self.reused = 0
+
+    def predict(self, windows: np.ndarray, start: int) -> np.ndarray:
+        """
+        Probabilidades de las ventanas actuales, reutilizando el solapamiento.
+
+        Args:
+            windows: Arreglo `(streams, window, 1)` ya normalizado
+            start: Posición absoluta de la primera muestra de la ventana
+
+        Returns:
+            Arreglo `(streams, clases)`, igual al de `engine.predict(windows)`
+        """
+        windows = np.asarray(windows)
+        if windows.shape[:2] != (self.streams, self.window):
+            raise ValueError(f"Se esperaban ventanas ({self.streams}, {self.window}, c), llegó {windows.shape}")
+        x = np.empty((self.streams, self.window + 1, windows.shape[2]), dtype=self.engine.dtype)
+        x[:, :self.window] = windows
+        x[:, self.window] = self.stages[0].pad_value
+        with self._lock:
+            for stage in self.stages:
+                x = self._stage(stage, x, int(start))
+        x = x[:, :-1].reshape(self.streams, -1)
+        for layer in self.head:
+            x = self.engine._apply(layer, x)
+        return x.astype(np.float32, copy=False)
+
+    def _stage(self, stage: _Stage, x: np.ndarray, start: int) -> np.ndarray:
+        """Salida `(n, out_len + 1, c)` de una etapa: guardada o recalculada."""
+        positions = start + stage.offsets
+        slots = positions % self.span
+        if stage.keys is None:
+            missing = np.arange(stage.out_len)
+        else:
+            missing = np.flatnonzero(stage.edge | (stage.keys[slots] != positions))
+        rows = np.append(slots, self.span)
+        if not len(missing):
+            self.reused += stage.out_len
+            return stage.values[:, rows]
+        y = stage.compute(x, missing, self.engine._apply)
+        if stage.keys is None:
+            # La fila `span` es la de relleno de la etapa siguiente
+            stage.keys = np.full(self.span, -1, dtype=np.int64)
+            stage.values = np.zeros((self.streams, self.span + 1, y.shape[-1]), dtype=y.dtype)
+            stage.values[:, self.span] = stage.next_pad
+        out = stage.values[:, rows]
+        out[:, missing] = y
+        keep = ~stage.edge[missing]
+        stage.values[:, slots[missing[keep]]] = y[:, keep]
+        stage.keys[slots[missing[keep]]] = positions[missing[keep]]
+        self.computed += len(missing)
+        self.reused += stage.out_len - len(missing)
+        return out
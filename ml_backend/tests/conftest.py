@@ -0,0 +1,50 @@
+"""
+Configuración de pytest para el backend de FRISAT.
+Los módulos del backend se importan sin paquete (como hace server.py), así
+que la carpeta ml_backend va al principio del path.
+"""
+
+import os
+import platform
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """
+    Base de datos nueva en una carpeta temporal. init_db.py la crea en
+    ./frisat-data cuando corre en Windows, así que se simula eso.
+    """
+    import database
+    import init_db
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(platform, "system", lambda: "Windows")
+    path = tmp_path / "frisat-data" / "frisat.db"
+    monkeypatch.setattr(database, "DB_PATH", path)
+    init_db.init_database()
+    yield path
+    with database._writers_lock:
+        database._writers.clear()
+    database.close_pool()
+
+
+@pytest.fixture(scope="session")
+def client():
+    """
+    Servidor de prueba con el motor NumPy, sin calentamiento ni
+    mantenimiento. Es uno solo por sesión: el registro de modelos queda
+    atado al bucle de eventos del primero.
+    """
+    os.environ.setdefault("FRISAT_INFERENCE_BACKEND", "numpy")
+    os.environ.setdefault("FRISAT_WARMUP", "0")
+    os.environ.setdefault("FRISAT_MAINTENANCE", "0")
+    from fastapi.testclient import TestClient
+    import server
+
+    with TestClient(server.app) as test_client:
+        yield test_client
@@ -0,0 +1,152 @@
+"""
+Subida por bloques (/append + /finalize): el archivo es el mismo que el de
+la finalización en un solo paso, la memoria no crece con el largo de la
+medición y, si se pierde el escritor (reinicio del servidor), la medición
+se retoma desde los fragmentos guardados.
+"""
+
+import gzip
+import json
+import sqlite3
+import tracemalloc
+
+import numpy as np
+import pytest
+
+import database
+from columnar import read_table
+
+HEADER = ["time", "sensor1", "sensor2"]
+SENSORS = {"sensor1": True, "sensor2": True, "sampling_hz": 100}
+META = {
+    "start_time": "2025-07-04T17:53:00", "duration_sec": 30, "sampling_hz": 100,
+    "total_samples": 3000, "dominant_regimen": "TRANSITION",
+    "sensors": {"sensor1": True, "sensor2": True}, "file_name": "bloques.csv",
+}
+
+
+@pytest.fixture
+def rows():
+    values = np.random.default_rng(0).normal(900, 30, (3000, 2))
+    return [{"time": i / 100, "sensor1": float(a), "sensor2": float(b)}
+            for i, (a, b) in enumerate(values)]
+
+
+def _start(client) -> str:
+    return client.post("/runs/start", json=SENSORS).json()["run_id"]
+
+
+def _append(client, run_id, rows, first: bool):
+    body = {"rows": rows}
+    if first:
+        body.update(header=HEADER, meta=META)
+    response = client.post(f"/runs/{run_id}/append", json=body)
+    assert response.status_code == 200, response.text
+    return response.json()["rows"]
+
+
+def _finalize(client, run_id, **body):
+    response = client.post(f"/runs/{run_id}/finalize", json={"meta": META, **body})
+    assert response.status_code == 200, response.text
+
+
+def _stored(db_path, run_id):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(
+            "SELECT col_sha256, stats_json, rows FROM measurements WHERE id = ?", (run_id,)
+        ).fetchone()
+    finally:
+        conn.close()
+
+
+def _csv(client, run_id) -> bytes:
+    return gzip.decompress(client.get(f"/runs/{run_id}/download").content)
+
+
+def test_append_matches_one_shot(db_path, client, rows):
+    one_shot = _start(client)
+    _finalize(client, one_shot, rows=rows, header=HEADER)
+    chunked = _start(client)
+    for start in range(0, len(rows), 700):
+        assert _append(client, chunked, rows[start:start + 700], start == 0) == min(start + 700, len(rows))
+    _finalize(client, chunked)
+    assert _csv(client, chunked) == _csv(client, one_shot)
+    # El archivo columnar no depende del tamaño de los bloques
+    assert _stored(db_path, chunked) == _stored(db_path, one_shot)
+
+
+def test_append_memory_is_flat(db_path):
+    run_id = database.create_run(SENSORS)
+    block = [{"time": i / 100, "sensor1": 900.5 + i % 7, "sensor2": 950.25} for i in range(2000)]
+    database.append_run_rows(run_id, block, HEADER, META)
+    tracemalloc.start()
+    try:
+        for _ in range(20):
+            database.append_run_rows(run_id, block)
+        early = tracemalloc.get_traced_memory()[0]
+        for _ in range(100):
+            database.append_run_rows(run_id, block)
+        late = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    # 200 000 filas más sin que crezca lo retenido entre bloques
+    assert late - early < 256 * 1024
+    assert database.finalize_run(run_id, iter([]), HEADER, META)
+    assert _stored(db_path, run_id)[2] == 121 * 2000
+
+
+def _restart():
+    """Lo que pierde el proceso al reiniciarse: los escritores en memoria."""
+    with database._writers_lock:
+        database._writers.clear()
+    database.close_pool()
+
+
+def test_resume_after_restart(db_path, client, rows):
+    reference = _start(client)
+    for start in range(0, len(rows), 700):
+        _append(client, reference, rows[start:start + 700], start == 0)
+    _finalize(client, reference)
+
+    resumed = _start(client)
+    _append(client, resumed, rows[:700], True)
+    _restart()
+    # Sin encabezado: se toma del que ya está escrito
+    assert _append(client, resumed, rows[700:1900], False) == 1900
+    _restart()
+    _restart()
+    assert _append(client, resumed, rows[1900:2500], False) == 2500
+    _restart()
+    _finalize(client, resumed, rows=rows[2500:], header=HEADER)
+
+    assert _csv(client, resumed) == _csv(client, reference)
+    ref_col, ref_stats, ref_rows = _stored(db_path, reference)
+    col, stats, n = _stored(db_path, resumed)
+    assert n == ref_rows == len(rows)
+    assert json.loads(stats) == json.loads(ref_stats)
+    ref_names, ref_data, _ = read_table(database.get_run_columns(reference))
+    names, data, _ = read_table(database.get_run_columns(resumed))
+    assert names == ref_names
+    np.testing.assert_array_equal(data, ref_data)
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM measurement_chunks").fetchone()[0] == 0
+
+
+def test_finalized_run_rejects_rows_with_409(db_path, client, rows):
+    run_id = _start(client)
+    _finalize(client, run_id, rows=rows[:10], header=HEADER)
+    response = client.post(f"/runs/{run_id}/append", json={"rows": rows[:10], "header": HEADER})
+    assert response.status_code == 409
+    assert client.post(f"/runs/{run_id}/finalize", json={"meta": META}).status_code == 409
+    assert client.post("/runs/nope/append", json={"rows": [], "header": HEADER}).status_code == 404
+
+
+def test_reaper_seals_orphaned_uploads(db_path, client, rows):
+    run_id = _start(client)
+    _append(client, run_id, rows[:700], True)
+    _restart()
+    assert database.reap_stale_runs(0) == 0
+    run = client.get(f"/runs/{run_id}").json()
+    assert run["status"] == "ready" and run["rows"] == 700
+    assert len(_csv(client, run_id).splitlines()) > 700
@@ -0,0 +1,109 @@
+"""
+Paridad entre motores de inferencia: todos corren sobre las mismas ventanas
+y se comparan contra el motor NumPy, que es una pasada float32 de los mismos
+pesos del .h5 (y también se compara contra Keras cuando está instalado).
+
+Los motores cuyo paquete no está instalado (Keras/TensorFlow, intérprete de
+TFLite) o cuyo archivo no se exportó se saltean.
+"""
+
+import importlib.util
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from classification import WINDOW, load_normalization
+from export import NORMALIZATION_PATH, sample_windows
+from inference import ENGINES, MODEL_PATH, load_engine
+
+SIGNALS_DIR = Path(__file__).resolve().parents[2] / "mediciones_guardadas"
+REFERENCE = "numpy"
+# Diferencia máxima de probabilidad admitida contra la referencia
+TOLERANCE = {
+    "keras": 1e-4,
+    "tflite": 1e-4,
+    "tflite-float16": 1e-2,
+    "tflite-int8": 0.1,
+}
+# El int8 se calibró con señales reales: sobre ruido uniforme no se compara
+REAL_SIGNALS_ONLY = {"tflite-int8"}
+
+
+def _installed(*modules: str) -> bool:
+    return any(importlib.util.find_spec(module) is not None for module in modules)
+
+
+def _requirements(backend: str) -> tuple:
+    if backend == "keras":
+        return ("keras",)
+    if backend.startswith("tflite"):
+        return ("tflite_runtime", "ai_edge_litert", "tensorflow")
+    return ()
+
+
+@pytest.fixture(scope="module")
+def reference():
+    return load_engine(REFERENCE, MODEL_PATH)
+
+
+@pytest.fixture(scope="module")
+def signal_windows():
+    mini, maxi = load_normalization(NORMALIZATION_PATH)
+    files = sorted(str(p) for p in SIGNALS_DIR.glob("*.csv"))
+    windows = sample_windows(256, mini, maxi, hop=50, files=files) if files else np.empty((0, WINDOW, 1))
+    if len(windows) == 0:
+        pytest.skip(f"No hay señales de prueba en {SIGNALS_DIR}")
+    return windows
+
+
+@pytest.fixture(scope="module")
+def random_windows():
+    # Ventanas normalizadas en [0, 1], como las que arma el servidor
+    return np.random.default_rng(0).random((64, WINDOW, 1), dtype=np.float32)
+
+
+def _engine(backend: str):
+    requirements = _requirements(backend)
+    if requirements and not _installed(*requirements):
+        pytest.skip(f"Motor '{backend}' sin {' ni '.join(requirements)} instalado")
+    try:
+        return load_engine(backend, MODEL_PATH)
+    except FileNotFoundError as e:
+        pytest.skip(str(e))
+
+
+def _assert_parity(backend: str, probs: np.ndarray, expected: np.ndarray) -> None:
+    assert probs.shape == expected.shape
+    max_diff = float(np.max(np.abs(probs - expected)))
+    assert max_diff <= TOLERANCE[backend], f"{backend}: diferencia máx {max_diff:.2e}"
+    agree = np.mean(probs.argmax(axis=1) == expected.argmax(axis=1))
+    assert agree == 1.0, f"{backend}: etiquetas iguales {agree:.1%}"
+
+
+CANDIDATES = [backend for backend in ENGINES if backend != REFERENCE]
+
+
+def test_every_engine_is_checked():
+    assert set(CANDIDATES) == set(TOLERANCE)
+
+
+@pytest.mark.parametrize("backend", CANDIDATES)
+def test_parity_on_signals(backend, reference, signal_windows):
+    engine = _engine(backend)
+    _assert_parity(backend, engine.predict(signal_windows), reference.predict(signal_windows))
+
+
+@pytest.mark.parametrize("backend", [b for b in CANDIDATES if b not in REAL_SIGNALS_ONLY])
+def test_parity_on_random_windows(backend, reference, random_windows):
+    engine = _engine(backend)
+    _assert_parity(backend, engine.predict(random_windows), reference.predict(random_windows))
+
+
+@pytest.mark.parametrize("backend", CANDIDATES + [REFERENCE])
+def test_batch_size_does_not_change_results(backend, signal_windows):
+    """Una ventana sola da lo mismo que dentro de un lote (como en /ws)."""
+    engine = _engine(backend)
+    batch = engine.predict(signal_windows[:8])
+    single = np.concatenate([engine.predict(w[np.newaxis]) for w in signal_windows[:8]])
+    np.testing.assert_allclose(single, batch, atol=TOLERANCE.get(backend, 1e-5))
@@ -0,0 +1,100 @@
+"""
+Descarga de mediciones: el .csv.gz guardado admite rangos y su ETag es el
+SHA-256 de los bytes enviados; sin .csv.gz guardado (FRISAT_STORE_CSV_GZ=0)
+se comprime mientras se envía, con ETag débil y sin rangos.
+"""
+
+import gzip
+import hashlib
+import tracemalloc
+
+import numpy as np
+import pytest
+
+import database
+
+HEADER = ["time", "sensor1", "sensor2"]
+SENSORS = {"sensor1": True, "sensor2": True, "sampling_hz": 100}
+META = {
+    "start_time": "2025-07-04T17:53:00", "duration_sec": 20, "sampling_hz": 100,
+    "total_samples": 2000, "dominant_regimen": "LAMINAR",
+    "sensors": {"sensor1": True, "sensor2": True}, "file_name": "descarga.csv",
+}
+
+
+def _rows(n: int, seed: int = 0):
+    values = np.random.default_rng(seed).normal(900, 30, (n, 2))
+    return [{"time": i / 100, "sensor1": float(a), "sensor2": float(b)}
+            for i, (a, b) in enumerate(values)]
+
+
+def _run(client, rows) -> str:
+    run_id = client.post("/runs/start", json=SENSORS).json()["run_id"]
+    response = client.post(f"/runs/{run_id}/finalize", json={"meta": META, "rows": rows, "header": HEADER})
+    assert response.status_code == 200, response.text
+    return run_id
+
+
+@pytest.fixture
+def columnar_only(monkeypatch):
+    monkeypatch.setattr(database, "STORE_CSV_GZ", False)
+
+
+def test_stored_file_ranges_and_etag(db_path, client):
+    run_id = _run(client, _rows(2000))
+    full = client.get(f"/runs/{run_id}/download")
+    assert full.status_code == 200
+    etag = full.headers["etag"]
+    assert etag == f'"{hashlib.sha256(full.content).hexdigest()}"'
+    assert int(full.headers["content-length"]) == len(full.content)
+
+    part = client.get(f"/runs/{run_id}/download", headers={"Range": "bytes=100-199"})
+    assert part.status_code == 206
+    assert part.content == full.content[100:200]
+    assert part.headers["content-range"] == f"bytes 100-199/{len(full.content)}"
+    resumed = client.get(f"/runs/{run_id}/download", headers={"Range": "bytes=500-", "If-Range": etag})
+    assert resumed.status_code == 206 and resumed.content == full.content[500:]
+
+    assert client.get(f"/runs/{run_id}/download", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_generated_file_is_streamed_with_weak_etag(db_path, client, columnar_only):
+    rows = _rows(2000)
+    run_id = _run(client, rows)
+    full = client.get(f"/runs/{run_id}/download")
+    assert full.status_code == 200
+    etag = full.headers["etag"]
+    assert etag.startswith('W/"')
+    assert full.headers["accept-ranges"] == "none"
+    lines = gzip.decompress(full.content).decode().splitlines()
+    assert sum(1 for line in lines if not line.startswith("#")) == len(rows)
+
+    # Un rango no se puede servir: se envía el archivo entero, siempre igual
+    part = client.get(f"/runs/{run_id}/download", headers={"Range": "bytes=100-199"})
+    assert part.status_code == 200 and part.content == full.content
+    assert client.get(f"/runs/{run_id}/download", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(f"/runs/{run_id}/download",
+                      headers={"If-None-Match": etag.removeprefix("W/")}).status_code == 304
+
+
+def test_generated_file_memory_is_flat(db_path, columnar_only):
+    run_id = database.create_run(SENSORS)
+    block = [{"time": i / 100, "sensor1": 900.5 + i % 7, "sensor2": 950.25 - i % 11} for i in range(5000)]
+    database.append_run_rows(run_id, block, HEADER, META)
+    for _ in range(39):
+        database.append_run_rows(run_id, block)
+    assert database.finalize_run(run_id, iter([]), HEADER, META)
+
+    run_file = database.open_run_file(run_id)
+    assert run_file.size is None
+    tracemalloc.start()
+    try:
+        for _ in run_file.iter_bytes():
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    csv_size = len(gzip.decompress(b"".join(database.open_run_file(run_id).iter_bytes())))
+    # 200 000 filas: en memoria sólo un trozo del CSV, no el archivo entero
+    assert csv_size > 4 * 1024 * 1024
+    assert peak < csv_size / 2
@@ -0,0 +1,81 @@
+"""
+Reducción de series: `max_points` es un tope para LTTB y min/max, con una
+o varias series, y `query_run_data` recorta el tramo pedido antes de reducir.
+"""
+
+import numpy as np
+import pytest
+
+import database
+from downsample import downsample_indices, lttb_indices, minmax_indices
+from run_data import query_run_data
+
+N = 10000
+
+
+@pytest.fixture(scope="module")
+def signals():
+    rng = np.random.default_rng(0)
+    x = np.arange(N) / 100
+    series = [np.cumsum(rng.normal(0, 1, N)) for _ in range(5)]
+    return x, series
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+@pytest.mark.parametrize("count", [1, 2, 3, 5])
+@pytest.mark.parametrize("max_points", [2, 3, 4, 7, 10, 51, 1000])
+def test_max_points_is_a_cap(signals, method, count, max_points):
+    x, series = signals
+    keep = downsample_indices(x, series[:count], max_points, method)
+    assert 2 <= len(keep) <= max_points
+    assert np.all(np.diff(keep) > 0)
+    assert keep[0] == 0 and keep[-1] == N - 1
+
+
+@pytest.mark.parametrize("n_out", [1, 2, 3, 4, 5, 10, 101])
+def test_single_series_cap(signals, n_out):
+    x, series = signals
+    y = series[0]
+    assert len(lttb_indices(x, y, n_out)) == n_out
+    picks = minmax_indices(y, n_out)
+    assert len(picks) <= n_out
+    if n_out >= 4:
+        # Los picos de la señal siempre quedan
+        assert {int(np.argmin(y)), int(np.argmax(y)), 0, N - 1} <= set(picks.tolist())
+
+
+def test_short_series_and_errors(signals):
+    x, series = signals
+    np.testing.assert_array_equal(downsample_indices(x[:50], [s[:50] for s in series], 100), np.arange(50))
+    assert len(downsample_indices(x, [], 20)) <= 20
+    with pytest.raises(ValueError):
+        downsample_indices(x, series, 1)
+    with pytest.raises(ValueError):
+        downsample_indices(x, series, 100, "mean")
+
+
+def test_query_run_data_slices(db_path):
+    header = ["time", "sensor1", "sensor2"]
+    rows = [{"time": i / 100, "sensor1": 900.0 + (i % 97), "sensor2": 950.0 - (i % 89)} for i in range(3000)]
+    run_id = database.create_run({"sensor1": True, "sensor2": True, "sampling_hz": 100})
+    assert database.finalize_run(run_id, iter(rows), header, {"sensors": {"sensor1": True, "sensor2": True}})
+
+    raw = query_run_data(run_id, start=1.0, end=2.0, max_points=500)
+    assert raw["method"] == "raw" and raw["slice_samples"] == raw["points"] == 101
+    assert raw["time"][0] == pytest.approx(1.0) and raw["time"][-1] == pytest.approx(2.0)
+    assert raw["sensors"]["sensor1"] == [900.0 + (i % 97) for i in range(100, 201)]
+    assert raw["total_samples"] == 3000
+
+    for method in ("lttb", "minmax"):
+        reduced = query_run_data(run_id, start=5.0, max_points=60, method=method, sensors=["sensor2"])
+        assert reduced["method"] == method
+        assert reduced["slice_samples"] == 2500
+        assert reduced["points"] == len(reduced["time"]) <= 60
+        assert list(reduced["sensors"]) == ["sensor2"]
+        assert reduced["time"][0] == pytest.approx(5.0) and reduced["time"][-1] == pytest.approx(29.99)
+
+    empty = query_run_data(run_id, start=100.0)
+    assert empty["slice_samples"] == empty["points"] == 0
+    with pytest.raises(ValueError):
+        query_run_data(run_id, sensors=["sensor9"])
+    assert query_run_data("no-existe") is None
@@ -0,0 +1,64 @@
+"""
+Dataset de entrenamiento: la primera pasada planifica sin decodificar las
+mediciones (sólo el índice columnar, o las columnas del historial en las
+antiguas sin formato columnar) y la segunda genera exactamente lo planificado.
+"""
+
+import sqlite3
+
+import numpy as np
+import pytest
+
+import database
+import export
+
+HEADER = ["time", "sensor1", "sensor2"]
+
+
+def _run(n: int, regimen: str = "LAMINAR") -> str:
+    meta = {"sensors": {"sensor1": True, "sensor2": True}, "dominant_regimen": regimen}
+    run_id = database.create_run({"sensor1": True, "sensor2": True, "sampling_hz": 100})
+    rows = [{"time": i / 100, "sensor1": 900.0 + i % 50, "sensor2": 950.0 - i % 30} for i in range(n)]
+    assert database.finalize_run(run_id, iter(rows), HEADER, meta)
+    return run_id
+
+
+def test_plan_reads_no_data(db_path, monkeypatch):
+    columnar = _run(1000)
+    legacy = _run(800)
+    _run(900, regimen="indeterminado")
+    conn = sqlite3.connect(database.DB_PATH)
+    with conn:
+        # Medición guardada antes del formato columnar: sólo el .csv.gz
+        conn.execute("UPDATE measurements SET col_sha256 = NULL WHERE id = ?", (legacy,))
+    conn.close()
+
+    def no_data(*args, **kwargs):
+        pytest.fail("La planificación no debe leer los datos de las mediciones")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(export, "decode_run", no_data)
+        patch.setattr(database, "get_run_columns", no_data)
+        patch.setattr(database, "get_run_file", no_data)
+        plan = export.plan_dataset(hop=100, window=350)
+
+    by_id = {run["id"]: run for run in plan["runs"]}
+    assert set(by_id) == {columnar, legacy}
+    assert plan["skipped"] == 1
+    assert by_id[columnar]["windows"] == (1000 - 350) // 100 + 1
+    assert by_id[legacy]["windows"] == (800 - 350) // 100 + 1
+    assert by_id[legacy]["sensors"] == by_id[columnar]["sensors"] == ["sensor1", "sensor2"]
+    assert plan["windows"] == 2 * (7 + 5)
+
+    # La segunda pasada encuentra lo que se planificó
+    blocks = list(export.iter_dataset_blocks(plan, 849.0, 1002.0))
+    assert sum(len(block) for _, block in blocks) == plan["windows"]
+    assert all(block.shape[1:] == (350, 1) and block.dtype == np.float32 for _, block in blocks)
+
+
+def test_run_index_matches_columnar(db_path):
+    run_id = _run(1200)
+    index = database.get_run_index(run_id)
+    assert index["rows"] == 1200
+    assert [c["name"] for c in index["columns"]] == HEADER
+    assert database.get_run_index("no-existe") is None
@@ -0,0 +1,73 @@
+"""
+Filtros del historial: el de sensores usa la tabla indexada `run_sensors`
+(que mantienen los triggers y completa init_db.py en bases anteriores) y una
+fecha final sola incluye todo ese día.
+"""
+
+import sqlite3
+
+import pytest
+
+import database
+import init_db
+
+HEADER = ["time", "sensor1", "sensor2", "sensor3"]
+
+
+def _run(sensors, created_at: str) -> str:
+    meta = {name: True for name in sensors}
+    run_id = database.create_run({**meta, "sampling_hz": 100})
+    rows = [{"time": i / 100, "sensor1": 900.0 + i, "sensor2": 950.0, "sensor3": 990.0} for i in range(50)]
+    assert database.finalize_run(run_id, iter(rows), HEADER, {"sensors": meta})
+    conn = sqlite3.connect(database.DB_PATH)
+    with conn:
+        conn.execute("UPDATE measurements SET created_at = ? WHERE id = ?", (created_at, run_id))
+    conn.close()
+    return run_id
+
+
+def _ids(**filters):
+    return {run["id"] for run in database.list_runs(limit=100, include_stats=False, **filters)}
+
+
+def test_sensor_and_date_filters(db_path):
+    a = _run(["sensor1"], "2025-07-03T23:59:59.999999")
+    b = _run(["sensor1", "sensor2"], "2025-07-04T23:59:59.999999")
+    c = _run(["sensor2", "sensor3"], "2025-07-05T00:00:00")
+
+    assert _ids(sensor="sensor1") == {a, b}
+    assert _ids(sensor="sensor2") == {b, c}
+    assert _ids(sensor="sensor1, sensor2") == {b}
+    assert database.count_runs(sensor="sensor3") == 1
+    # La fecha final sola incluye su último instante y nada del día siguiente
+    assert _ids(date_to="2025-07-04") == {a, b}
+    assert _ids(date_from="2025-07-04", date_to="2025-07-04") == {b}
+    assert _ids(date_to="2025-07-05T00:00:00") == {a, b, c}
+    with pytest.raises(ValueError):
+        database.count_runs(date_to="2025-13-40")
+
+    database.delete_run(b)
+    conn = sqlite3.connect(database.DB_PATH)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM run_sensors WHERE run_id = ?", (b,)).fetchone()[0] == 0
+        plan = " ".join(row[-1] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM measurements WHERE id IN "
+            "(SELECT run_id FROM run_sensors WHERE sensor = ?)", ("sensor1",)))
+    finally:
+        conn.close()
+    assert "run_sensors USING PRIMARY KEY" in plan or "run_sensors USING COVERING INDEX" in plan
+    assert _ids(sensor="sensor1") == {a}
+
+
+def test_init_backfills_run_sensors(db_path):
+    a = _run(["sensor1", "sensor2"], "2025-07-04T10:00:00")
+    conn = sqlite3.connect(db_path)
+    with conn:
+        # Una base anterior a la tabla
+        conn.execute("DROP TABLE run_sensors")
+        for event in ("insert", "update", "delete"):
+            conn.execute(f"DROP TRIGGER measurements_sensors_{event}")
+    conn.close()
+    database.close_pool()
+    init_db.init_database()
+    assert _ids(sensor="sensor2") == {a}
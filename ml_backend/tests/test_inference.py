@@ -0,0 +1,58 @@
+"""
+Pruebas del pool de inferencia: un trabajador vuelve a cargar un motor
+descargado con el mismo backend con que se inicializó, y sin `init_worker`
+no carga ninguno por su cuenta; `BACKENDS` incluye todos los motores. El
+calentamiento de un pool de procesos llega a todos sus trabajadores.
+"""
+
+import threading
+
+import numpy as np
+import pytest
+
+import inference
+from inference import (MODEL_PATH, NumpyEngine, create_executor, init_worker, predict_in_worker,
+                       unload_in_worker, warm_up, warmup_in_worker)
+
+
+def test_reload_after_unload_keeps_backend(monkeypatch):
+    # El estado global del pool vuelve a como estaba al terminar
+    monkeypatch.setattr(inference, "_default", inference._default)
+    monkeypatch.setattr(inference, "_backends", dict(inference._backends))
+    stamp = ("test", 1)
+    batch = np.zeros((2, 350, 1), dtype=np.float32)
+    try:
+        init_worker("numpy", MODEL_PATH, stamp)
+        expected = predict_in_worker(batch, MODEL_PATH, stamp)
+        assert unload_in_worker(MODEL_PATH, stamp)
+        # Un lote que llega después de descargarlo no cae en Keras
+        np.testing.assert_array_equal(predict_in_worker(batch, MODEL_PATH, stamp), expected)
+        assert isinstance(inference._engines[(MODEL_PATH, stamp)], NumpyEngine)
+    finally:
+        unload_in_worker(MODEL_PATH, stamp)
+
+
+def test_uninitialized_worker_raises():
+    with pytest.raises(RuntimeError):
+        predict_in_worker(np.zeros((1, 350, 1), dtype=np.float32), MODEL_PATH, ("never", 0))
+
+
+def test_backends_match_engines():
+    assert set(inference.BACKENDS) == set(inference.ENGINES)
+    assert {"tflite-float16", "tflite-int8"} <= set(inference.BACKENDS)
+
+
+def test_warm_up_reaches_every_process():
+    executor = create_executor("process", 3, "numpy", MODEL_PATH, ("warmup", 1))
+    try:
+        result = warm_up(executor, 3, [1, 4], 350, 1, MODEL_PATH, ("warmup", 1))
+    finally:
+        executor.shutdown()
+    assert result["workers"] == 3
+
+
+def test_failed_warm_up_breaks_the_barrier():
+    barrier = threading.Barrier(2)
+    with pytest.raises(RuntimeError):
+        warmup_in_worker([1], model_path=MODEL_PATH, stamp=("never", 0), barrier=barrier)
+    assert barrier.broken
@@ -0,0 +1,85 @@
+"""
+Pruebas del registro de versiones con el motor NumPy: una sesión sigue con
+su versión aunque se quite del disco, y una recarga renueva la normalización
+junto con los pesos, también los de la inferencia incremental.
+"""
+
+import asyncio
+import os
+import shutil
+
+import numpy as np
+
+from model_registry import ModelRegistry
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WINDOW = 350
+
+
+def _models_dir(tmp_path, *versions):
+    for version in versions:
+        shutil.copy(os.path.join(HERE, "Modelo_1500.npz"), tmp_path / f"Modelo_{version}.npz")
+        np.savez(tmp_path / f"MaxiMini_{version}.npz", mini=849.0, maxi=1002.0)
+    return tmp_path
+
+
+def _registry(directory) -> ModelRegistry:
+    registry = ModelRegistry(backend="numpy", directory=str(directory), default_version="1")
+    registry.scan()
+    return registry
+
+
+def _touch(path, ns: int) -> None:
+    # Otro mtime aunque el archivo cambie dentro del mismo tic del reloj
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + ns))
+
+
+def test_pinned_version_survives_removal(tmp_path):
+    directory = _models_dir(tmp_path, "1", "2")
+    windows = np.random.default_rng(0).random((2, WINDOW, 1), dtype=np.float32)
+
+    async def run():
+        registry = _registry(directory)
+        registry.acquire("2")
+        model = await registry.get("2")
+        expected = await model.predict(windows)
+        engine = model.streaming_engine()
+        os.remove(directory / "Modelo_2.npz")
+        changes = await registry.reload()
+        assert changes["removed"] == ["2"]
+        # La sesión abierta sigue con sus pesos y su normalización
+        assert await registry.get("2") is model
+        assert registry.normalization("2") == (849.0, 1002.0)
+        np.testing.assert_array_equal(await model.predict(windows), expected)
+        assert registry.peek("2").streaming_engine() is engine
+        registry.release("2")
+        assert "2" not in registry.loaded
+        await asyncio.sleep(0)
+        await registry.close()
+
+    asyncio.run(run())
+
+
+def test_reload_refreshes_normalization(tmp_path):
+    directory = _models_dir(tmp_path, "1")
+
+    async def run():
+        registry = _registry(directory)
+        registry.acquire("1")
+        old = await registry.get("1")
+        assert old.normalization == (849.0, 1002.0)
+        old_engine = old.streaming_engine()
+        np.savez(directory / "MaxiMini_1.npz", mini=900.0, maxi=950.0)
+        _touch(directory / "MaxiMini_1.npz", 1000)
+        changes = await registry.reload()
+        assert changes["reloaded"] == ["1"]
+        new = await registry.get("1")
+        assert new is not old
+        assert new.normalization == registry.normalization("1") == (900.0, 950.0)
+        assert registry.peek("1") is new
+        assert new.streaming_engine() is not old_engine
+        registry.release("1")
+        await registry.close()
+
+    asyncio.run(run())
@@ -0,0 +1,70 @@
+"""
+Grabación desde /ws: si la sesión se corta sin /finalize, la medición se
+sella sola con lo grabado tras la espera de recorder.GRACE_SECONDS.
+"""
+
+import gzip
+import time
+
+import numpy as np
+import pytest
+
+import database
+import recorder
+
+SENSORS = {"sensor1": True, "sensor2": True, "sampling_hz": 100}
+
+
+def _record(client, data: np.ndarray) -> str:
+    run_id = client.post("/runs/start", json=SENSORS).json()["run_id"]
+    with client.websocket_connect("/ws") as ws:
+        ws.send_json({"type": "CONFIG", "n_sensors": 2, "binary": True, "hop": 50,
+                      "run_id": run_id, "sampling_hz": 100, "meta": {"file_name": "corte.csv"}})
+        assert ws.receive_json()["recording"] == run_id
+        for start in range(0, len(data), 250):
+            ws.send_bytes(data[start:start + 250].tobytes())
+    return run_id
+
+
+def _wait_status(client, run_id: str, status: str, timeout: float = 10.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        run = client.get(f"/runs/{run_id}").json()
+        if run["status"] == status:
+            return run
+        time.sleep(0.05)
+    pytest.fail(f"La medición quedó en '{run['status']}', se esperaba '{status}'")
+
+
+@pytest.fixture
+def data():
+    return (900 + np.random.default_rng(0).random((1000, 2)) * 100).astype(np.float32)
+
+
+def test_disconnect_seals_the_recording(db_path, client, data, monkeypatch):
+    monkeypatch.setattr(recorder, "GRACE_SECONDS", 0.1)
+    run_id = _record(client, data)
+    run = _wait_status(client, run_id, "ready")
+    assert run["rows"] == len(data)
+    assert run_id not in database._writers
+    text = gzip.decompress(client.get(f"/runs/{run_id}/download").content).decode()
+    lines = text.splitlines()
+    body = [line for line in lines if line and not line.startswith("#")]
+    assert len(body) == len(data)
+    np.testing.assert_allclose(np.array([row.split(",")[2:] for row in body], float), data, rtol=1e-6)
+    assert "#dominantRegimen,indeterminado" in lines
+    # Ni el reaper ni otro sellado la tocan
+    assert database.reap_stale_runs(0) == 0
+
+
+def test_finalize_within_grace_wins(db_path, client, data, monkeypatch):
+    monkeypatch.setattr(recorder, "GRACE_SECONDS", 0.5)
+    run_id = _record(client, data)
+    time.sleep(0.1)
+    response = client.post(f"/runs/{run_id}/finalize",
+                           json={"meta": {"dominant_regimen": "LAMINAR", "sensors": SENSORS}})
+    assert response.status_code == 200
+    time.sleep(0.6)
+    run = _wait_status(client, run_id, "ready")
+    assert run["rows"] == len(data)
+    assert run["preview"]["dominant_regimen"] == "LAMINAR"
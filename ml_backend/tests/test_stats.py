@@ -0,0 +1,141 @@
+"""
+Totales y referencias que mantienen los triggers de init_db.py: después de
+crear, finalizar, borrar e importar (con duplicados) mediciones, o de migrar
+una base con los archivos dentro de `measurements`, la reconciliación desde
+cero no encuentra diferencias.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+
+import numpy as np
+
+import database
+import init_db
+from import_legacy import encode_file
+
+HEADER = ["time", "sensor1", "sensor2"]
+SENSORS = {"sensor1": True, "sensor2": True, "sampling_hz": 100}
+META = {"sensors": {"sensor1": True, "sensor2": True}, "dominant_regimen": "LAMINAR",
+        "file_name": "totales.csv"}
+
+
+def _rows(n: int, seed: int = 0):
+    values = np.random.default_rng(seed).normal(900, 30, (n, 2))
+    return [{"time": i / 100, "sensor1": float(a), "sensor2": float(b)}
+            for i, (a, b) in enumerate(values)]
+
+
+def _assert_reconciled():
+    report = database.reconcile_database_stats(fix=False)
+    assert report["drift"] == {}
+    assert report["stale_size_runs"] == []
+    assert report["stale_blob_refs"] == []
+    conn = sqlite3.connect(database.DB_PATH)
+    try:
+        refs = dict(conn.execute("SELECT sha256, refs FROM blobs"))
+        used = {}
+        for gz, col in conn.execute("SELECT gz_sha256, col_sha256 FROM measurements"):
+            for sha256 in (gz, col):
+                if sha256:
+                    used[sha256] = used.get(sha256, 0) + 1
+    finally:
+        conn.close()
+    assert refs == used
+    return report
+
+
+def test_triggers_track_every_change(db_path, tmp_path):
+    rows = _rows(1500)
+    first = database.create_run(SENSORS)
+    assert database.finalize_run(first, iter(rows), HEADER, META)
+    # Misma medición otra vez: comparte los BLOBs
+    second = database.create_run(SENSORS)
+    assert database.finalize_run(second, iter(rows), HEADER, META)
+    chunked = database.create_run(SENSORS)
+    database.append_run_rows(chunked, rows[:700], HEADER, META)
+    writing = database.create_run(SENSORS)
+    database.append_run_rows(writing, rows[:300], HEADER, META)
+    database.append_run_rows(chunked, rows[700:])
+    assert database.finalize_run(chunked, iter([]), HEADER, META)
+    _assert_reconciled()
+
+    # Importar un archivo dos veces en el mismo lote y otra vez después
+    path = tmp_path / "importada.csv"
+    path.write_bytes(gzip.decompress(database.get_run_file(first)))
+    run = encode_file(str(path))
+    assert "error" not in run
+    saved = database.import_runs([run, dict(run, id="otro-id")])
+    assert saved[0] is not None and saved[1] is None
+    assert database.import_runs([run]) == [None]
+    _assert_reconciled()
+
+    assert database.delete_run(first)
+    assert database.delete_run(run["id"])
+    report = _assert_reconciled()
+    assert report["stored"] == report["actual"]
+    conn = sqlite3.connect(database.DB_PATH)
+    try:
+        statuses = dict(conn.execute("SELECT status, runs FROM measurement_stats"))
+    finally:
+        conn.close()
+    assert statuses["ready"] == 2 and statuses["writing"] == 1
+
+
+def _baseline_db(path, runs):
+    """Base con el esquema anterior: los archivos dentro de `measurements`."""
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("""
+            CREATE TABLE measurements (
+                id TEXT PRIMARY KEY, created_at TEXT NOT NULL, sampling_hz INTEGER NOT NULL,
+                duration_sec INTEGER NOT NULL, sensors TEXT NOT NULL, model_version TEXT NOT NULL,
+                normalization_version TEXT NOT NULL, rows INTEGER DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'writing', preview_json TEXT, data_gz BLOB,
+                sha256 TEXT, data_col BLOB, UNIQUE(id)
+            )
+        """)
+        for i, (run_id, csv_gz, columnar) in enumerate(runs):
+            conn.execute(
+                "INSERT INTO measurements VALUES (?, ?, 100, 15, ?, '1500', '1500', 1500, 'ready', ?, ?, ?, ?)",
+                (run_id, f"2025-07-0{i + 1}T10:00:00", json.dumps(["sensor1", "sensor2"]),
+                 json.dumps({"dominant_regimen": "LAMINAR", "file_name": f"{run_id}.csv"}),
+                 csv_gz, None if csv_gz is None else hashlib.sha256(csv_gz).hexdigest(), columnar)
+            )
+    conn.close()
+
+
+def test_inline_blobs_migrate_and_reconcile(db_path):
+    database.close_pool()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(f"{db_path}{suffix}"):
+            os.remove(f"{db_path}{suffix}")
+    block = np.array([[i / 100, r["sensor1"], r["sensor2"]] for i, r in enumerate(_rows(1500))])
+    csv_gz, columnar = database.RunWriter("baseline", HEADER, META).encode_table(block)
+    # Dos mediciones con el mismo archivo y una sólo con el .csv.gz
+    _baseline_db(db_path, [("a", csv_gz, columnar), ("b", csv_gz, columnar), ("c", csv_gz, None)])
+
+    init_db.init_database()
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute(
+            "SELECT COUNT(*) FROM measurements WHERE data_gz IS NOT NULL OR data_col IS NOT NULL"
+        ).fetchone()[0] == 0
+        assert dict(conn.execute("SELECT sha256, refs FROM blobs")) == {
+            hashlib.sha256(csv_gz).hexdigest(): 3,
+            hashlib.sha256(columnar).hexdigest(): 2,
+        }
+    finally:
+        conn.close()
+    report = _assert_reconciled()
+    assert report["stored"]["total_runs"] == 3
+    for run_id in ("a", "b", "c"):
+        assert database.get_run_file(run_id) == csv_gz
+    assert database.get_run_columns("a") == columnar
+
+    database.delete_run("a")
+    database.delete_run("c")
+    _assert_reconciled()
@@ -0,0 +1,82 @@
+"""
+Pruebas de la inferencia incremental: `StreamingForward.predict` da lo mismo
+que la pasada completa de `NumpyEngine` con saltos cortos, largos y de más
+de una ventana, con varios sensores y después de `reset`.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from inference import NumpyEngine
+from streaming import StreamingForward
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WINDOW = 350
+SENSORS = 3
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return NumpyEngine(os.path.join(HERE, "Modelo_1500.npz"))
+
+
+def _signal(seed: int, samples: int) -> np.ndarray:
+    # Señal ya normalizada: (sensores, muestras)
+    rng = np.random.default_rng(seed)
+    return rng.random((SENSORS, samples), dtype=np.float32)
+
+
+def _check(stream: StreamingForward, engine: NumpyEngine, signal: np.ndarray, hop: int,
+           first: int = 0) -> None:
+    for start in range(first, signal.shape[1] - WINDOW + 1, hop):
+        windows = signal[:, start:start + WINDOW, np.newaxis]
+        expected = engine.predict(windows)
+        np.testing.assert_allclose(stream.predict(windows, start), expected, rtol=1e-4, atol=1e-5)
+
+
+@pytest.mark.parametrize("hop", [1, 7, 30, WINDOW, WINDOW + 13])
+def test_matches_full_forward(engine, hop):
+    stream = StreamingForward(engine, WINDOW, SENSORS)
+    samples = WINDOW + (60 if hop == 1 else 4 * hop)
+    _check(stream, engine, _signal(hop, samples), hop)
+    if hop < WINDOW:
+        # Con solapamiento se reutiliza la mayor parte de cada ventana
+        assert stream.reused > stream.computed
+
+
+def test_reset_starts_a_new_signal(engine):
+    stream = StreamingForward(engine, WINDOW, SENSORS)
+    _check(stream, engine, _signal(1, WINDOW + 90), 30)
+    stream.reset()
+    assert stream.computed == stream.reused == 0
+    # Otra señal en las mismas posiciones: nada de la anterior se reutiliza
+    _check(stream, engine, _signal(2, WINDOW + 90), 30)
+    stream.reset()
+    # Y una que no empieza en cero
+    _check(stream, engine, _signal(3, 2 * WINDOW), 7, first=100)
+
+
+def test_rejects_wrong_shape(engine):
+    stream = StreamingForward(engine, WINDOW, SENSORS)
+    with pytest.raises(ValueError):
+        stream.predict(np.zeros((1, WINDOW, 1), dtype=np.float32), 0)
+
+
+def _session(client, data: np.ndarray, streaming: bool) -> list:
+    with client.websocket_connect("/ws") as ws:
+        ws.send_json({"type": "CONFIG", "n_sensors": data.shape[1], "binary": True,
+                      "hop": 50, "streaming": streaming})
+        ack = ws.receive_json()
+        assert ack.get("streaming", False) == streaming
+        ws.send_bytes(data.tobytes())
+        # La muestra que completa la ventana cuenta para el primer salto
+        expected = (len(data) - WINDOW + 1) // 50
+        return [ws.receive_json()["probs"] for _ in range(expected)]
+
+
+def test_ws_session_matches_full_forward(client):
+    data = (900 + 100 * np.random.default_rng(4).random((600, 2))).astype("<f4")
+    np.testing.assert_allclose(_session(client, data, True), _session(client, data, False),
+                               rtol=1e-4, atol=1e-5)
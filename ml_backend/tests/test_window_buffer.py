@@ -0,0 +1,112 @@
+"""
+Pruebas de SlidingWindowBuffer contra la reconstrucción anterior de /ws:
+un buffer circular por sensor y `np.concatenate([buf[start:], buf[:start]])`
+más `np.stack` en cada predicción.
+"""
+
+import numpy as np
+import pytest
+
+from window_buffer import SlidingWindowBuffer
+
+WINDOW = 350
+
+
+class LegacyRings:
+    """Los buffers por sensor de ws_predict antes de SlidingWindowBuffer."""
+
+    def __init__(self, window: int, n_channels: int):
+        self.window = window
+        self.buffers = [np.zeros(window, dtype=np.float32) for _ in range(n_channels)]
+        self.idxs = [0] * n_channels
+        self.filled = [0] * n_channels
+
+    def write(self, block: np.ndarray) -> None:
+        n = block.shape[0]
+        if n > self.window:
+            skip = n - self.window
+            for i in range(len(self.buffers)):
+                self.idxs[i] = (self.idxs[i] + skip) % self.window
+            block = block[skip:]
+            n = self.window
+        for i in range(len(self.buffers)):
+            pos = (self.idxs[i] + np.arange(block.shape[0])) % self.window
+            self.buffers[i][pos] = block[:, i]
+            self.idxs[i] = (self.idxs[i] + n) % self.window
+            self.filled[i] = min(self.window, self.filled[i] + n)
+
+    def window_matrix(self) -> np.ndarray:
+        windows = [np.concatenate([buf[start:], buf[:start]]) for buf, start in zip(self.buffers, self.idxs)]
+        return np.stack(windows, axis=-1)
+
+
+def assert_view(ring: SlidingWindowBuffer, legacy: LegacyRings) -> None:
+    view = ring.view()
+    np.testing.assert_array_equal(view, legacy.window_matrix())
+    assert view.flags["C_CONTIGUOUS"]
+    # Es una vista del anillo, no una copia
+    assert np.shares_memory(view, ring._data)
+    assert ring.filled == legacy.filled[0]
+
+
+@pytest.mark.parametrize("n_channels", [1, 3, 5])
+def test_random_blocks_match_legacy(n_channels):
+    rng = np.random.default_rng(n_channels)
+    ring = SlidingWindowBuffer(WINDOW, n_channels)
+    legacy = LegacyRings(WINDOW, n_channels)
+    pushed = 0
+    for _ in range(400):
+        # Bloques chicos, de varios saltos y alguno mayor que la ventana
+        n = int(rng.choice([1, 7, 30, 64, 349, 350, 351, 900]))
+        block = rng.standard_normal((n, n_channels)).astype(np.float32)
+        ring.push(block)
+        legacy.write(block)
+        pushed += n
+        assert ring.total == pushed
+        assert_view(ring, legacy)
+
+
+def test_blocks_crossing_the_wrap_point():
+    ring = SlidingWindowBuffer(WINDOW, 2)
+    legacy = LegacyRings(WINDOW, 2)
+    rng = np.random.default_rng(0)
+    # Dejar la cabeza justo antes del final y cruzar el borde varias veces
+    for n in [WINDOW - 5, 10, WINDOW - 3, 6, 1, WINDOW - 1, 2 * WINDOW + 13, 20]:
+        block = rng.standard_normal((n, 2)).astype(np.float32)
+        ring.push(block)
+        legacy.write(block)
+        assert_view(ring, legacy)
+
+
+def test_view_after_every_hop():
+    """Como en /ws: el bloque se parte en los puntos donde toca predecir."""
+    hop, n_channels = 30, 3
+    rng = np.random.default_rng(1)
+    ring = SlidingWindowBuffer(WINDOW, n_channels)
+    legacy = LegacyRings(WINDOW, n_channels)
+    signal = rng.standard_normal((5000, n_channels)).astype(np.float32)
+    pos = hops = 0
+    while pos < len(signal):
+        block = signal[pos:pos + int(rng.integers(1, 4 * hop))]
+        pos += len(block)
+        start = 0
+        while start < len(block):
+            take = min(len(block) - start, hop - (ring.total % hop))
+            ring.push(block[start:start + take])
+            legacy.write(block[start:start + take])
+            start += take
+            if ring.is_full and ring.total % hop == 0:
+                hops += 1
+                assert_view(ring, legacy)
+                np.testing.assert_array_equal(ring.view(), signal[ring.total - WINDOW:ring.total])
+    assert hops > 100
+
+
+def test_single_sample_and_reset():
+    ring = SlidingWindowBuffer(WINDOW, 2)
+    ring.push(np.array([1.0, 2.0], dtype=np.float32))
+    assert ring.filled == 1 and not ring.is_full
+    np.testing.assert_array_equal(ring.view()[-1], [1.0, 2.0])
+    ring.reset()
+    assert ring.filled == 0 and ring.total == 0
+    assert not ring.view().any()
@@ -0,0 +1,78 @@
+"""
+Buffer de ventana deslizante para las sesiones de predicción de FRISAT.
+Anillo espejado de doble longitud: cada muestra se escribe dos veces, así la
+ventana completa siempre es un bloque contiguo de memoria.
+"""
+
+import numpy as np
+
+
+class SlidingWindowBuffer:
+    """
+    Ventana deslizante `[window, n_channels]` preasignada.
+
+    Internamente guarda `2 * window` filas; la fila `p` y la fila `p + window`
+    contienen siempre la misma muestra. Con `head` apuntando a la muestra más
+    antigua, `buffer[head:head + window]` es la ventana en orden cronológico
+    y se entrega como vista, sin copiar.
+    """
+
+    def __init__(self, window: int, n_channels: int, dtype=np.float32):
+        self.window = int(window)
+        self.n_channels = int(n_channels)
+        self._data = np.zeros((2 * self.window, self.n_channels), dtype=dtype)
+        self.head = 0
+        self.filled = 0
+        # Muestras recibidas desde el último reset: la ventana empieza en
+        # la posición absoluta `total - filled`
+        self.total = 0
+
+    @property
+    def is_full(self) -> bool:
+        return self.filled >= self.window
+
+    def reset(self) -> None:
+        """Vacía la ventana sin reasignar memoria."""
+        self._data.fill(0)
+        self.head = 0
+        self.filled = 0
+        self.total = 0
+
+    def push(self, block: np.ndarray) -> None:
+        """
+        Agrega un bloque de muestras.
+
+        Args:
+            block: Arreglo `[n, n_channels]` (o `[n_channels]` para una muestra)
+        """
+        block = np.asarray(block, dtype=self._data.dtype)
+        if block.ndim == 1:
+            block = block.reshape(1, -1)
+        n = block.shape[0]
+        if n == 0:
+            return
+        self.total += n
+
+        w = self.window
+        if n >= w:
+            # Sólo sobreviven las últimas `window` muestras
+            tail = block[n - w:]
+            self._data[:w] = tail
+            self._data[w:] = tail
+            self.head = 0
+            self.filled = w
+            return
+
+        first = min(n, w - self.head)
+        self._data[self.head:self.head + first] = block[:first]
+        self._data[self.head + w:self.head + w + first] = block[:first]
+        rest = n - first
+        if rest:
+            self._data[:rest] = block[first:]
+            self._data[w:w + rest] = block[first:]
+        self.head = (self.head + n) % w
+        self.filled = min(w, self.filled + n)
+
+    def view(self) -> np.ndarray:
+        """Ventana actual `[window, n_channels]`, de la más antigua a la más reciente."""
+        return self._data[self.head:self.head + self.window]